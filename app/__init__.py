@@ -56,13 +56,60 @@ def create_app(config_name='development'):
     from app.middleware.error_handler import register_error_handlers
     register_error_handlers(app)
     
+    # Đếm query / thời gian DB theo request (/admin/perf; header Server-Timing khi debug)
+    from app.middleware.query_profiler import register_query_profiler
+    register_query_profiler(app)
+    
+    # Đồng bộ bảng hotel_search_summary theo các thay đổi trong session
+    from app.services.search_summary_service import SearchSummaryService
+    SearchSummaryService.register_hooks()
+    
+    from app.services.text_search import TextSearchService
+    TextSearchService.register_hooks()
+    
+    from app.services.autocomplete import AutocompleteService
+    AutocompleteService.register_hooks()
+    
+    # Xóa cache trang công khai theo entity sau mỗi commit
+    from app.services.cache_service import CacheService
+    CacheService.register_hooks()
+    # Chọn backend ngay khi khởi động để cảnh báo cấu hình sai (memory với nhiều process) hiện trong log
+    with app.app_context():
+        CacheService.get_backend()
+    
+    # Số liệu dashboard admin (platform_stats) cộng dồn theo từng transaction ghi
+    from app.services.platform_stats_service import PlatformStatsService
+    PlatformStatsService.register_hooks()
+    
+    # Bộ đếm thông báo chưa đọc (badge) cập nhật cùng transaction
+    from app.services.notification_service import NotificationService
+    NotificationService.register_hooks()
+    
+    from app.commands import register_commands
+    register_commands(app)
+    
+    # Pool xử lý job nền (JOB_WORKER_MODE=thread) chạy ngay từ khi khởi động process web
+    from app.services.job_queue import JobQueue
+    JobQueue.start_workers(app)
+    
     # Context processor để tự động có biến user_logged_in trong tất cả templates
     @app.context_processor
     def inject_user_logged_in():
         from flask import session
+        user_id = session.get('user_id')
+        # Một lần đọc users theo khóa chính, không đếm bảng notifications.
+        # Badge không được làm hỏng trang (kể cả trang lỗi): session hỏng / DB lỗi thì hiện 0
+        unread_notification_count = 0
+        if user_id:
+            try:
+                unread_notification_count = NotificationService.unread_count(user_id)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.warning(f'Không đọc được số thông báo chưa đọc: {e}')
         return dict(
             user_logged_in='user_id' in session,
-            current_user_id=session.get('user_id')
+            current_user_id=user_id,
+            unread_notification_count=unread_notification_count
         )
     
     # Route để serve uploaded files
@@ -0,0 +1,103 @@
+import click
+
+
+def register_commands(app):
+
+    @app.cli.command('rebuild-search-summary')
+    @click.option('--batch-size', default=500, show_default=True, help='Số khách sạn mỗi lô')
+    def rebuild_search_summary(batch_size):
+        """Tính lại toàn bộ bảng hotel_search_summary"""
+        from app.services.search_summary_service import SearchSummaryService
+        total = SearchSummaryService.rebuild_all(batch_size=batch_size)
+        click.echo(f'Đã cập nhật summary cho {total} khách sạn')
+
+    @app.cli.command('rebuild-text-index')
+    @click.option('--batch-size', default=500, show_default=True, help='Số khách sạn mỗi lô')
+    def rebuild_text_index(batch_size):
+        """Ghi lại cột hotels.search_text dùng cho tìm kiếm điểm đến"""
+        from app.services.text_search import TextSearchService
+        total = TextSearchService.rebuild_search_text(batch_size=batch_size)
+        click.echo(f'Đã cập nhật search_text cho {total} khách sạn')
+
+    @app.cli.command('rebuild-room-inventory')
+    @click.option('--batch-size', default=500, show_default=True, help='Số booking mỗi lô')
+    def rebuild_room_inventory(batch_size):
+        """Dựng lại sổ phòng room_inventory từ các booking đang giữ phòng"""
+        from app.services.inventory_service import InventoryService
+        total = InventoryService.rebuild(batch_size=batch_size)
+        click.echo(f'Đã ghi sổ phòng cho {total} booking')
+
+    @app.cli.command('sync-vector-index')
+    @click.option('--full', is_flag=True, help='Dựng index mới rồi chuyển sang (thay vì cập nhật tại chỗ)')
+    @click.option('--hotel-id', 'hotel_ids', multiple=True, type=int, help='Chỉ đồng bộ các khách sạn này')
+    def sync_vector_index(full, hotel_ids):
+        """Đồng bộ vector DB của chatbot: chỉ embed lại phòng có nội dung thay đổi"""
+        from app.services.chatbot_service import HotelRAGChatbot
+        stats = HotelRAGChatbot().rebuild_vectorstore(full=full, hotel_ids=list(hotel_ids) or None)
+        click.echo(f"Đã đồng bộ vector DB: {stats}")
+
+    @app.cli.command('clear-cache')
+    def clear_cache():
+        """Xóa toàn bộ cache đọc của các trang công khai"""
+        from app.services.cache_service import CacheService
+        CacheService.clear()
+        click.echo(f'Đã xóa cache ({CacheService.get_backend().name})')
+
+    @app.cli.command('run-jobs')
+    @click.option('--threads', default=None, type=int, help='Số thread worker (mặc định JOB_WORKER_THREADS)')
+    @click.option('--queue', 'queues', multiple=True, help='Chỉ xử lý các hàng đợi này')
+    @click.option('--once', is_flag=True, help='Chạy hết job đến hạn rồi thoát')
+    def run_jobs(threads, queues, once):
+        """Chạy worker xử lý hàng đợi việc nền (email...)"""
+        from app.services.job_queue import JobQueue, JobWorkerPool
+        if once:
+            total = JobQueue.run_pending(queues=list(queues) or None)
+            click.echo(f'Đã xử lý {total} job')
+            return
+
+        import time
+        pool = JobWorkerPool(
+            app,
+            threads=threads or app.config.get('JOB_WORKER_THREADS', 2),
+            poll_interval=app.config.get('JOB_POLL_INTERVAL', 5),
+            queues=list(queues) or None
+        )
+        pool.start()
+        click.echo(f'Đang chạy {pool.threads} worker, Ctrl+C để dừng')
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pool.stop(timeout=30)
+
+    @app.cli.command('retry-failed-jobs')
+    @click.option('--job-id', 'job_ids', multiple=True, type=int, help='Chỉ chạy lại các job này')
+    def retry_failed_jobs(job_ids):
+        """Đưa job lỗi hết số lần thử về hàng đợi"""
+        from app.services.job_queue import JobQueue
+        total = JobQueue.retry_failed(list(job_ids) or None)
+        click.echo(f'Đã đưa {total} job về hàng đợi')
+
+    @app.cli.command('purge-jobs')
+    @click.option('--days', default=None, type=int, help='Xóa job đã xong quá số ngày này (mặc định JOB_RETENTION_DAYS)')
+    def purge_jobs(days):
+        """Xóa job đã chạy xong (payload email có token), dùng cho cron khi không chạy worker thường trực"""
+        from app.services.job_queue import JobQueue, DEFAULT_RETENTION_DAYS
+        days = days if days is not None else app.config.get('JOB_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)
+        total = JobQueue.purge_done(days)
+        click.echo(f'Đã xóa {total} job đã xong quá {days} ngày')
+
+    @app.cli.command('recount-notifications')
+    @click.option('--user-id', 'user_ids', multiple=True, type=int, help='Chỉ đếm lại cho các user này')
+    def recount_notifications(user_ids):
+        """Đếm lại bộ đếm thông báo chưa đọc users.unread_notifications"""
+        from app.services.notification_service import NotificationService
+        total = NotificationService.recount_unread(list(user_ids) or None)
+        click.echo(f'Đã đếm lại thông báo chưa đọc cho {total} user')
+
+    @app.cli.command('refresh-platform-stats')
+    def refresh_platform_stats():
+        """Đếm lại số liệu dashboard admin (bảng platform_stats), dùng cho cron"""
+        from app.services.platform_stats_service import PlatformStatsService
+        stats = PlatformStatsService.reconcile()
+        click.echo(f'Đã đối soát platform_stats: {stats.to_summary()}')
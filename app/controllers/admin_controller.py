@@ -1,9 +1,7 @@
-from datetime import datetime
-from flask import request, session, send_file, Response
-from sqlalchemy import func
+from datetime import datetime, timedelta
+from flask import request, session, send_file, Response, current_app, stream_with_context
 from marshmallow import ValidationError
 import os
-import csv
 import tempfile
 from app import db
 from app.models.user import User
@@ -12,10 +10,15 @@ from app.models.booking import Booking
 from app.models.payment import Payment
 from app.models.review import Review
 from app.models.role import Role
-from app.models.room import Room
 from app.schemas.user_schema import AdminUserCreateSchema
+from app.services.platform_stats_service import PlatformStatsService
 from app.utils.response import success_response, error_response, validation_error_response, paginated_response
+from app.utils.pagination import get_pagination_args, paginate, CursorError
 from app.utils.validators import normalize_email
+from app.utils.csv_stream import iter_csv
+
+# Số dòng mỗi lần đọc từ cursor phía server khi xuất báo cáo
+REPORT_YIELD_PER = 1000
 
 
 class AdminController:
@@ -54,41 +57,14 @@ class AdminController:
             return error
         
         try:
-            total_users = User.query.count()
-            active_users = User.query.filter_by(is_active=True).count()
-            total_hotels = Hotel.query.count()
-            pending_hotels = Hotel.query.filter_by(status='pending').count()
-            active_hotels = Hotel.query.filter_by(status='active').count()
-            total_bookings = Booking.query.count()
-            total_revenue = db.session.query(func.coalesce(func.sum(Booking.final_amount), 0)).filter(
-                Booking.status == 'checked_out'
-            ).scalar() or 0
-            
-            total_payments = Payment.query.count()
-            total_reviews = Review.query.count()
-            total_rooms = Room.query.count()
-            
-            avg_rating = db.session.query(func.coalesce(func.avg(Review.rating), 0)).filter(
-                Review.rating.isnot(None)
-            ).scalar() or 0
+            stats = PlatformStatsService.get_snapshot()
             
             recent_hotels = Hotel.query.order_by(Hotel.created_at.desc()).limit(5).all()
             recent_users = User.query.order_by(User.created_at.desc()).limit(5).all()
             
             return success_response(data={
-                'summary': {
-                    'total_users': total_users,
-                    'active_users': active_users,
-                    'total_hotels': total_hotels,
-                    'pending_hotels': pending_hotels,
-                    'active_hotels': active_hotels,
-                    'total_bookings': total_bookings,
-                    'total_revenue': float(total_revenue),
-                    'total_payments': total_payments,
-                    'total_reviews': total_reviews,
-                    'total_rooms': total_rooms,
-                    'avg_rating': float(avg_rating) if avg_rating else 0.0
-                },
+                'summary': stats.to_summary(),
+                'stats_meta': stats.freshness(),
                 'recent_hotels': [hotel.to_dict() for hotel in recent_hotels],
                 'recent_users': [user.to_dict() for user in recent_users]
             })
@@ -421,15 +397,19 @@ class AdminController:
             return error
         
         try:
-            page = request.args.get('page', 1, type=int)
-            per_page = request.args.get('per_page', 10, type=int)
-            
-            query = Booking.query.order_by(Booking.created_at.desc())
-            total = query.count()
-            bookings = query.offset((page - 1) * per_page).limit(per_page).all()
+            args = get_pagination_args()
+            
+            result = paginate(
+                Booking.query,
+                [(Booking.created_at, True), (Booking.booking_id, True)],
+                page=args['page'],
+                per_page=args['per_page'],
+                after=args['after'],
+                count=args['count']
+            )
             
             bookings_data = []
-            for booking in bookings:
+            for booking in result.items:
                 booking_dict = booking.to_dict()
                 booking_dict['hotel'] = booking.hotel.to_dict() if booking.hotel else None
                 booking_dict['user'] = booking.user.to_dict() if booking.user else None
@@ -437,13 +417,10 @@ class AdminController:
             
             return success_response(data={
                 'bookings': bookings_data,
-                'pagination': {
-                    'page': page,
-                    'per_page': per_page,
-                    'total': total,
-                    'pages': (total + per_page - 1) // per_page
-                }
+                'pagination': result.to_dict()
             })
+        except CursorError as exc:
+            return error_response(str(exc), 400)
         except Exception as exc:
             return error_response(f'Lỗi khi lấy danh sách booking: {str(exc)}', 500)
     
@@ -626,103 +603,222 @@ class AdminController:
             db.session.rollback()
             return error_response(f'Lỗi khi xóa role: {str(exc)}', 500)
     
+    @staticmethod
+    def perf_stats():
+        """Số query, thời gian DB theo endpoint và các request chậm gần nhất"""
+        _, error = AdminController._require_admin()
+        if error:
+            return error
+        
+        from app.middleware.query_profiler import QueryProfiler
+        from app.services.cache_service import CacheService
+        from app.services.chatbot_cache import cache_stats
+        data = QueryProfiler.snapshot()
+        data['profiler_enabled'] = current_app.config.get('QUERY_PROFILER_ENABLED', False)
+        data['cache'] = CacheService.stats()
+        data['chatbot_cache'] = cache_stats()
+        return success_response(data=data)
+    
+    @staticmethod
+    def reset_perf_stats():
+        _, error = AdminController._require_admin()
+        if error:
+            return error
+        
+        from app.middleware.query_profiler import QueryProfiler
+        from app.services.cache_service import CacheService
+        QueryProfiler.reset()
+        CacheService.reset_stats()
+        return success_response(message='Đã xóa số liệu đo')
+    
+    @staticmethod
+    def job_stats():
+        """Số job theo trạng thái / task và các job lỗi gần nhất"""
+        _, error = AdminController._require_admin()
+        if error:
+            return error
+        
+        from app.services.job_queue import JobQueue
+        data = JobQueue.stats()
+        data['failed_jobs'] = JobQueue.failed_jobs(limit=request.args.get('limit', 20, type=int))
+        return success_response(data=data)
+    
+    @staticmethod
+    def retry_failed_jobs():
+        _, error = AdminController._require_admin()
+        if error:
+            return error
+        
+        from app.services.job_queue import JobQueue
+        data = request.get_json(silent=True) or {}
+        job_ids = [int(job_id) for job_id in data.get('job_ids') or []]
+        total = JobQueue.retry_failed(job_ids or None)
+        return success_response(data={'retried': total}, message=f'Đã đưa {total} job về hàng đợi')
+    
+    @staticmethod
+    def refresh_platform_stats():
+        """Đếm lại ngay số liệu dashboard thay vì chờ job đối soát"""
+        _, error = AdminController._require_admin()
+        if error:
+            return error
+        
+        try:
+            stats = PlatformStatsService.reconcile()
+            return success_response(
+                data={'summary': stats.to_summary(), 'stats_meta': stats.freshness()},
+                message='Đã cập nhật số liệu thống kê'
+            )
+        except Exception as exc:
+            db.session.rollback()
+            return error_response(f'Lỗi khi cập nhật số liệu: {str(exc)}', 500)
+    
+    @staticmethod
+    def _report_range(data):
+        """start_date / end_date dạng YYYY-MM-DD (tính cả ngày cuối), lọc theo ngày tạo; trả về (start, end, lỗi)"""
+        bounds = []
+        for key in ('start_date', 'end_date'):
+            value = (data.get(key) or '').strip()
+            if not value:
+                bounds.append(None)
+                continue
+            try:
+                bounds.append(datetime.strptime(value, '%Y-%m-%d'))
+            except ValueError:
+                return None, None, error_response(f'{key} phải có dạng YYYY-MM-DD', 400)
+        start, end = bounds
+        if end is not None:
+            end = end + timedelta(days=1)
+        if start is not None and end is not None and start >= end:
+            return None, None, error_response('start_date phải trước end_date', 400)
+        return start, end, None
+    
+    @staticmethod
+    def _filter_created(query, column, start, end):
+        if start is not None:
+            query = query.filter(column >= start)
+        if end is not None:
+            query = query.filter(column < end)
+        return query
+    
+    @staticmethod
+    def _report_rows(summary, reconciled_at, start, end):
+        """Các dòng của báo cáo; booking / thanh toán đọc bằng cursor phía server theo từng lô (yield_per)"""
+        yield ['BÁO CÁO TỔNG QUAN HỆ THỐNG']
+        yield ['Ngày xuất báo cáo:', datetime.now().strftime('%d/%m/%Y %H:%M:%S')]
+        yield [
+            'Khoảng thời gian:',
+            start.strftime('%d/%m/%Y') if start else 'Từ đầu',
+            (end - timedelta(days=1)).strftime('%d/%m/%Y') if end else 'Đến nay'
+        ]
+        yield []
+        
+        yield ['THỐNG KÊ TỔNG QUAN']
+        yield ['Tổng người dùng', summary['total_users']]
+        yield ['Người dùng đang hoạt động', summary['active_users']]
+        yield ['Tổng khách sạn', summary['total_hotels']]
+        yield ['Khách sạn đang hoạt động', summary['active_hotels']]
+        yield ['Khách sạn chờ duyệt', summary['pending_hotels']]
+        yield ['Tổng booking', summary['total_bookings']]
+        yield ['Tổng thanh toán', summary['total_payments']]
+        yield ['Tổng đánh giá', summary['total_reviews']]
+        yield ['Tổng phòng', summary['total_rooms']]
+        yield ['Doanh thu tổng', f"{summary['total_revenue']:,.0f} VNĐ"]
+        yield ['Đánh giá trung bình', f"{summary['avg_rating']:.1f}/5"]
+        yield ['Số liệu đối soát lúc', reconciled_at.strftime('%d/%m/%Y %H:%M:%S') if reconciled_at else 'N/A']
+        yield []
+        
+        yield ['CHI TIẾT BOOKING']
+        yield ['ID', 'Khách sạn', 'Người dùng', 'Check-in', 'Check-out', 'Trạng thái', 'Số tiền']
+        # Chỉ lấy cột cần thiết, join sẵn khách sạn / người dùng: không tạo object ORM, không lazy-load từng dòng
+        bookings = db.session.query(
+            Booking.booking_id,
+            Hotel.hotel_name,
+            User.email,
+            Booking.check_in_date,
+            Booking.check_out_date,
+            Booking.status,
+            Booking.final_amount
+        ).outerjoin(
+            Hotel, Hotel.hotel_id == Booking.hotel_id
+        ).outerjoin(
+            User, User.user_id == Booking.user_id
+        )
+        bookings = AdminController._filter_created(bookings, Booking.created_at, start, end)
+        bookings = bookings.order_by(Booking.created_at.desc(), Booking.booking_id.desc())
+        for row in bookings.yield_per(REPORT_YIELD_PER):
+            yield [
+                row.booking_id,
+                row.hotel_name or 'N/A',
+                row.email or 'N/A',
+                row.check_in_date.strftime('%d/%m/%Y') if row.check_in_date else 'N/A',
+                row.check_out_date.strftime('%d/%m/%Y') if row.check_out_date else 'N/A',
+                row.status,
+                f'{float(row.final_amount):,.0f}' if row.final_amount else '0'
+            ]
+        yield []
+        
+        yield ['CHI TIẾT THANH TOÁN']
+        yield ['ID', 'Booking ID', 'Phương thức', 'Số tiền', 'Trạng thái', 'Ngày thanh toán']
+        payments = db.session.query(
+            Payment.payment_id,
+            Payment.booking_id,
+            Payment.payment_method,
+            Payment.amount,
+            Payment.payment_status,
+            Payment.payment_date
+        )
+        payments = AdminController._filter_created(payments, Payment.created_at, start, end)
+        # payments không có index created_at; payment_id tăng theo thời gian tạo
+        for row in payments.order_by(Payment.payment_id.desc()).yield_per(REPORT_YIELD_PER):
+            yield [
+                row.payment_id,
+                row.booking_id,
+                row.payment_method,
+                f'{float(row.amount):,.0f}' if row.amount else '0',
+                row.payment_status,
+                row.payment_date.strftime('%d/%m/%Y %H:%M') if row.payment_date else 'N/A'
+            ]
+    
     @staticmethod
     def export_report():
+        """Xuất CSV toàn bộ booking / thanh toán (lọc start_date, end_date), compress=gzip để tải file .csv.gz.
+
+        Response streaming: ghi từng khúc trong lúc đọc DB nên bộ nhớ không tăng theo số dòng.
+        """
         user, error = AdminController._require_admin()
         if error:
             return error
         
         try:
+            data = AdminController._get_request_data()
+            start, end, range_error = AdminController._report_range(data)
+            if range_error:
+                return range_error
+            compress = str(data.get('compress', '')).lower() in ('gzip', '1', 'true')
+            
+            # Đọc số liệu trước khi stream: generator không dùng object ORM của session
+            stats = PlatformStatsService.get_snapshot()
+            summary, reconciled_at = stats.to_summary(), stats.reconciled_at
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f'admin_report_{timestamp}.csv'
-            
-            output = []
-            
-            output.append(['BÁO CÁO TỔNG QUAN HỆ THỐNG'])
-            output.append(['Ngày xuất báo cáo:', datetime.now().strftime('%d/%m/%Y %H:%M:%S')])
-            output.append([])
-            
-            total_users = User.query.count()
-            active_users = User.query.filter_by(is_active=True).count()
-            total_hotels = Hotel.query.count()
-            pending_hotels = Hotel.query.filter_by(status='pending').count()
-            active_hotels = Hotel.query.filter_by(status='active').count()
-            total_bookings = Booking.query.count()
-            total_payments = Payment.query.count()
-            total_reviews = Review.query.count()
-            total_rooms = Room.query.count()
-            
-            total_revenue = db.session.query(func.coalesce(func.sum(Booking.final_amount), 0)).filter(
-                Booking.status == 'checked_out'
-            ).scalar() or 0
-            
-            avg_rating = db.session.query(func.coalesce(func.avg(Review.rating), 0)).filter(
-                Review.rating.isnot(None)
-            ).scalar() or 0
-            
-            output.append(['THỐNG KÊ TỔNG QUAN'])
-            output.append(['Tổng người dùng', total_users])
-            output.append(['Người dùng đang hoạt động', active_users])
-            output.append(['Tổng khách sạn', total_hotels])
-            output.append(['Khách sạn đang hoạt động', active_hotels])
-            output.append(['Khách sạn chờ duyệt', pending_hotels])
-            output.append(['Tổng booking', total_bookings])
-            output.append(['Tổng thanh toán', total_payments])
-            output.append(['Tổng đánh giá', total_reviews])
-            output.append(['Tổng phòng', total_rooms])
-            output.append(['Doanh thu tổng', f'{float(total_revenue):,.0f} VNĐ'])
-            output.append(['Đánh giá trung bình', f'{float(avg_rating):.1f}/5'])
-            output.append([])
-            
-            output.append(['CHI TIẾT BOOKING'])
-            output.append(['ID', 'Khách sạn', 'Người dùng', 'Check-in', 'Check-out', 'Trạng thái', 'Số tiền'])
-            bookings = Booking.query.order_by(Booking.created_at.desc()).limit(100).all()
-            for booking in bookings:
-                hotel_name = booking.hotel.hotel_name if booking.hotel else 'N/A'
-                user_email = booking.user.email if booking.user else 'N/A'
-                output.append([
-                    booking.booking_id,
-                    hotel_name,
-                    user_email,
-                    booking.check_in_date.strftime('%d/%m/%Y') if booking.check_in_date else 'N/A',
-                    booking.check_out_date.strftime('%d/%m/%Y') if booking.check_out_date else 'N/A',
-                    booking.status,
-                    f'{float(booking.final_amount):,.0f}' if booking.final_amount else '0'
-                ])
-            output.append([])
-            
-            output.append(['CHI TIẾT THANH TOÁN'])
-            output.append(['ID', 'Booking ID', 'Phương thức', 'Số tiền', 'Trạng thái', 'Ngày thanh toán'])
-            payments = Payment.query.order_by(Payment.created_at.desc()).limit(100).all()
-            for payment in payments:
-                output.append([
-                    payment.payment_id,
-                    payment.booking_id,
-                    payment.payment_method,
-                    f'{float(payment.amount):,.0f}' if payment.amount else '0',
-                    payment.payment_status,
-                    payment.payment_date.strftime('%d/%m/%Y %H:%M') if payment.payment_date else 'N/A'
-                ])
-            
-            import io
-            output_buffer = io.StringIO()
-            writer = csv.writer(output_buffer)
-            for row in output:
-                writer.writerow(row)
-            
-            csv_data = output_buffer.getvalue()
-            output_buffer.close()
-            
-            response = Response(
-                csv_data.encode('utf-8-sig'),
-                mimetype='text/csv; charset=utf-8-sig',
+            filename = f'admin_report_{timestamp}.csv.gz' if compress else f'admin_report_{timestamp}.csv'
+            
+            def generate():
+                try:
+                    yield from iter_csv(AdminController._report_rows(summary, reconciled_at, start, end), compress=compress)
+                except Exception as exc:
+                    # Header đã gửi, không đổi được mã lỗi; ghi log để admin biết file bị cắt ngang
+                    current_app.logger.error(f'Xuất báo cáo bị gián đoạn: {exc}', exc_info=True)
+                    raise
+            
+            return Response(
+                stream_with_context(generate()),
+                mimetype='application/gzip' if compress else 'text/csv; charset=utf-8-sig',
                 headers={
                     'Content-Disposition': f'attachment; filename="{filename}"',
-                    'Content-Type': 'text/csv; charset=utf-8-sig'
+                    'Cache-Control': 'no-cache',
+                    'X-Accel-Buffering': 'no'
                 }
             )
-            
-            return response
         except Exception as exc:
             return error_response(f'Lỗi khi xuất báo cáo: {str(exc)}', 500)
 
@@ -3,6 +3,7 @@ from app import db
 from app.models.user import User
 from app.services.auth_service import AuthService
 from app.services.email_service import EmailService
+from app.services.job_queue import JobQueue
 from app.schemas.user_schema import UserRegistrationSchema, UserLoginSchema, ForgotPasswordSchema, ResetPasswordSchema
 from app.utils.response import success_response, error_response, validation_error_response
 from app.utils.validators import validate_required_fields, is_valid_token_format
@@ -51,6 +52,8 @@ class AuthController:
             
             token = AuthService.create_verification_token(user)
             EmailService.send_verification_email(user, token)
+            db.session.commit()
+            JobQueue.notify()
             
             return success_response(
                 data={'user': user.to_dict()},
@@ -148,6 +151,8 @@ class AuthController:
             if user:
                 token = AuthService.create_reset_token(user)
                 EmailService.send_reset_password_email(user, token)
+                db.session.commit()
+                JobQueue.notify()
             
             return success_response(
                 message='Nếu email tồn tại, liên kết đặt lại mật khẩu đã được gửi.'
@@ -238,5 +243,7 @@ class AuthController:
         
         token = AuthService.create_verification_token(user)
         EmailService.send_verification_email(user, token)
+        db.session.commit()
+        JobQueue.notify()
         
         return success_response(message='Email xác thực đã được gửi thành công')
\ No newline at end of file
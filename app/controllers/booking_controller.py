@@ -10,13 +10,18 @@ from app.models.discount_code import DiscountCode
 from app.models.discount_usage import DiscountUsage
 from app.schemas.booking_schema import (
     BookingCreateSchema, BookingUpdateSchema, CheckPriceSchema, 
-    BookingValidateSchema, BookingCancelSchema
+    BookingValidateSchema, BookingCancelSchema, BookingQuoteSchema
 )
+from app.services.availability_service import AvailabilityEngine, BOOKABLE_STATUSES
+from app.services.inventory_service import InventoryService, InventoryConflict
+from app.services.pricing_service import PricingEngine, PricingError
+from app.utils.database import run_with_retries, is_retryable_error
 from app.utils.response import success_response, error_response, paginated_response, validation_error_response
 from app.utils.validators import validate_required_fields
 from marshmallow import ValidationError
 from datetime import datetime, date
 from sqlalchemy import and_, or_
+from sqlalchemy.exc import OperationalError
 import random
 import string
 import re
@@ -182,158 +187,93 @@ class BookingController:
             if check_in < date.today():
                 return error_response('Ngày check-in không được trong quá khứ', 400)
             
-            num_nights = (check_out - check_in).days
-            total_amount = 0
-            booking_details = []
-            check_in_datetime = datetime.combine(check_in, datetime.min.time())
-            check_out_datetime = datetime.combine(check_out, datetime.min.time())
-            
-            # Calculate base prices first
-            for room_data in validated_data['rooms']:
-                room = Room.query.get(room_data['room_id'])
-                if not room:
-                    return error_response(f'Không tìm thấy phòng ID {room_data["room_id"]}', 404)
-                
-                if room.hotel_id != validated_data['hotel_id']:
-                    return error_response('Phòng không thuộc khách sạn này', 400)
-                
-                quantity = room_data['quantity']
-                price_per_night = room.base_price
-                subtotal = float(price_per_night) * quantity * num_nights
-                total_amount += subtotal
-                
-                booking_details.append({
-                    'room_id': room.room_id,
-                    'quantity': quantity,
-                    'price_per_night': price_per_night,
-                    'num_nights': num_nights,
-                    'subtotal': subtotal
-                })
-            
-            # Apply promotions (check for each room)
-            promotion_discount_total = 0
-            from app.models.promotion import Promotion
-            from sqlalchemy import or_, and_
-            
-            for room_data in validated_data['rooms']:
-                room = Room.query.get(room_data['room_id'])
-                quantity = room_data['quantity']
-                room_subtotal = float(room.base_price) * quantity * num_nights
-                
-                # Find active promotions for this room
-                promotion_query = Promotion.query.filter(
-                    Promotion.is_active == True,
-                    Promotion.start_date <= check_out_datetime,
-                    Promotion.end_date >= check_in_datetime,
-                    or_(
-                        Promotion.room_id == room.room_id,
-                        and_(Promotion.hotel_id == validated_data['hotel_id'], Promotion.room_id.is_(None))
-                    )
+            # Báo giá cho tất cả dòng phòng: 1 query phòng + 1 query promotion, tính trong memory
+            try:
+                quote = PricingEngine.quote(
+                    validated_data['hotel_id'],
+                    [(room_data['room_id'], room_data['quantity']) for room_data in validated_data['rooms']],
+                    check_in,
+                    check_out,
+                    discount_code=validated_data.get('discount_code')
                 )
-                
-                best_discount = 0
-                for promo in promotion_query.all():
-                    # Check min_nights
-                    if promo.min_nights and num_nights < promo.min_nights:
-                        continue
-                    
-                    # Check applicable_days if specified
-                    if promo.applicable_days:
-                        check_in_weekday = check_in.weekday()
-                        applicable_days_list = [int(d.strip()) for d in promo.applicable_days.split(',') if d.strip().isdigit()]
-                        if applicable_days_list and check_in_weekday not in applicable_days_list:
-                            continue
-                    
-                    # Calculate discount for this room
-                    if promo.discount_type == 'percentage':
-                        discount = room_subtotal * (float(promo.discount_value) / 100)
-                    else:  # fixed
-                        discount = float(promo.discount_value) * quantity  # Apply per room
-                    
-                    if discount > best_discount:
-                        best_discount = discount
-                
-                promotion_discount_total += best_discount
+            except PricingError as e:
+                return error_response(str(e), e.status_code)
             
-            # Apply promotion discount
-            total_amount_after_promotion = total_amount - promotion_discount_total
+            booking_details = quote.booking_details()
             
-            # Xử lý discount code nếu có (áp dụng sau promotion)
-            discount_amount = 0
-            discount_code_obj = None
+            # Kiểm tra nhanh (chưa khóa) để báo hết phòng sớm;
+            # kiểm tra chính thức nằm trong reserve() bên dưới
+            requested = InventoryService.room_quantities(None, booking_details)
             
-            if validated_data.get('discount_code'):
-                discount_code_str = validated_data['discount_code']
-                discount_code_obj = DiscountCode.query.filter_by(code=discount_code_str, is_active=True).first()
-                
-                if discount_code_obj:
-                    # Check if discount belongs to hotel owner
-                    hotel = Hotel.query.get(validated_data['hotel_id'])
-                    if not hotel:
-                        return error_response('Không tìm thấy khách sạn', 404)
-                    
-                    if hotel.owner_id != discount_code_obj.owner_id:
-                        return error_response('Mã giảm giá không áp dụng cho khách sạn này', 400)
-                    
-                    # Kiểm tra validity
-                    now = datetime.utcnow()
-                    if discount_code_obj.start_date <= now <= discount_code_obj.end_date:
-                        # Kiểm tra minimum order amount (sau khi áp dụng promotion)
-                        if total_amount_after_promotion >= (discount_code_obj.min_order_amount or 0):
-                            # Kiểm tra usage limit
-                            if not discount_code_obj.usage_limit or discount_code_obj.used_count < discount_code_obj.usage_limit:
-                                # Tính discount (dựa trên tổng sau promotion)
-                                if discount_code_obj.discount_type == 'percentage':
-                                    discount_amount = total_amount_after_promotion * (discount_code_obj.discount_value / 100)
-                                else:  # fixed
-                                    discount_amount = discount_code_obj.discount_value
-                                
-                                # Áp dụng max discount nếu có
-                                if discount_code_obj.max_discount_amount:
-                                    discount_amount = min(discount_amount, discount_code_obj.max_discount_amount)
-            
-            final_amount = total_amount_after_promotion - discount_amount
-            total_discount = promotion_discount_total + discount_amount
-            booking_code = BookingController._generate_booking_code()
-            
-            booking = Booking(
-                booking_code=booking_code,
-                user_id=session['user_id'],
-                hotel_id=validated_data['hotel_id'],
-                check_in_date=check_in,
-                check_out_date=check_out,
-                num_guests=validated_data['num_guests'],
-                total_amount=total_amount,
-                discount_amount=total_discount,
-                final_amount=final_amount,
-                special_requests=validated_data.get('special_requests'),
-                status='confirmed'  # INSTANT CONFIRM - Changed from 'pending'
+            availability = AvailabilityEngine.load(
+                list(requested.keys()), check_in, check_out,
+                usable_statuses=BOOKABLE_STATUSES
             )
+            unavailable = availability.unavailable(requested)
+            if unavailable:
+                return error_response(str(InventoryConflict(unavailable)), 409)
             
-            db.session.add(booking)
-            db.session.flush()
-            
-            for detail_data in booking_details:
-                detail = BookingDetail(
-                    booking_id=booking.booking_id,
-                    **detail_data
-                )
-                db.session.add(detail)
+            discount_amount = quote.discount_code_amount
+            discount_code_id = quote.discount_code.code_id if quote.discount_code and discount_amount > 0 else None
             
-            # Lưu discount usage nếu có
-            if discount_code_obj and discount_amount > 0:
-                discount_usage = DiscountUsage(
-                    code_id=discount_code_obj.code_id,
+            def reserve():
+                # Khóa sổ phòng, kiểm tra lại sức chứa rồi insert booking trong cùng transaction
+                InventoryService.lock_and_check(requested, check_in, check_out)
+                
+                booking = Booking(
+                    booking_code=BookingController._generate_booking_code(),
                     user_id=session['user_id'],
-                    booking_id=booking.booking_id,
-                    discount_amount=discount_amount
+                    hotel_id=validated_data['hotel_id'],
+                    check_in_date=check_in,
+                    check_out_date=check_out,
+                    num_guests=validated_data['num_guests'],
+                    total_amount=quote.total_amount,
+                    discount_amount=quote.total_discount,
+                    final_amount=quote.final_amount,
+                    special_requests=validated_data.get('special_requests'),
+                    status='confirmed'  # INSTANT CONFIRM - Changed from 'pending'
                 )
-                db.session.add(discount_usage)
                 
-                # Tăng used_count
-                discount_code_obj.used_count += 1
-            
-            db.session.commit()
+                db.session.add(booking)
+                db.session.flush()
+                
+                for detail_data in booking_details:
+                    detail = BookingDetail(
+                        booking_id=booking.booking_id,
+                        **detail_data
+                    )
+                    db.session.add(detail)
+                
+                InventoryService.reserve(booking, booking_details)
+                
+                # Lưu discount usage nếu có
+                if discount_code_id:
+                    discount_usage = DiscountUsage(
+                        code_id=discount_code_id,
+                        user_id=session['user_id'],
+                        booking_id=booking.booking_id,
+                        discount_amount=discount_amount
+                    )
+                    db.session.add(discount_usage)
+                    
+                    # Tăng used_count bằng biểu thức SQL để không mất lượt khi đặt đồng thời
+                    DiscountCode.query.filter_by(code_id=discount_code_id).update(
+                        {DiscountCode.used_count: DiscountCode.used_count + 1},
+                        synchronize_session=False
+                    )
+                
+                db.session.commit()
+                return booking
+            
+            try:
+                booking = run_with_retries(reserve)
+            except InventoryConflict as e:
+                db.session.rollback()
+                return error_response(str(e), 409)
+            except OperationalError as e:
+                if not is_retryable_error(e):
+                    raise
+                return error_response('Phòng đang được nhiều khách đặt cùng lúc, vui lòng thử lại', 409)
             
             return success_response(
                 data={'booking': booking.to_dict()},
@@ -360,37 +300,67 @@ class BookingController:
             
             check_in = validated_data.get('check_in_date', booking.check_in_date)
             check_out = validated_data.get('check_out_date', booking.check_out_date)
-            num_nights = (check_out - check_in).days
-            
-            total_amount = 0
-            breakdown = []
+            if check_in >= check_out:
+                return error_response('Ngày check-out phải sau ngày check-in', 400)
             
-            for detail in booking.booking_details:
-                room = Room.query.get(detail.room_id)
-                price = room.base_price
-                subtotal = price * detail.quantity * num_nights
-                total_amount += subtotal
-                
-                breakdown.append({
-                    'room_id': room.room_id,
-                    'room_name': room.room_name,
-                    'quantity': detail.quantity,
-                    'price_per_night': float(price),
-                    'num_nights': num_nights,
-                    'subtotal': float(subtotal)
-                })
+            quote = PricingEngine.quote(
+                booking.hotel_id,
+                [(detail.room_id, detail.quantity) for detail in booking.booking_details],
+                check_in,
+                check_out
+            )
             
             return success_response(data={
-                'total_amount': float(total_amount),
-                'breakdown': breakdown,
-                'num_nights': num_nights
+                'total_amount': float(quote.total_amount),
+                'promotion_discount': float(quote.promotion_discount),
+                'final_amount': float(quote.final_amount),
+                'breakdown': [line.to_dict() for line in quote.lines],
+                'num_nights': quote.num_nights
             })
             
         except ValidationError as e:
             return validation_error_response(e.messages)
+        except PricingError as e:
+            return error_response(str(e), e.status_code)
         except Exception as e:
             return error_response(f'Lỗi kiểm tra giá: {str(e)}', 500)
     
+    @staticmethod
+    def quote():
+        """Báo giá chi tiết (giá gốc, khuyến mãi từng phòng, mã giảm giá) trước khi đặt"""
+        try:
+            data = BookingController._get_request_data()
+            
+            required_fields = ['hotel_id', 'check_in_date', 'check_out_date', 'rooms']
+            is_valid, error_msg = validate_required_fields(data, required_fields)
+            if not is_valid:
+                return error_response(error_msg, 400)
+            
+            schema = BookingQuoteSchema()
+            validated_data = schema.load(data)
+            
+            check_in = validated_data['check_in_date']
+            check_out = validated_data['check_out_date']
+            if check_in >= check_out:
+                return error_response('Ngày check-out phải sau ngày check-in', 400)
+            
+            quote = PricingEngine.quote(
+                validated_data['hotel_id'],
+                [(room_data['room_id'], room_data['quantity']) for room_data in validated_data['rooms']],
+                check_in,
+                check_out,
+                discount_code=validated_data.get('discount_code')
+            )
+            
+            return success_response(data={'quote': quote.to_dict()})
+            
+        except ValidationError as e:
+            return validation_error_response(e.messages)
+        except PricingError as e:
+            return error_response(str(e), e.status_code)
+        except Exception as e:
+            return error_response(f'Lỗi báo giá: {str(e)}', 500)
+    
     @staticmethod
     def update_booking(booking_id):
         if 'user_id' not in session:
@@ -411,11 +381,43 @@ class BookingController:
             schema = BookingUpdateSchema()
             validated_data = schema.load(data)
             
-            for key, value in validated_data.items():
-                if hasattr(booking, key):
-                    setattr(booking, key, value)
+            check_in = validated_data.get('check_in_date', booking.check_in_date)
+            check_out = validated_data.get('check_out_date', booking.check_out_date)
+            if not check_in or not check_out or check_in >= check_out:
+                return error_response('Ngày check-out phải sau ngày check-in', 400)
             
-            db.session.commit()
+            def apply_update():
+                # Chạy lại sau rollback (deadlock) nên nạp lại booking và áp lại thay đổi mỗi lần
+                booking = Booking.query.get(booking_id)
+                old_check_in = booking.check_in_date
+                old_check_out = booking.check_out_date
+                
+                for key, value in validated_data.items():
+                    if hasattr(booking, key):
+                        setattr(booking, key, value)
+                
+                if (booking.check_in_date, booking.check_out_date) != (old_check_in, old_check_out):
+                    # Trả các đêm cũ rồi khóa, kiểm tra và giữ phòng cho khoảng ngày mới trong cùng transaction
+                    InventoryService.release(booking, check_in=old_check_in, check_out=old_check_out)
+                    InventoryService.lock_and_check(
+                        InventoryService.room_quantities(booking),
+                        booking.check_in_date,
+                        booking.check_out_date
+                    )
+                    InventoryService.reserve(booking)
+                
+                db.session.commit()
+                return booking
+            
+            try:
+                booking = run_with_retries(apply_update)
+            except InventoryConflict as e:
+                db.session.rollback()
+                return error_response(str(e), 409)
+            except OperationalError as e:
+                if not is_retryable_error(e):
+                    raise
+                return error_response('Phòng đang được nhiều khách đặt cùng lúc, vui lòng thử lại', 409)
             
             return success_response(
                 data={'booking': booking.to_dict()},
@@ -448,9 +450,11 @@ class BookingController:
             schema = BookingCancelSchema()
             validated_data = schema.load(data)
             
+            previous_status = booking.status
             booking.status = 'cancelled'
             booking.cancellation_reason = validated_data.get('reason')
             booking.cancelled_at = datetime.utcnow()
+            InventoryService.sync_status(booking, previous_status)
             
             db.session.commit()
             
@@ -510,7 +514,9 @@ class BookingController:
             if booking.status != 'confirmed':
                 return error_response('Chỉ có thể check-in booking đã xác nhận', 400)
             
+            previous_status = booking.status
             booking.status = 'checked_in'
+            InventoryService.sync_status(booking, previous_status)
             db.session.commit()
             
             return success_response(message='Check-in thành công')
@@ -538,7 +544,9 @@ class BookingController:
             if booking.status != 'checked_in':
                 return error_response('Chỉ có thể check-out booking đã check-in', 400)
             
+            previous_status = booking.status
             booking.status = 'checked_out'
+            InventoryService.sync_status(booking, previous_status)
             db.session.commit()
             
             return success_response(message='Check-out thành công')
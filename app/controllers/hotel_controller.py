@@ -14,13 +14,21 @@ from app.schemas.hotel_schema import (
     AmenityUpdateSchema, PolicyCreateSchema
 )
 from app.utils.response import success_response, error_response, paginated_response, validation_error_response
+from app.utils.pagination import get_pagination_args, paginate, CursorError
 from app.utils.validators import validate_required_fields
+from app.services.cache_service import CacheService, TAG_HOTELS, TAG_HOTEL_DETAILS, hotel_tag, user_profile_tag
 from marshmallow import ValidationError
 from werkzeug.utils import secure_filename
 from datetime import datetime, time, date
+from sqlalchemy import func, exists
+from sqlalchemy.orm import selectinload
 import os
 import uuid
 
+# Cache bị xóa theo tag ngay khi khách sạn / phòng / review liên quan thay đổi, TTL chỉ là giới hạn trên
+FEATURED_CACHE_TTL = 300
+HOTEL_DETAIL_CACHE_TTL = 600
+
 class HotelController:
     
     @staticmethod
@@ -44,8 +52,7 @@ class HotelController:
     @staticmethod
     def list_hotels():
         try:
-            page = request.args.get('page', 1, type=int)
-            per_page = request.args.get('per_page', 10, type=int)
+            args = get_pagination_args()
             city = request.args.get('city')
             min_rating = request.args.get('min_rating', type=int)
             max_rating = request.args.get('max_rating', type=int)
@@ -71,197 +78,177 @@ class HotelController:
                     )
                 )
             
-            total = query.count()
-            hotels = query.offset((page - 1) * per_page).limit(per_page).all()
+            result = paginate(
+                query,
+                [(Hotel.hotel_id, False)],
+                page=args['page'],
+                per_page=args['per_page'],
+                after=args['after'],
+                count=args['count']
+            )
             hotels_data = []
             
-            for hotel in hotels:
+            for hotel in result.items:
                 hotel_dict = hotel.to_dict()
                 hotel_dict['images'] = [img.to_dict() for img in hotel.images]
                 hotels_data.append(hotel_dict)
             
-            return paginated_response(hotels_data, page, per_page, total)
+            return paginated_response(hotels_data, result.page, result.per_page, result.total, next_cursor=result.next_cursor)
             
+        except CursorError as e:
+            return error_response(str(e), 400)
         except Exception as e:
             return error_response(f'Lỗi khi lấy danh sách khách sạn: {str(e)}', 500)
     
+    @staticmethod
+    def _load_featured_hotels(limit):
+        hotels = Hotel.query.options(
+            selectinload(Hotel.images)
+        ).filter_by(status='active', is_featured=True).limit(limit).all()
+        hotels_data = []
+        
+        for hotel in hotels:
+            hotel_dict = hotel.to_dict()
+            hotel_dict['images'] = [img.to_dict() for img in hotel.images]
+            hotels_data.append(hotel_dict)
+        return hotels_data
+    
     @staticmethod
     def get_featured_hotels():
         try:
             limit = request.args.get('limit', 10, type=int)
             
-            hotels = Hotel.query.filter_by(status='active', is_featured=True).limit(limit).all()
-            hotels_data = []
-            
-            for hotel in hotels:
-                hotel_dict = hotel.to_dict()
-                hotel_dict['images'] = [img.to_dict() for img in hotel.images]
-                hotels_data.append(hotel_dict)
+            hotels_data = CacheService.get_or_set(
+                f'featured_hotels:{limit}',
+                lambda: HotelController._load_featured_hotels(limit),
+                ttl=FEATURED_CACHE_TTL,
+                tags=(TAG_HOTELS,)
+            )
             
             return success_response(data={'hotels': hotels_data})
             
         except Exception as e:
             return error_response(f'Lỗi khi lấy khách sạn nổi bật: {str(e)}', 500)
     
+    @staticmethod
+    def _load_hotel_detail(hotel_id):
+        """Phần dùng chung cho mọi người xem (khách sạn, phòng, review) với số query cố định"""
+        hotel = Hotel.query.options(
+            selectinload(Hotel.images),
+            selectinload(Hotel.amenities),
+            selectinload(Hotel.cancellation_policies)
+        ).filter(Hotel.hotel_id == hotel_id).first()
+        
+        if not hotel:
+            return None
+        
+        hotel_dict = hotel.to_dict()
+        hotel_dict['images'] = [img.to_dict() for img in hotel.images]
+        hotel_dict['amenities'] = [amenity.to_dict() for amenity in hotel.amenities]
+        hotel_dict['cancellation_policies'] = [policy.to_dict() for policy in hotel.cancellation_policies]
+        hotel_dict.update(HotelController._rating_summary(hotel_id))
+        
+        # Rooms và các quan hệ con nạp bằng selectinload (mỗi quan hệ 1 query)
+        rooms_data = []
+        try:
+            rooms = Room.query.options(
+                selectinload(Room.images),
+                selectinload(Room.amenities),
+                selectinload(Room.room_type)
+            ).filter_by(hotel_id=hotel_id, status='available').order_by(Room.base_price.asc()).all()
+            for room in rooms:
+                room_dict = room.to_dict()
+                room_dict['images'] = [img.to_dict() for img in room.images]
+                room_dict['amenities'] = [amenity.to_dict() for amenity in room.amenities]
+                room_dict['room_type'] = room.room_type.to_dict() if room.room_type else None
+                rooms_data.append(room_dict)
+        except Exception as e:
+            print(f"Error getting rooms: {str(e)}")
+            rooms_data = []
+        
+        reviews_data = []
+        try:
+            recent_reviews = Review.query.options(
+                selectinload(Review.user),
+                selectinload(Review.booking)
+                    .selectinload(Booking.booking_details)
+                    .selectinload(BookingDetail.room)
+                    .selectinload(Room.room_type)
+            ).filter_by(hotel_id=hotel_id, status='active')\
+            .order_by(Review.created_at.desc())\
+            .limit(5).all()
+            
+            for review in recent_reviews:
+                review_dict = review.to_dict()
+                if review.user:
+                    review_dict['user'] = {
+                        'user_id': review.user.user_id,
+                        'full_name': review.user.full_name,
+                        'email': review.user.email,
+                        'name': review.user.full_name or review.user.email,
+                        'avatar_url': review.user.avatar_url
+                    }
+                else:
+                    review_dict['user'] = None
+                
+                # Thông tin phòng từ booking_details đã nạp sẵn
+                rooms_info = []
+                if review.booking:
+                    for detail in review.booking.booking_details:
+                        room = detail.room
+                        if not room:
+                            continue
+                        rooms_info.append({
+                            'room_id': room.room_id,
+                            'room_name': room.room_name if room.room_name else f'Phòng #{room.room_id}',
+                            'room_type': room.room_type.type_name if room.room_type else None,
+                            'area': float(room.area) if room.area else None,
+                            'max_guests': room.max_guests if room.max_guests else None,
+                            'quantity': detail.quantity if detail.quantity else 1
+                        })
+                review_dict['rooms'] = rooms_info
+                reviews_data.append(review_dict)
+        except Exception as e:
+            # Nếu có lỗi khi lấy reviews, vẫn tiếp tục với reviews_data = []
+            print(f"Error getting reviews: {str(e)}")
+            reviews_data = []
+        
+        return {
+            'hotel': hotel_dict,
+            'rooms': rooms_data,
+            'reviews': reviews_data
+        }
+    
     @staticmethod
     def get_hotel(hotel_id):
+        """Chi tiết khách sạn; phần công khai đọc qua cache, chỉ booking chờ review của user là query mỗi lần"""
         try:
-            hotel = Hotel.query.get(hotel_id)
+            detail = CacheService.get_or_set(
+                f'hotel_detail:{hotel_id}',
+                lambda: HotelController._load_hotel_detail(hotel_id),
+                ttl=HOTEL_DETAIL_CACHE_TTL,
+                tags=(hotel_tag(hotel_id), TAG_HOTEL_DETAILS),
+                # Review hiển thị tên / avatar người viết: user đổi hồ sơ thì nạp lại
+                value_tags=HotelController._reviewer_tags
+            )
             
-            if not hotel:
+            if not detail:
                 return error_response('Không tìm thấy khách sạn', 404)
             
-            hotel_dict = hotel.to_dict()
-            hotel_dict['images'] = [img.to_dict() for img in hotel.images]
-            hotel_dict['amenities'] = [amenity.to_dict() for amenity in hotel.amenities]
-            hotel_dict['cancellation_policies'] = [policy.to_dict() for policy in hotel.cancellation_policies]
-            
-            # Tính avg_rating và review_count
-            from sqlalchemy import func
-            avg_rating = db.session.query(func.avg(Review.rating))\
-                .filter(Review.hotel_id == hotel_id, Review.status == 'active')\
-                .scalar()
-            review_count = Review.query.filter_by(
-                hotel_id=hotel_id, 
-                status='active'
-            ).count()
-            # Chuyển đổi avg_rating sang float trước khi làm tròn
-            if avg_rating is not None:
-                avg_rating_float = float(avg_rating)
-                hotel_dict['avg_rating'] = round(avg_rating_float, 1)
-                hotel_dict['average_rating'] = round(avg_rating_float, 1)  # Keep for backward compatibility
-            else:
-                hotel_dict['avg_rating'] = 0
-                hotel_dict['average_rating'] = 0
-            hotel_dict['review_count'] = review_count
-            
-            # Tính đánh giá trung bình theo từng tiêu chí
-            avg_cleanliness = db.session.query(func.avg(Review.cleanliness_rating))\
-                .filter(Review.hotel_id == hotel_id, Review.status == 'active', Review.cleanliness_rating.isnot(None))\
-                .scalar()
-            avg_service = db.session.query(func.avg(Review.service_rating))\
-                .filter(Review.hotel_id == hotel_id, Review.status == 'active', Review.service_rating.isnot(None))\
-                .scalar()
-            avg_facilities = db.session.query(func.avg(Review.facilities_rating))\
-                .filter(Review.hotel_id == hotel_id, Review.status == 'active', Review.facilities_rating.isnot(None))\
-                .scalar()
-            avg_location = db.session.query(func.avg(Review.location_rating))\
-                .filter(Review.hotel_id == hotel_id, Review.status == 'active', Review.location_rating.isnot(None))\
-                .scalar()
-            
-            hotel_dict['avg_cleanliness_rating'] = round(float(avg_cleanliness), 1) if avg_cleanliness is not None else None
-            hotel_dict['avg_service_rating'] = round(float(avg_service), 1) if avg_service is not None else None
-            hotel_dict['avg_facilities_rating'] = round(float(avg_facilities), 1) if avg_facilities is not None else None
-            hotel_dict['avg_location_rating'] = round(float(avg_location), 1) if avg_location is not None else None
-            
-            # Lấy rooms với xử lý lỗi
-            rooms_data = []
-            try:
-                rooms_query = Room.query.filter_by(hotel_id=hotel_id, status='available').order_by(Room.base_price.asc()).all()
-                for room in rooms_query:
-                    try:
-                        room_dict = room.to_dict()
-                        room_dict['images'] = [img.to_dict() for img in room.images]
-                        room_dict['amenities'] = [amenity.to_dict() for amenity in room.amenities]
-                        room_dict['room_type'] = room.room_type.to_dict() if room.room_type else None
-                        rooms_data.append(room_dict)
-                    except Exception as e:
-                        print(f"Error processing room {room.room_id}: {str(e)}")
-                        continue
-            except Exception as e:
-                print(f"Error getting rooms: {str(e)}")
-                rooms_data = []
-
-            # Lấy reviews với xử lý lỗi riêng
-            reviews_data = []
-            try:
-                from sqlalchemy.orm import joinedload
-                from app.models.room_type import RoomType
-                
-                recent_reviews = Review.query.options(
-                    joinedload(Review.user),
-                    joinedload(Review.booking).joinedload(Booking.booking_details).joinedload(BookingDetail.room).joinedload(Room.room_type)
-                ).filter_by(hotel_id=hotel_id, status='active')\
-                .order_by(Review.created_at.desc())\
-                .limit(5).all()
-                
-                for review in recent_reviews:
-                    try:
-                        review_dict = review.to_dict()
-                        # Load user với thông tin đầy đủ
-                        if review.user:
-                            review_dict['user'] = {
-                                'user_id': review.user.user_id,
-                                'full_name': review.user.full_name,
-                                'email': review.user.email,
-                                'name': review.user.full_name or review.user.email,
-                                'avatar_url': review.user.avatar_url
-                            }
-                        else:
-                            review_dict['user'] = None
-                        
-                        # Lấy thông tin phòng từ booking_details qua relationship
-                        rooms_info = []
-                        try:
-                            if review.booking and review.booking.booking_details:
-                                for detail in review.booking.booking_details:
-                                    try:
-                                        # Sử dụng relationship đã được load
-                                        if detail.room:
-                                            room = detail.room
-                                            room_info = {
-                                                'room_id': room.room_id,
-                                                'room_name': room.room_name if room.room_name else f'Phòng #{room.room_id}',
-                                                'room_type': room.room_type.room_type_name if room.room_type and hasattr(room.room_type, 'room_type_name') else None,
-                                                'area': float(room.area) if room.area else None,
-                                                'max_guests': room.max_guests if room.max_guests else None,
-                                                'quantity': detail.quantity if detail.quantity else 1
-                                            }
-                                            rooms_info.append(room_info)
-                                    except Exception as e:
-                                        # Bỏ qua nếu không lấy được thông tin phòng
-                                        print(f"Error getting room info for detail {detail.detail_id}: {str(e)}")
-                                        import traceback
-                                        traceback.print_exc()
-                                        continue
-                        except Exception as e:
-                            # Bỏ qua nếu không lấy được booking_details
-                            print(f"Error getting booking_details for review {review.review_id}: {str(e)}")
-                            import traceback
-                            traceback.print_exc()
-                        
-                        review_dict['rooms'] = rooms_info if rooms_info else []
-                        reviews_data.append(review_dict)
-                    except Exception as e:
-                        # Bỏ qua review nếu có lỗi
-                        print(f"Error processing review {review.review_id}: {str(e)}")
-                        import traceback
-                        traceback.print_exc()
-                        continue
-            except Exception as e:
-                # Nếu có lỗi khi lấy reviews, vẫn tiếp tục với reviews_data = []
-                print(f"Error getting reviews: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                reviews_data = []
-
             eligible_bookings = []
             user_id = session.get('user_id')
             if user_id:
-                today = date.today()
-                
-                bookings_query = Booking.query.filter(
+                # Booking đã trả phòng mà chưa review: lọc bằng NOT EXISTS thay vì query từng booking
+                reviewed = exists().where(Review.booking_id == Booking.booking_id)
+                bookings = Booking.query.filter(
                     Booking.user_id == user_id,
                     Booking.hotel_id == hotel_id,
                     Booking.status == 'checked_out',
-                    Booking.check_out_date <= today
+                    Booking.check_out_date <= date.today(),
+                    ~reviewed
                 ).order_by(Booking.check_out_date.desc()).limit(10).all()
-
-                for booking in bookings_query:
-                    has_review = Review.query.filter_by(booking_id=booking.booking_id).first()
-                    if has_review:
-                        continue
-
+                
+                for booking in bookings:
                     booking_dict = booking.to_dict()
                     eligible_bookings.append({
                         'booking_id': booking.booking_id,
@@ -272,15 +259,46 @@ class HotelController:
                     })
             
             return success_response(data={
-                'hotel': hotel_dict,
-                'rooms': rooms_data,
-                'reviews': reviews_data,
+                'hotel': detail['hotel'],
+                'rooms': detail['rooms'],
+                'reviews': detail['reviews'],
                 'eligible_bookings': eligible_bookings
             })
             
         except Exception as e:
             return error_response(f'Lỗi khi lấy chi tiết khách sạn: {str(e)}', 500)
     
+    @staticmethod
+    def _reviewer_tags(detail):
+        return {user_profile_tag(review['user']['user_id']) for review in detail['reviews'] if review.get('user')}
+    
+    @staticmethod
+    def _rating_summary(hotel_id):
+        """Số review và điểm trung bình tổng / từng tiêu chí trong 1 query (AVG tự bỏ qua NULL)"""
+        row = db.session.query(
+            func.count(Review.review_id),
+            func.avg(Review.rating),
+            func.avg(Review.cleanliness_rating),
+            func.avg(Review.service_rating),
+            func.avg(Review.facilities_rating),
+            func.avg(Review.location_rating)
+        ).filter(Review.hotel_id == hotel_id, Review.status == 'active').one()
+        
+        review_count, avg_rating, avg_cleanliness, avg_service, avg_facilities, avg_location = row
+        
+        def rounded(value):
+            return round(float(value), 1) if value is not None else None
+        
+        return {
+            'avg_rating': rounded(avg_rating) or 0,
+            'average_rating': rounded(avg_rating) or 0,  # Keep for backward compatibility
+            'review_count': review_count or 0,
+            'avg_cleanliness_rating': rounded(avg_cleanliness),
+            'avg_service_rating': rounded(avg_service),
+            'avg_facilities_rating': rounded(avg_facilities),
+            'avg_location_rating': rounded(avg_location)
+        }
+    
     @staticmethod
     def create_hotel():
         if 'user_id' not in session:
@@ -593,26 +611,32 @@ class HotelController:
     @staticmethod
     def get_hotel_reviews(hotel_id):
         try:
-            page = request.args.get('page', 1, type=int)
-            per_page = request.args.get('per_page', 10, type=int)
+            args = get_pagination_args()
             
             hotel = Hotel.query.get(hotel_id)
             if not hotel:
                 return error_response('Không tìm thấy khách sạn', 404)
             
-            reviews_query = Review.query.filter_by(hotel_id=hotel_id, status='active').order_by(Review.created_at.desc())
-            total = reviews_query.count()
-            
-            reviews = reviews_query.offset((page - 1) * per_page).limit(per_page).all()
+            reviews_query = Review.query.filter_by(hotel_id=hotel_id, status='active')
+            result = paginate(
+                reviews_query,
+                [(Review.created_at, True), (Review.review_id, True)],
+                page=args['page'],
+                per_page=args['per_page'],
+                after=args['after'],
+                count=args['count']
+            )
             reviews_data = []
             
-            for review in reviews:
+            for review in result.items:
                 review_dict = review.to_dict()
                 review_dict['user'] = review.user.to_dict() if review.user else None
                 reviews_data.append(review_dict)
             
-            return paginated_response(reviews_data, page, per_page, total)
+            return paginated_response(reviews_data, result.page, result.per_page, result.total, next_cursor=result.next_cursor)
             
+        except CursorError as e:
+            return error_response(str(e), 400)
         except Exception as e:
             return error_response(f'Lỗi khi lấy đánh giá: {str(e)}', 500)
     
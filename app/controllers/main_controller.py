@@ -1,101 +1,108 @@
 from flask import request, session
 from app import db
 from app.models.hotel import Hotel
-from app.models.room import Room
-from app.models.review import Review
 from app.models.promotion import Promotion
 from app.models.amenity import Amenity
-from app.models.cancellation_policy import CancellationPolicy
-from sqlalchemy import func
+from app.models.hotel_search_summary import HotelSearchSummary
+from app.services.hotel_card_service import HotelCardService
+from app.services.autocomplete import AutocompleteService
+from app.services.cache_service import CacheService, TAG_HOTELS, TAG_PROMOTIONS, TAG_AMENITIES
+from sqlalchemy.orm import selectinload
 from datetime import datetime
 
+# Thời gian sống của các trang công khai trong cache (vẫn bị xóa ngay khi dữ liệu liên quan thay đổi)
+HOME_CACHE_TTL = 120
+PROMOTIONS_CACHE_TTL = 300
+AMENITIES_CACHE_TTL = 3600
+
 class MainController:
     
+    @staticmethod
+    def hotel_card_item(hotel):
+        """Dữ liệu khách sạn cho card (dict để lưu được vào cache, template đọc như object)"""
+        item = hotel.to_dict()
+        item['images'] = [img.to_dict() for img in hotel.images]
+        item['amenities'] = [amenity.to_dict() for amenity in hotel.amenities]
+        return item
+    
+    @staticmethod
+    def promotion_item(promotion):
+        item = promotion.to_dict()
+        # Template định dạng ngày bằng strftime nên giữ kiểu datetime
+        item['start_date'] = promotion.start_date
+        item['end_date'] = promotion.end_date
+        item['hotel'] = {
+            'hotel_id': promotion.hotel.hotel_id,
+            'hotel_name': promotion.hotel.hotel_name
+        } if promotion.hotel else None
+        return item
+    
+    @staticmethod
+    def _active_promotions_query():
+        now = datetime.utcnow()
+        return Promotion.query.filter(
+            Promotion.start_date <= now,
+            Promotion.end_date >= now,
+            Promotion.is_active == True
+        )
+    
+    @staticmethod
+    def _load_home_data():
+        # Summary qua mốc khuyến mãi được job nền làm mới (SearchSummaryService.run_refresh_expired),
+        # loader chỉ đọc
+        # Lấy luôn thống kê card từ hotel_search_summary trong cùng query
+        featured_rows = Hotel.query.outerjoin(
+            HotelSearchSummary, HotelSearchSummary.hotel_id == Hotel.hotel_id
+        ).filter(
+            Hotel.status == 'active',
+            Hotel.is_featured == True
+        ).add_entity(HotelSearchSummary).options(
+            selectinload(Hotel.images),
+            selectinload(Hotel.amenities)
+        ).order_by(
+            HotelSearchSummary.avg_rating.desc(), Hotel.hotel_id
+        ).limit(6).all()
+        
+        hotels_data = []
+        for card in HotelCardService.build_cards_from_rows(featured_rows):
+            card['hotel'] = MainController.hotel_card_item(card['hotel'])
+            hotels_data.append(card)
+        
+        cities = AutocompleteService.city_hotel_counts(limit=6)
+        
+        popular_cities = []
+        for city_name, count in cities:
+            sample_hotel = Hotel.query.filter_by(city=city_name, status='active').first()
+            popular_cities.append({
+                'name': city_name,
+                'count': count,
+                'image': sample_hotel.images[0].image_url if sample_hotel and sample_hotel.images else None
+            })
+        
+        # Get total count of active promotions
+        total_promotions_count = MainController._active_promotions_query().count()
+        
+        # Get limited promotions for display (2 items)
+        active_promotions = MainController._active_promotions_query().options(
+            selectinload(Promotion.hotel)
+        ).limit(2).all()
+        
+        return {
+            'featured_hotels': hotels_data,
+            'popular_cities': popular_cities,
+            'active_promotions': [MainController.promotion_item(promotion) for promotion in active_promotions],
+            'total_promotions_count': total_promotions_count
+        }
+    
     @staticmethod
     def get_home_data():
         try:
-            featured_hotels = Hotel.query.filter_by(status='active', is_featured=True).limit(6).all()
-            
-            hotels_data = []
-            for hotel in featured_hotels:
-                min_price = db.session.query(func.min(Room.base_price))\
-                    .filter(Room.hotel_id == hotel.hotel_id)\
-                    .filter(Room.status == 'available')\
-                    .scalar() or 1000000
-                
-                review_count = Review.query.filter_by(hotel_id=hotel.hotel_id, status='active').count()
-                
-                avg_rating = db.session.query(func.avg(Review.rating))\
-                    .filter_by(hotel_id=hotel.hotel_id, status='active')\
-                    .scalar()
-                
-                # Chuyển đổi avg_rating sang float an toàn
-                try:
-                    avg_rating_float = float(avg_rating) if avg_rating is not None else 0.0
-                except (TypeError, ValueError):
-                    avg_rating_float = 0.0
-                
-                # Kiểm tra có chính sách hủy miễn phí không (refund_percentage = 100%)
-                has_free_cancellation = CancellationPolicy.query.filter_by(
-                    hotel_id=hotel.hotel_id
-                ).filter(
-                    CancellationPolicy.refund_percentage == 100.00
-                ).first() is not None
-                
-                # Kiểm tra có promotion đang active không
-                has_active_promotion = Promotion.query.filter(
-                    Promotion.hotel_id == hotel.hotel_id,
-                    Promotion.start_date <= datetime.utcnow(),
-                    Promotion.end_date >= datetime.utcnow(),
-                    Promotion.is_active == True
-                ).first() is not None
-                
-                hotels_data.append({
-                    'hotel': hotel,
-                    'min_price': int(min_price),
-                    'review_count': review_count,
-                    'avg_rating': round(avg_rating_float, 1) if avg_rating_float > 0 else 0.0,
-                    'has_free_cancellation': has_free_cancellation,
-                    'has_active_promotion': has_active_promotion
-                })
-            
-            cities = db.session.query(
-                Hotel.city,
-                func.count(Hotel.hotel_id).label('hotel_count')
-            ).filter_by(status='active')\
-            .group_by(Hotel.city)\
-            .order_by(func.count(Hotel.hotel_id).desc())\
-            .limit(6).all()
-            
-            popular_cities = []
-            for city_name, count in cities:
-                sample_hotel = Hotel.query.filter_by(city=city_name, status='active').first()
-                popular_cities.append({
-                    'name': city_name,
-                    'count': count,
-                    'image': sample_hotel.images[0].image_url if sample_hotel and sample_hotel.images else None
-                })
-            
-            # Get total count of active promotions
-            total_promotions_count = Promotion.query.filter(
-                Promotion.start_date <= datetime.utcnow(),
-                Promotion.end_date >= datetime.utcnow(),
-                Promotion.is_active == True
-            ).count()
-            
-            # Get limited promotions for display (2 items)
-            active_promotions = Promotion.query.filter(
-                Promotion.start_date <= datetime.utcnow(),
-                Promotion.end_date >= datetime.utcnow(),
-                Promotion.is_active == True
-            ).limit(2).all()
-            
-            return {
-                'featured_hotels': hotels_data,
-                'popular_cities': popular_cities,
-                'active_promotions': active_promotions,
-                'total_promotions_count': total_promotions_count
-            }
+            return CacheService.get_or_set(
+                'home',
+                MainController._load_home_data,
+                ttl=HOME_CACHE_TTL,
+                tags=(TAG_HOTELS, TAG_PROMOTIONS)
+            )
             
         except Exception as e:
             print(f'Lỗi lấy dữ liệu trang chủ: {str(e)}')
@@ -111,26 +118,19 @@ class MainController:
             if not query_text:
                 return {'suggestions': []}
             
-            cities = db.session.query(Hotel.city).filter(
-                Hotel.city.ilike(f'%{query_text}%'),
-                Hotel.status == 'active'
-            ).distinct().limit(5).all()
-            
-            hotels = Hotel.query.filter(
-                Hotel.hotel_name.ilike(f'%{query_text}%'),
-                Hotel.status == 'active'
-            ).limit(5).all()
+            # Index tiền tố trong memory, không query DB mỗi lần gõ phím
+            matches = AutocompleteService.suggest(query_text, limit=5)
             
             suggestions = []
-            for city in cities:
-                suggestions.append({'type': 'city', 'value': city[0]})
+            for city in matches['cities']:
+                suggestions.append({'type': 'city', 'value': city['value']})
             
-            for hotel in hotels:
+            for hotel in matches['hotels']:
                 suggestions.append({
                     'type': 'hotel', 
-                    'value': hotel.hotel_name, 
-                    'id': hotel.hotel_id,
-                    'city': hotel.city
+                    'value': hotel['value'], 
+                    'id': hotel['id'],
+                    'city': hotel['city']
                 })
             
             return {'suggestions': suggestions}
@@ -142,27 +142,38 @@ class MainController:
     @staticmethod
     def get_all_amenities():
         try:
-            return Amenity.query.all()
+            return CacheService.get_or_set(
+                'amenities',
+                lambda: [amenity.to_dict() for amenity in Amenity.query.all()],
+                ttl=AMENITIES_CACHE_TTL,
+                tags=(TAG_AMENITIES,)
+            )
         except Exception as e:
             print(f'Lỗi lấy amenities: {str(e)}')
             return []
     
+    @staticmethod
+    def _load_promotions_data():
+        active_promotions = MainController._active_promotions_query().options(
+            selectinload(Promotion.hotel)
+        ).order_by(Promotion.start_date.desc()).all()
+        
+        return {
+            'promotions': [MainController.promotion_item(promotion) for promotion in active_promotions]
+        }
+    
     @staticmethod
     def get_promotions_data():
         try:
-            active_promotions = Promotion.query.filter(
-                Promotion.start_date <= datetime.utcnow(),
-                Promotion.end_date >= datetime.utcnow(),
-                Promotion.is_active == True
-            ).order_by(Promotion.start_date.desc()).all()
-            
-            return {
-                'promotions': active_promotions
-            }
+            return CacheService.get_or_set(
+                'promotions',
+                MainController._load_promotions_data,
+                ttl=PROMOTIONS_CACHE_TTL,
+                tags=(TAG_PROMOTIONS,)
+            )
             
         except Exception as e:
             print(f'Lỗi lấy dữ liệu khuyến mãi: {str(e)}')
             return {
                 'promotions': []
             }
-
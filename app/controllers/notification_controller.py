@@ -4,7 +4,9 @@ from marshmallow import ValidationError
 from app import db
 from app.models.notification import Notification
 from app.schemas.notification_schema import NotificationReadSchema
+from app.services.notification_service import NotificationService
 from app.utils.response import success_response, error_response, validation_error_response
+from app.utils.pagination import get_pagination_args, paginate, CursorError
 
 
 class NotificationController:
@@ -43,6 +45,33 @@ class NotificationController:
                 return False
         return None
 
+    @staticmethod
+    def _list_response(query, message):
+        """Trả toàn bộ danh sách như cũ; có per_page hoặc after thì phân trang theo cursor"""
+        if 'per_page' not in request.args and 'after' not in request.args:
+            notifications = query.order_by(Notification.created_at.desc()).all()
+            return success_response(
+                data={'notifications': [notification.to_dict() for notification in notifications]},
+                message=message
+            )
+
+        args = get_pagination_args(default_per_page=20, default_count='none', user_scoped=True)
+        result = paginate(
+            query,
+            [(Notification.created_at, True), (Notification.notification_id, True)],
+            page=args['page'],
+            per_page=args['per_page'],
+            after=args['after'],
+            count=args['count']
+        )
+        return success_response(
+            data={
+                'notifications': [notification.to_dict() for notification in result.items],
+                'pagination': result.to_dict()
+            },
+            message=message
+        )
+
     @staticmethod
     def list_notifications():
         auth_error = NotificationController._require_login()
@@ -63,13 +92,9 @@ class NotificationController:
                     return error_response('Giá trị is_read không hợp lệ', 400)
                 query = query.filter_by(is_read=parsed)
 
-            notifications = query.order_by(Notification.created_at.desc()).all()
-            notifications_data = [notification.to_dict() for notification in notifications]
-
-            return success_response(
-                data={'notifications': notifications_data},
-                message='Lấy danh sách thông báo thành công'
-            )
+            return NotificationController._list_response(query, 'Lấy danh sách thông báo thành công')
+        except CursorError as exc:
+            return error_response(str(exc), 400)
         except Exception as exc:
             return error_response(f'Lỗi khi lấy danh sách thông báo: {str(exc)}', 500)
 
@@ -79,18 +104,28 @@ class NotificationController:
         if auth_error:
             return auth_error
         try:
-            notifications = Notification.query.filter_by(
+            query = Notification.query.filter_by(
                 user_id=session['user_id'],
                 is_read=False
-            ).order_by(Notification.created_at.desc()).all()
+            )
+            return NotificationController._list_response(query, 'Lấy danh sách thông báo chưa đọc thành công')
+        except CursorError as exc:
+            return error_response(str(exc), 400)
+        except Exception as exc:
+            return error_response(f'Lỗi khi lấy thông báo chưa đọc: {str(exc)}', 500)
 
-            notifications_data = [notification.to_dict() for notification in notifications]
+    @staticmethod
+    def unread_count():
+        auth_error = NotificationController._require_login()
+        if auth_error:
+            return auth_error
+        try:
             return success_response(
-                data={'notifications': notifications_data},
-                message='Lấy danh sách thông báo chưa đọc thành công'
+                data={'unread_count': NotificationService.unread_count(session['user_id'])},
+                message='Lấy số thông báo chưa đọc thành công'
             )
         except Exception as exc:
-            return error_response(f'Lỗi khi lấy thông báo chưa đọc: {str(exc)}', 500)
+            return error_response(f'Lỗi khi lấy số thông báo chưa đọc: {str(exc)}', 500)
 
     @staticmethod
     def get_notification(notification_id):
@@ -148,10 +183,12 @@ class NotificationController:
         if auth_error:
             return auth_error
         try:
-            Notification.query.filter_by(
+            updated = Notification.query.filter_by(
                 user_id=session['user_id'],
                 is_read=False
             ).update({'is_read': True})
+            # UPDATE hàng loạt không qua flush nên tự trừ bộ đếm
+            NotificationService.adjust_unread(session['user_id'], -updated)
             db.session.commit()
 
             return success_response(message='Đã đánh dấu tất cả thông báo là đã đọc')
@@ -186,7 +223,13 @@ class NotificationController:
         if auth_error:
             return auth_error
         try:
+            # Xóa riêng phần chưa đọc để biết cần trừ bộ đếm bao nhiêu
+            unread = Notification.query.filter_by(
+                user_id=session['user_id'],
+                is_read=False
+            ).delete(synchronize_session=False)
             Notification.query.filter_by(user_id=session['user_id']).delete(synchronize_session=False)
+            NotificationService.adjust_unread(session['user_id'], -unread)
             db.session.commit()
 
             return success_response(message='Đã xóa toàn bộ thông báo')
@@ -4,6 +4,7 @@ from app.models.promotion import Promotion
 from app.models.hotel import Hotel
 from app.models.room import Room
 from app.models.user import User
+from app.services.notification_service import NotificationService
 from app.schemas.promotion_schema import PromotionCreateSchema, PromotionUpdateSchema
 from app.utils.response import success_response, error_response, paginated_response, validation_error_response
 from app.utils.validators import validate_required_fields
@@ -145,6 +146,9 @@ class PromotionController:
             db.session.add(promotion)
             db.session.commit()
             
+            # Thông báo cho người yêu thích khách sạn chạy trong worker nền
+            NotificationService.enqueue_promotion_fanout(promotion)
+            
             return success_response(
                 data={'promotion': promotion.to_dict()},
                 message='Tạo khuyến mãi thành công',
@@ -8,6 +8,7 @@ from app.schemas.review_schema import (
     ReviewCreateSchema, ReviewUpdateSchema, ReviewResponseSchema, ReviewReportSchema
 )
 from app.utils.response import success_response, error_response, paginated_response, validation_error_response
+from app.utils.pagination import get_pagination_args, paginate, CursorError
 from app.utils.validators import validate_required_fields
 from marshmallow import ValidationError
 from datetime import datetime
@@ -30,8 +31,7 @@ class ReviewController:
     @staticmethod
     def list_reviews():
         try:
-            page = request.args.get('page', 1, type=int)
-            per_page = request.args.get('per_page', 10, type=int)
+            args = get_pagination_args()
             hotel_id = request.args.get('hotel_id', type=int)
             user_id = request.args.get('user_id', type=int)
             status = request.args.get('status')
@@ -49,13 +49,17 @@ class ReviewController:
             else:
                 query = query.filter_by(status='active')
             
-            query = query.order_by(Review.created_at.desc())
-            
-            total = query.count()
-            reviews = query.offset((page - 1) * per_page).limit(per_page).all()
+            result = paginate(
+                query,
+                [(Review.created_at, True), (Review.review_id, True)],
+                page=args['page'],
+                per_page=args['per_page'],
+                after=args['after'],
+                count=args['count']
+            )
             
             reviews_data = []
-            for review in reviews:
+            for review in result.items:
                 review_dict = review.to_dict()
                 if review.user:
                     review_dict['user'] = {
@@ -76,8 +80,10 @@ class ReviewController:
                     review_dict['hotel'] = None
                 reviews_data.append(review_dict)
             
-            return paginated_response(reviews_data, page, per_page, total)
+            return paginated_response(reviews_data, result.page, result.per_page, result.total, next_cursor=result.next_cursor)
             
+        except CursorError as e:
+            return error_response(str(e), 400)
         except Exception as e:
             return error_response(f'Lỗi khi lấy danh sách review: {str(e)}', 500)
     
@@ -4,7 +4,8 @@ from app.models.room import Room
 from app.models.room_image import RoomImage
 from app.models.amenity import Amenity
 from app.models.hotel import Hotel
-from app.models.booking_detail import BookingDetail
+from app.services.availability_service import AvailabilityEngine
+from app.services.cache_service import CacheService, TAG_ROOM_TYPES
 from app.schemas.room_schema import AmenityCreateSchema, AmenityUpdateSchema
 from app.schemas.room_schema import RoomCreateSchema, RoomUpdateSchema, RoomAmenitySchema, RoomStatusSchema
 from app.utils.response import success_response, error_response, paginated_response, validation_error_response
@@ -12,13 +13,14 @@ from app.utils.validators import validate_required_fields
 from marshmallow import ValidationError
 from werkzeug.utils import secure_filename
 from datetime import datetime, date
-from sqlalchemy import and_, or_
 import os
 import uuid
 from app.models.room_type import RoomType
 from app.models.user import User
 from app.schemas.room_schema import RoomTypeCreateSchema, RoomTypeUpdateSchema
 
+ROOM_TYPES_CACHE_TTL = 3600
+
 class RoomController:    
     @staticmethod
     def _get_request_data():
@@ -441,42 +443,16 @@ class RoomController:
             if check_in < date.today():
                 return error_response('Ngày check_in không thể là quá khứ', 400)
             
-            # Check if room is already booked in the date range
-            has_booking = db.session.query(BookingDetail).join(
-                BookingDetail.booking
-            ).filter(
-                and_(
-                    BookingDetail.room_id == room_id,
-                    BookingDetail.booking.has(
-                        and_(
-                            or_(
-                                and_(
-                                    BookingDetail.booking.property.mapper.c.check_in_date <= check_in,
-                                    BookingDetail.booking.property.mapper.c.check_out_date > check_in
-                                ),
-                                and_(
-                                    BookingDetail.booking.property.mapper.c.check_in_date < check_out,
-                                    BookingDetail.booking.property.mapper.c.check_out_date >= check_out
-                                ),
-                                and_(
-                                    BookingDetail.booking.property.mapper.c.check_in_date >= check_in,
-                                    BookingDetail.booking.property.mapper.c.check_out_date <= check_out
-                                )
-                            ),
-                            BookingDetail.booking.property.mapper.c.status.in_(['pending', 'confirmed', 'checked_in'])
-                        )
-                    )
-                )
-            ).first() is not None
-            
-            is_available = not has_booking and room.status == 'available'
+            availability = AvailabilityEngine.load([room], check_in, check_out)
+            is_available = availability.is_available(room.room_id)
             
             return success_response(data={
                 'room_id': room_id,
                 'check_in': check_in_str,
                 'check_out': check_out_str,
                 'is_available': is_available,
-                'status': room.status
+                'status': room.status,
+                'booked_nights': [night.isoformat() for night in availability.booked_nights(room.room_id)]
             })
             
         except Exception as e:
@@ -515,8 +491,12 @@ class RoomController:
     @staticmethod
     def list_room_types():
         try:
-            room_types = RoomType.query.all()
-            room_types_data = [rt.to_dict() for rt in room_types]
+            room_types_data = CacheService.get_or_set(
+                'room_types',
+                lambda: [rt.to_dict() for rt in RoomType.query.all()],
+                ttl=ROOM_TYPES_CACHE_TTL,
+                tags=(TAG_ROOM_TYPES,)
+            )
             return success_response(data={'room_types': room_types_data})
         except Exception as e:
             return error_response(f'Lỗi khi lấy danh sách loại phòng: {str(e)}', 500)
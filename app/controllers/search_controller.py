@@ -2,19 +2,28 @@ from flask import request, session
 from app import db
 from app.models.hotel import Hotel
 from app.models.room import Room
-from app.models.booking_detail import BookingDetail
-from app.models.search_history import SearchHistory
-from app.models.user import User
 from app.models.amenity import Amenity
 from app.models.cancellation_policy import CancellationPolicy
 from app.models.promotion import Promotion
+from app.models.search_history import SearchHistory
+from app.models.user import User
 from app.schemas.search_schema import SearchSchema, AdvancedSearchSchema, CheckAvailabilitySchema
+from app.models.hotel_search_summary import HotelSearchSummary
+from app.services.hotel_card_service import HotelCardService
+from app.services.text_search import TextSearchService
+from app.services.autocomplete import AutocompleteService
+from app.services.availability_service import AvailabilityEngine
+from app.services.pricing_service import PricingEngine
 from app.utils.response import success_response, error_response, paginated_response, validation_error_response
+from app.utils.pagination import get_pagination_args, paginate, CursorError, PAGING_PARAMS
 from app.utils.validators import validate_required_fields
 from marshmallow import ValidationError
 from datetime import datetime, date
-from sqlalchemy import and_, or_, func
-from sqlalchemy.orm import joinedload
+from sqlalchemy import and_, exists, or_, func
+from sqlalchemy.orm import joinedload, selectinload
+
+# Giá thay cho min_price NULL khi sắp xếp tăng dần
+NO_PRICE_LAST = 10 ** 10
 
 class SearchController:
     
@@ -95,6 +104,78 @@ class SearchController:
         
         return data
 
+    @staticmethod
+    def _summary_or_live(summary_clause, live_clause):
+        """Điều kiện trên summary; khách sạn chưa có dòng summary (outerjoin ra NULL) thì tính trực tiếp"""
+        return or_(
+            and_(HotelSearchSummary.hotel_id.isnot(None), summary_clause),
+            and_(HotelSearchSummary.hotel_id.is_(None), live_clause)
+        )
+
+    @staticmethod
+    def _apply_summary_filters(query, validated_data):
+        """Lọc theo các cột của hotel_search_summary (query phải outerjoin sẵn HotelSearchSummary)"""
+        # Có ít nhất một phòng trống với giá nằm trong khoảng (giống lọc join Room ban đầu)
+        min_price = validated_data.get('min_price')
+        max_price = validated_data.get('max_price')
+        if min_price or max_price:
+            room_in_range = exists().where(
+                Room.hotel_id == Hotel.hotel_id,
+                Room.status == 'available'
+            )
+            if min_price:
+                room_in_range = room_in_range.where(Room.base_price >= min_price)
+            if max_price:
+                room_in_range = room_in_range.where(Room.base_price <= max_price)
+            query = query.filter(room_in_range)
+        
+        for amenity_id in validated_data.get('amenity_ids') or []:
+            amenity_id = int(amenity_id)
+            query = query.filter(SearchController._summary_or_live(
+                HotelSearchSummary.amenity_ids.like(f'%,{amenity_id},%'),
+                Hotel.amenities.any(Amenity.amenity_id == amenity_id)
+            ))
+        
+        if validated_data.get('free_cancel'):
+            query = query.filter(SearchController._summary_or_live(
+                HotelSearchSummary.has_free_cancellation.is_(True),
+                Hotel.cancellation_policies.any(CancellationPolicy.refund_percentage == 100.00)
+            ))
+        
+        if validated_data.get('has_promotion'):
+            now = datetime.utcnow()
+            query = query.filter(SearchController._summary_or_live(
+                HotelSearchSummary.has_active_promotion.is_(True),
+                Hotel.promotions.any(and_(
+                    Promotion.is_active.is_(True),
+                    Promotion.start_date <= now,
+                    Promotion.end_date >= now
+                ))
+            ))
+        
+        return query
+    
+    @staticmethod
+    def _sort_keys(sort_option):
+        """Các khóa sắp xếp (biểu thức, desc) trên summary, luôn kết thúc bằng hotel_id để keyset ổn định"""
+        if sort_option == 'price_asc':
+            # Khách sạn chưa có phòng trống (min_price NULL) xếp cuối
+            keys = [(func.coalesce(HotelSearchSummary.min_price, NO_PRICE_LAST), False)]
+        elif sort_option == 'price_desc':
+            keys = [(func.coalesce(HotelSearchSummary.min_price, -1), True)]
+        elif sort_option == 'rating_desc':
+            keys = [
+                (func.coalesce(HotelSearchSummary.avg_rating, 0), True),
+                (func.coalesce(HotelSearchSummary.review_count, 0), True)
+            ]
+        elif sort_option == 'rating_asc':
+            keys = [(func.coalesce(HotelSearchSummary.avg_rating, 0), False)]
+        else:
+            keys = []
+        
+        keys.append((Hotel.hotel_id, False))
+        return keys
+
     @staticmethod
     def search():
         try:
@@ -107,13 +188,7 @@ class SearchController:
             
             if validated_data.get('destination'):
                 destination = validated_data['destination']
-                query = query.filter(
-                    or_(
-                        Hotel.city.ilike(f'%{destination}%'),
-                        Hotel.address.ilike(f'%{destination}%'),
-                        Hotel.hotel_name.ilike(f'%{destination}%')
-                    )
-                )
+                query = query.filter(TextSearchService.destination_clause(destination))
             
             if validated_data.get('min_price'):
                 query = query.join(Room).filter(Room.base_price >= validated_data['min_price'])
@@ -124,43 +199,34 @@ class SearchController:
             if validated_data.get('star_rating'):
                 query = query.filter(Hotel.star_rating >= validated_data['star_rating'])
             
-            page = request.args.get('page', 1, type=int)
-            per_page = request.args.get('per_page', 10, type=int)
-            
-            total = query.distinct().count()
-            hotels = query.distinct().offset((page - 1) * per_page).limit(per_page).all()
+            args = get_pagination_args()
+            result = paginate(
+                query.distinct(),
+                [(Hotel.hotel_id, False)],
+                page=args['page'],
+                per_page=args['per_page'],
+                after=args['after'],
+                count=args['count']
+            )
+            page, per_page, total = result.page, result.per_page, result.total
+            hotels = result.items
+            
+            # Thêm thông tin giá, đánh giá cho template (gom 1 query cho cả trang)
+            card_stats = HotelCardService.get_card_stats([hotel.hotel_id for hotel in hotels])
             
             hotels_data = []
             for hotel in hotels:
                 hotel_dict = hotel.to_dict()
                 hotel_dict['images'] = [img.to_dict() for img in hotel.images]
                 
-                # Thêm thông tin giá, đánh giá cho template
-                from app.models.review import Review
-                min_price = db.session.query(func.min(Room.base_price))\
-                    .filter(Room.hotel_id == hotel.hotel_id)\
-                    .filter(Room.status == 'available')\
-                    .scalar() or 1000000
-                
-                review_count = Review.query.filter_by(hotel_id=hotel.hotel_id, status='active').count()
-                
-                avg_rating = db.session.query(func.avg(Review.rating))\
-                    .filter_by(hotel_id=hotel.hotel_id, status='active')\
-                    .scalar()
-                
-                # Chuyển đổi avg_rating sang float an toàn
-                try:
-                    avg_rating_float = float(avg_rating) if avg_rating is not None else 0.0
-                except (TypeError, ValueError):
-                    avg_rating_float = 0.0
-                
-                hotel_dict['min_price'] = int(min_price)
-                hotel_dict['review_count'] = review_count
-                hotel_dict['avg_rating'] = round(avg_rating_float, 1) if avg_rating_float > 0 else 0.0
+                stats = card_stats.get(hotel.hotel_id) or HotelCardService.empty_stats()
+                hotel_dict['min_price'] = stats['min_price']
+                hotel_dict['review_count'] = stats['review_count']
+                hotel_dict['avg_rating'] = stats['avg_rating']
                 
                 hotels_data.append(hotel_dict)
             
-            if 'user_id' in session and validated_data.get('destination'):
+            if 'user_id' in session and validated_data.get('destination') and not args['after']:
                 history = SearchHistory(
                     user_id=session['user_id'],
                     destination=validated_data['destination'],
@@ -171,8 +237,10 @@ class SearchController:
                 db.session.add(history)
                 db.session.commit()
             
-            return paginated_response(hotels_data, page, per_page, total)
+            return paginated_response(hotels_data, page, per_page, total, next_cursor=result.next_cursor)
             
+        except CursorError as e:
+            return error_response(str(e), 400)
         except ValidationError as e:
             return validation_error_response(e.messages)
         except Exception as e:
@@ -182,53 +250,51 @@ class SearchController:
     def advanced_search():
         try:
             data = SearchController._get_request_data()
+            # Tham số phân trang đọc riêng qua get_pagination_args, không đưa vào schema
+            for key in PAGING_PARAMS:
+                data.pop(key, None)
             
             schema = AdvancedSearchSchema()
             validated_data = schema.load(data)
             
-            query = Hotel.query.filter_by(status='active')
+            query = Hotel.query.outerjoin(
+                HotelSearchSummary, HotelSearchSummary.hotel_id == Hotel.hotel_id
+            ).filter(Hotel.status == 'active')
             
             if validated_data.get('destination'):
                 destination = validated_data['destination']
-                query = query.filter(
-                    or_(
-                        Hotel.city.ilike(f'%{destination}%'),
-                        Hotel.address.ilike(f'%{destination}%'),
-                        Hotel.hotel_name.ilike(f'%{destination}%')
-                    )
-                )
+                query = query.filter(TextSearchService.destination_clause(destination))
             
             if validated_data.get('star_rating'):
                 query = query.filter(Hotel.star_rating >= validated_data['star_rating'])
             
-            if validated_data.get('amenity_ids'):
-                for amenity_id in validated_data['amenity_ids']:
-                    query = query.filter(Hotel.amenities.any(amenity_id=amenity_id))
-            
-            if validated_data.get('min_price') or validated_data.get('max_price'):
-                query = query.join(Room)
-                if validated_data.get('min_price'):
-                    query = query.filter(Room.base_price >= validated_data['min_price'])
-                if validated_data.get('max_price'):
-                    query = query.filter(Room.base_price <= validated_data['max_price'])
-            
             if validated_data.get('is_featured'):
                 query = query.filter_by(is_featured=True)
             
-            page = request.args.get('page', 1, type=int)
-            per_page = request.args.get('per_page', 10, type=int)
+            query = SearchController._apply_summary_filters(query, validated_data)
             
-            total = query.distinct().count()
-            hotels = query.distinct().offset((page - 1) * per_page).limit(per_page).all()
+            args = get_pagination_args()
+            result = paginate(
+                query.add_entity(HotelSearchSummary).options(joinedload(Hotel.images)),
+                SearchController._sort_keys(validated_data.get('sort')),
+                page=args['page'],
+                per_page=args['per_page'],
+                after=args['after'],
+                count=args['count']
+            )
             
             hotels_data = []
-            for hotel in hotels:
+            for card in HotelCardService.build_cards_from_rows(result.items):
+                hotel = card.pop('hotel')
                 hotel_dict = hotel.to_dict()
                 hotel_dict['images'] = [img.to_dict() for img in hotel.images]
+                hotel_dict.update(card)
                 hotels_data.append(hotel_dict)
             
-            return paginated_response(hotels_data, page, per_page, total)
+            return paginated_response(hotels_data, result.page, result.per_page, result.total, next_cursor=result.next_cursor)
             
+        except CursorError as e:
+            return error_response(str(e), 400)
         except ValidationError as e:
             return validation_error_response(e.messages)
         except Exception as e:
@@ -242,22 +308,20 @@ class SearchController:
             if not query_text:
                 return success_response(data={'suggestions': []})
             
-            cities = db.session.query(Hotel.city).filter(
-                Hotel.city.ilike(f'%{query_text}%'),
-                Hotel.status == 'active'
-            ).distinct().limit(5).all()
-            
-            hotels = Hotel.query.filter(
-                Hotel.hotel_name.ilike(f'%{query_text}%'),
-                Hotel.status == 'active'
-            ).limit(5).all()
+            # Dùng chung index gợi ý với trang chủ (không phân biệt dấu: "da lat" khớp "Đà Lạt")
+            matches = AutocompleteService.suggest(query_text, limit=5)
             
             suggestions = []
-            for city in cities:
-                suggestions.append({'type': 'city', 'value': city[0]})
-            
-            for hotel in hotels:
-                suggestions.append({'type': 'hotel', 'value': hotel.hotel_name, 'id': hotel.hotel_id})
+            for city in matches['cities']:
+                suggestions.append({'type': 'city', 'value': city['value']})
+            
+            for hotel in matches['hotels']:
+                suggestions.append({
+                    'type': 'hotel',
+                    'value': hotel['value'],
+                    'id': hotel['id'],
+                    'city': hotel['city']
+                })
             
             return success_response(data={'suggestions': suggestions})
             
@@ -338,23 +402,17 @@ class SearchController:
             if validated_data.get('num_guests'):
                 query = query.filter(Room.max_guests >= validated_data['num_guests'])
             
+            rooms = query.options(
+                selectinload(Room.hotel),
+                selectinload(Room.images)
+            ).all()
+            
+            # Một query booking chồng lấn cho tất cả phòng, tính theo từng đêm
+            availability = AvailabilityEngine.load(rooms, check_in, check_out)
+            
             available_rooms = []
-            for room in query.all():
-                booked = db.session.query(func.sum(BookingDetail.quantity)).filter(
-                    BookingDetail.room_id == room.room_id,
-                    BookingDetail.booking.has(
-                        and_(
-                            BookingDetail.check_in_date < check_out,
-                            BookingDetail.check_out_date > check_in,
-                            or_(
-                                BookingDetail.booking.has(status='confirmed'),
-                                BookingDetail.booking.has(status='checked_in')
-                            )
-                        )
-                    )
-                ).scalar() or 0
-                
-                available_quantity = room.quantity - booked
+            for room in rooms:
+                available_quantity = availability.available_quantity(room.room_id)
                 
                 if available_quantity > 0:
                     room_dict = room.to_dict()
@@ -370,6 +428,29 @@ class SearchController:
         except Exception as e:
             return error_response(f'Lỗi kiểm tra phòng trống: {str(e)}', 500)
     
+    @staticmethod
+    def _to_int(value):
+        try:
+            return int(value) if value not in (None, '') else None
+        except (TypeError, ValueError):
+            return None
+    
+    @staticmethod
+    def _stay_dates(validated_data, data):
+        """Ngày lưu trú hợp lệ từ check_in/check_out (form web gửi checkin/checkout)"""
+        check_in = validated_data.get('check_in') or data.get('checkin')
+        check_out = validated_data.get('check_out') or data.get('checkout')
+        try:
+            if isinstance(check_in, str):
+                check_in = datetime.strptime(check_in, '%Y-%m-%d').date()
+            if isinstance(check_out, str):
+                check_out = datetime.strptime(check_out, '%Y-%m-%d').date()
+        except ValueError:
+            return None, None
+        if not check_in or not check_out or check_in >= check_out:
+            return None, None
+        return check_in, check_out
+    
     @staticmethod
     def search_for_web():
         try:
@@ -385,29 +466,15 @@ class SearchController:
                 # Nếu validation fail, vẫn tiếp tục với data gốc
                 validated_data = data
             
-            # Query khách sạn active
-            query = Hotel.query.filter_by(status='active')
+            # Query khách sạn active, lọc/sắp xếp trên bảng hotel_search_summary
+            query = Hotel.query.outerjoin(
+                HotelSearchSummary, HotelSearchSummary.hotel_id == Hotel.hotel_id
+            ).filter(Hotel.status == 'active')
             
             # Filter theo destination
             if validated_data.get('destination'):
                 destination = validated_data['destination']
-                query = query.filter(
-                    or_(
-                        Hotel.city.ilike(f'%{destination}%'),
-                        Hotel.address.ilike(f'%{destination}%'),
-                        Hotel.hotel_name.ilike(f'%{destination}%')
-                    )
-                )
-            
-            # Filter theo giá (cần join với Room)
-            if validated_data.get('min_price') or validated_data.get('max_price'):
-                query = query.join(Room, Room.hotel_id == Hotel.hotel_id)
-                
-                if validated_data.get('min_price'):
-                    query = query.filter(Room.base_price >= validated_data['min_price'])
-                
-                if validated_data.get('max_price'):
-                    query = query.filter(Room.base_price <= validated_data['max_price'])
+                query = query.filter(TextSearchService.destination_clause(destination))
             
             # Filter theo star rating
             star_filters = validated_data.get('star_ratings') or []
@@ -417,100 +484,51 @@ class SearchController:
             elif validated_data.get('star_rating'):
                 query = query.filter(Hotel.star_rating >= validated_data['star_rating'])
             
-            # Filter tiện nghi
-            amenity_filters = validated_data.get('amenity_ids')
-            if amenity_filters:
-                for amenity_id in amenity_filters:
-                    query = query.filter(Hotel.amenities.any(Amenity.amenity_id == amenity_id))
-            
             # Filter featured
             if validated_data.get('is_featured'):
                 query = query.filter(Hotel.is_featured.is_(True))
             
-            # Filter hủy miễn phí
-            if validated_data.get('free_cancel'):
-                query = query.filter(
-                    Hotel.cancellation_policies.any(CancellationPolicy.refund_percentage == 100.00)
-                )
-            
-            # Filter khuyến mãi đang chạy
-            if validated_data.get('has_promotion'):
-                now = datetime.utcnow()
-                query = query.filter(
-                    Hotel.promotions.any(
-                        and_(
-                            Promotion.is_active.is_(True),
-                            Promotion.start_date <= now,
-                            Promotion.end_date >= now
-                        )
-                    )
+            # Filter giá, tiện nghi, hủy miễn phí, khuyến mãi
+            query = SearchController._apply_summary_filters(query, validated_data)
+            
+            # Phân trang: tổng số lấy từ cache ngắn hạn để crawler/phân trang sâu không COUNT mỗi lần.
+            # Mỗi khách sạn tối đa 1 dòng summary (outerjoin) nên không cần distinct
+            args = get_pagination_args(default_count='cached')
+            result = paginate(
+                query.add_entity(HotelSearchSummary).options(
+                    joinedload(Hotel.images),
+                    joinedload(Hotel.amenities)
+                ),
+                SearchController._sort_keys(validated_data.get('sort')),
+                page=args['page'],
+                per_page=args['per_page'],
+                after=args['after'],
+                count=args['count']
+            )
+            page, per_page, total = result.page, result.per_page, result.total
+            
+            # Build response data (thống kê lấy luôn từ summary đã join)
+            hotels_data = HotelCardService.build_cards_from_rows(result.items)
+            
+            # Có ngày lưu trú thì báo thêm giá cả kỳ (cuối tuần, khuyến mãi theo đêm) giống lúc đặt phòng;
+            # min_price vẫn lấy từ summary để khớp với sắp xếp price_asc / price_desc
+            check_in, check_out = SearchController._stay_dates(validated_data, data)
+            if check_in and check_out and hotels_data:
+                stay_prices = PricingEngine.stay_prices(
+                    [card['hotel'].hotel_id for card in hotels_data],
+                    check_in,
+                    check_out,
+                    num_guests=SearchController._to_int(validated_data.get('num_guests'))
                 )
-            
-            # Phân trang
-            page = request.args.get('page', 1, type=int)
-            per_page = request.args.get('per_page', 10, type=int)
-            
-            # Đếm tổng và lấy dữ liệu (distinct để tránh duplicate khi join)
-            total = query.distinct().count()
-            hotels = query.options(
-                joinedload(Hotel.images),
-                joinedload(Hotel.amenities)
-            ).distinct().offset((page - 1) * per_page).limit(per_page).all()
-            
-            # Build response data
-            hotels_data = []
-            for hotel in hotels:
-                # Tính giá thấp nhất
-                from app.models.review import Review
-                min_price = db.session.query(func.min(Room.base_price))\
-                    .filter(Room.hotel_id == hotel.hotel_id)\
-                    .filter(Room.status == 'available')\
-                    .scalar() or 1000000
-                
-                # Tính rating trung bình
-                review_count = Review.query.filter_by(
-                    hotel_id=hotel.hotel_id, 
-                    status='active'
-                ).count()
-                
-                avg_rating = db.session.query(func.avg(Review.rating))\
-                    .filter_by(hotel_id=hotel.hotel_id, status='active')\
-                    .scalar()
-                
-                # Chuyển đổi avg_rating sang float an toàn
-                try:
-                    avg_rating_float = float(avg_rating) if avg_rating is not None else 0.0
-                except (TypeError, ValueError):
-                    avg_rating_float = 0.0
-                
-                # Kiểm tra có chính sách hủy miễn phí không (refund_percentage = 100%)
-                from app.models.cancellation_policy import CancellationPolicy
-                from app.models.promotion import Promotion
-                has_free_cancellation = CancellationPolicy.query.filter_by(
-                    hotel_id=hotel.hotel_id
-                ).filter(
-                    CancellationPolicy.refund_percentage == 100.00
-                ).first() is not None
-                
-                # Kiểm tra có promotion đang active không
-                has_active_promotion = Promotion.query.filter(
-                    Promotion.hotel_id == hotel.hotel_id,
-                    Promotion.start_date <= datetime.utcnow(),
-                    Promotion.end_date >= datetime.utcnow(),
-                    Promotion.is_active == True
-                ).first() is not None
-                
-                hotels_data.append({
-                    'hotel': hotel,
-                    'min_price': int(min_price),
-                    'review_count': review_count,
-                    'avg_rating': round(avg_rating_float, 1) if avg_rating_float > 0 else 0.0,
-                    'has_free_cancellation': has_free_cancellation,
-                    'has_active_promotion': has_active_promotion
-                })
+                for card in hotels_data:
+                    stay = stay_prices.get(card['hotel'].hotel_id)
+                    if stay:
+                        card['stay_nightly_price'] = int(round(stay['nightly_price']))
+                        card['stay_total'] = int(round(stay['stay_total']))
+                        card['stay_nights'] = stay['num_nights']
             
             # Lưu lịch sử tìm kiếm (nếu user đã login)
-            if 'user_id' in session and validated_data.get('destination'):
+            if 'user_id' in session and validated_data.get('destination') and not args['after']:
                 try:
                     history = SearchHistory(
                         user_id=session['user_id'],
@@ -524,16 +542,17 @@ class SearchController:
                 except:
                     db.session.rollback()
             
-            # Tính total_pages
-            total_pages = (total + per_page - 1) // per_page if total > 0 else 1
+            # Tính total_pages (count=none thì không có tổng)
+            total_pages = result.pages or 1
             
             # Return dict thay vì response object
             return {
                 'data': hotels_data,
-                'total': total,
-                'page': page,
+                'total': total or 0,
+                'page': page or 1,
                 'per_page': per_page,
-                'total_pages': total_pages
+                'total_pages': total_pages,
+                'next_cursor': result.next_cursor
             }
             
         except Exception as e:
@@ -9,6 +9,7 @@ from app.models.review import Review
 from app.models.hotel_image import HotelImage
 from app.schemas.user_schema import UserUpdateSchema, ChangePasswordSchema
 from app.utils.response import success_response, error_response, paginated_response, validation_error_response
+from app.utils.pagination import get_pagination_args, paginate, CursorError
 from marshmallow import ValidationError
 from werkzeug.utils import secure_filename
 from sqlalchemy import func
@@ -288,17 +289,23 @@ class UserController:
             return error_response('Chưa đăng nhập', 401)
         
         try:
-            page = request.args.get('page', 1, type=int)
-            per_page = request.args.get('per_page', 20, type=int)
-            
-            notifications_query = Notification.query.filter_by(user_id=session['user_id']).order_by(Notification.created_at.desc())
-            total = notifications_query.count()
-            
-            notifications = notifications_query.offset((page - 1) * per_page).limit(per_page).all()
-            notifications_data = [notif.to_dict() for notif in notifications]
+            args = get_pagination_args(default_per_page=20, user_scoped=True)
+            
+            notifications_query = Notification.query.filter_by(user_id=session['user_id'])
+            result = paginate(
+                notifications_query,
+                [(Notification.created_at, True), (Notification.notification_id, True)],
+                page=args['page'],
+                per_page=args['per_page'],
+                after=args['after'],
+                count=args['count']
+            )
+            notifications_data = [notif.to_dict() for notif in result.items]
             
-            return paginated_response(notifications_data, page, per_page, total)
+            return paginated_response(notifications_data, result.page, result.per_page, result.total, next_cursor=result.next_cursor)
             
+        except CursorError as e:
+            return error_response(str(e), 400)
         except Exception as e:
             return error_response(f'Failed to get notifications: {str(e)}', 500)
     
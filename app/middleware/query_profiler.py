@@ -0,0 +1,197 @@
+import re
+import threading
+import time
+from collections import Counter, deque
+
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_SLOW_REQUEST_MS = 500
+DEFAULT_SLOW_SAMPLES = 50
+TOP_STATEMENTS = 5
+STATEMENT_PREVIEW_LENGTH = 300
+
+# Gom "IN (?, ?, ?)" / "VALUES (%s, %s)" về cùng một dạng để đếm câu lặp theo khuôn SQL
+_PARAM_LIST_RE = re.compile(r'\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))*\s*\)')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_statement(statement):
+    statement = _WHITESPACE_RE.sub(' ', statement).strip()
+    return _PARAM_LIST_RE.sub('(...)', statement)
+
+
+class RequestQueryStats:
+    """Số câu SQL, tổng thời gian DB và số lần lặp của từng khuôn câu lệnh trong một request"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.count = 0
+        self.db_time = 0.0
+        self.statements = Counter()
+        self.statement_times = Counter()
+
+    def record(self, statement, elapsed):
+        key = normalize_statement(statement)
+        self.count += 1
+        self.db_time += elapsed
+        self.statements[key] += 1
+        self.statement_times[key] += elapsed
+
+    @property
+    def duplicates(self):
+        """Số lần chạy lại một khuôn câu lệnh đã chạy trong request (dấu hiệu N+1)"""
+        return self.count - len(self.statements)
+
+    def top_repeated(self, limit=TOP_STATEMENTS):
+        return [
+            {
+                'statement': statement[:STATEMENT_PREVIEW_LENGTH],
+                'count': count,
+                'total_ms': round(self.statement_times[statement] * 1000, 2)
+            }
+            for statement, count in self.statements.most_common(limit)
+            if count > 1
+        ]
+
+
+class QueryProfiler:
+    _lock = threading.Lock()
+    _endpoints = {}
+    _slow_requests = deque(maxlen=DEFAULT_SLOW_SAMPLES)
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and getattr(g, '_query_stats', None) is not None:
+            conn.info.setdefault('_query_started', []).append(time.perf_counter())
+
+    @staticmethod
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('_query_started')
+        if not starts or not has_request_context():
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        stats = getattr(g, '_query_stats', None)
+        if stats is not None:
+            stats.record(statement, elapsed)
+
+    @staticmethod
+    def _handle_error(exception_context):
+        # Câu lệnh lỗi không qua after_cursor_execute, bỏ mốc thời gian để stack không lệch
+        conn = exception_context.connection
+        if conn is not None and conn.info.get('_query_started'):
+            conn.info['_query_started'].pop()
+
+    @staticmethod
+    def start_request():
+        g._query_stats = RequestQueryStats()
+
+    @staticmethod
+    def finish_request(response, slow_request_ms, expose_header=False):
+        stats = getattr(g, '_query_stats', None)
+        if stats is None:
+            return response
+        g._query_stats = None
+
+        total_ms = (time.perf_counter() - stats.started_at) * 1000
+        db_ms = stats.db_time * 1000
+        if expose_header:
+            response.headers.add(
+                'Server-Timing',
+                f'db;dur={db_ms:.2f};desc="{stats.count} queries, {stats.duplicates} dup", app;dur={total_ms:.2f}'
+            )
+
+        endpoint = request.endpoint or request.path
+        with QueryProfiler._lock:
+            entry = QueryProfiler._endpoints.setdefault(endpoint, {
+                'requests': 0,
+                'queries': 0,
+                'max_queries': 0,
+                'duplicates': 0,
+                'db_ms': 0.0,
+                'total_ms': 0.0,
+                'max_ms': 0.0
+            })
+            entry['requests'] += 1
+            entry['queries'] += stats.count
+            entry['max_queries'] = max(entry['max_queries'], stats.count)
+            entry['duplicates'] += stats.duplicates
+            entry['db_ms'] += db_ms
+            entry['total_ms'] += total_ms
+            entry['max_ms'] = max(entry['max_ms'], total_ms)
+
+            if total_ms >= slow_request_ms:
+                QueryProfiler._slow_requests.append({
+                    'endpoint': endpoint,
+                    'method': request.method,
+                    'path': request.full_path.rstrip('?'),
+                    'status': response.status_code,
+                    'total_ms': round(total_ms, 2),
+                    'db_ms': round(db_ms, 2),
+                    'queries': stats.count,
+                    'duplicates': stats.duplicates,
+                    'top_repeated': stats.top_repeated(),
+                    'at': time.strftime('%Y-%m-%dT%H:%M:%S')
+                })
+        return response
+
+    @staticmethod
+    def snapshot():
+        """Thống kê theo endpoint (sắp theo số query trung bình) và các request chậm gần nhất"""
+        with QueryProfiler._lock:
+            endpoints = []
+            for endpoint, entry in QueryProfiler._endpoints.items():
+                requests = entry['requests'] or 1
+                endpoints.append({
+                    'endpoint': endpoint,
+                    'requests': entry['requests'],
+                    'avg_queries': round(entry['queries'] / requests, 2),
+                    'max_queries': entry['max_queries'],
+                    'avg_duplicates': round(entry['duplicates'] / requests, 2),
+                    'avg_db_ms': round(entry['db_ms'] / requests, 2),
+                    'avg_ms': round(entry['total_ms'] / requests, 2),
+                    'max_ms': round(entry['max_ms'], 2)
+                })
+            slow_requests = list(QueryProfiler._slow_requests)
+
+        endpoints.sort(key=lambda row: row['avg_queries'], reverse=True)
+        return {
+            'endpoints': endpoints,
+            'slow_requests': list(reversed(slow_requests))
+        }
+
+    @staticmethod
+    def reset():
+        with QueryProfiler._lock:
+            QueryProfiler._endpoints.clear()
+            QueryProfiler._slow_requests.clear()
+
+
+def register_query_profiler(app):
+    """Đếm query / thời gian DB theo request (bật bằng QUERY_PROFILER_ENABLED=True), header Server-Timing chỉ gửi khi debug"""
+    if not app.config.get('QUERY_PROFILER_ENABLED', False):
+        return
+
+    slow_request_ms = app.config.get('SLOW_REQUEST_MS', DEFAULT_SLOW_REQUEST_MS)
+    samples = app.config.get('SLOW_REQUEST_SAMPLES', DEFAULT_SLOW_SAMPLES)
+    if QueryProfiler._slow_requests.maxlen != samples:
+        QueryProfiler._slow_requests = deque(QueryProfiler._slow_requests, maxlen=samples)
+
+    # Nghe trên class Engine để áp dụng cho engine Flask-SQLAlchemy tạo lazy
+    hooks = (
+        ('before_cursor_execute', QueryProfiler._before_cursor_execute),
+        ('after_cursor_execute', QueryProfiler._after_cursor_execute),
+        ('handle_error', QueryProfiler._handle_error),
+    )
+    for name, handler in hooks:
+        if not event.contains(Engine, name, handler):
+            event.listen(Engine, name, handler)
+
+    @app.before_request
+    def start_query_profiling():
+        QueryProfiler.start_request()
+
+    @app.after_request
+    def finish_query_profiling(response):
+        return QueryProfiler.finish_request(response, slow_request_ms, expose_header=app.debug)
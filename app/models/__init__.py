@@ -22,4 +22,8 @@ from app.models.email_verification import EmailVerification
 from app.models.cancellation_policy import CancellationPolicy
 from app.models.favorite import Favorite
 from app.models.search_history import SearchHistory
-from app.models.login_history import LoginHistory
\ No newline at end of file
+from app.models.login_history import LoginHistory
+from app.models.hotel_search_summary import HotelSearchSummary
+from app.models.room_inventory import RoomInventory
+from app.models.background_job import BackgroundJob
+from app.models.platform_stats import PlatformStats
\ No newline at end of file
@@ -0,0 +1,39 @@
+from app import db
+from datetime import datetime
+import json
+
+class BackgroundJob(db.Model):
+    """Việc nền (gửi email...) chờ worker xử lý, xem app/services/job_queue.py"""
+    __tablename__ = 'background_jobs'
+    
+    job_id = db.Column(db.Integer, primary_key=True)
+    queue = db.Column(db.String(50), nullable=False, default='default')
+    task = db.Column(db.String(100), nullable=False, index=True)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.Enum('pending', 'running', 'done', 'failed'), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100), index=True)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    
+    # Worker lấy job theo (status, queue, run_at)
+    __table_args__ = (db.Index('ix_background_jobs_claim', 'status', 'queue', 'run_at'),)
+    
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'queue': self.queue,
+            'task': self.task,
+            'payload': json.loads(self.payload) if self.payload else None,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_at': self.run_at.isoformat() if self.run_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
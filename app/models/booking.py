@@ -28,6 +28,9 @@ class Booking(db.Model):
     reviews = db.relationship('Review', backref='booking', lazy=True)
     discount_usage = db.relationship('DiscountUsage', backref='booking', lazy=True)
     
+    # Phân trang cursor theo (created_at, booking_id)
+    __table_args__ = (db.Index('ix_bookings_created_id', 'created_at', 'booking_id'),)
+    
     def to_dict(self):
         return {
             'booking_id': self.booking_id,
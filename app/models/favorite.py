@@ -10,7 +10,11 @@ class Favorite(db.Model):
     hotel_id = db.Column(db.Integer, db.ForeignKey('hotels.hotel_id', ondelete='CASCADE'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    __table_args__ = (db.UniqueConstraint('user_id', 'hotel_id', name='unique_favorite'),)
+    # ix_favorites_hotel_user: lấy danh sách người theo dõi một khách sạn (gửi thông báo khuyến mãi)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'hotel_id', name='unique_favorite'),
+        db.Index('ix_favorites_hotel_user', 'hotel_id', 'user_id'),
+    )
     
     def to_dict(self):
         return {
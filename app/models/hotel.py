@@ -22,6 +22,8 @@ class Hotel(db.Model):
     check_out_time = db.Column(db.Time, default=time(12, 0))
     status = db.Column(db.Enum('pending', 'active', 'suspended', 'rejected'), default='pending', index=True)
     is_featured = db.Column(db.Boolean, default=False)
+    # Tên + thành phố + địa chỉ đã bỏ dấu, dùng cho FULLTEXT (xem TextSearchService)
+    search_text = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
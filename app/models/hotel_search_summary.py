@@ -0,0 +1,37 @@
+from app import db
+from datetime import datetime
+
+class HotelSearchSummary(db.Model):
+    __tablename__ = 'hotel_search_summary'
+    
+    hotel_id = db.Column(db.Integer, db.ForeignKey('hotels.hotel_id', ondelete='CASCADE'), primary_key=True)
+    min_price = db.Column(db.Numeric(10, 2), index=True)
+    max_price = db.Column(db.Numeric(10, 2), index=True)
+    review_count = db.Column(db.Integer, default=0, nullable=False)
+    avg_rating = db.Column(db.Numeric(3, 2), default=0, nullable=False, index=True)
+    has_free_cancellation = db.Column(db.Boolean, default=False, nullable=False, index=True)
+    has_active_promotion = db.Column(db.Boolean, default=False, nullable=False, index=True)
+    primary_image_url = db.Column(db.String(255))
+    # Danh sách amenity_id dạng ",1,5,9," để lọc bằng LIKE '%,5,%'
+    amenity_ids = db.Column(db.String(500), default=',', nullable=False)
+    # Thời điểm khuyến mãi gần nhất bắt đầu/kết thúc, quá mốc này cần tính lại has_active_promotion
+    expires_at = db.Column(db.DateTime, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def amenity_id_list(self):
+        return [int(value) for value in (self.amenity_ids or '').split(',') if value]
+    
+    def to_dict(self):
+        return {
+            'hotel_id': self.hotel_id,
+            'min_price': float(self.min_price) if self.min_price is not None else None,
+            'max_price': float(self.max_price) if self.max_price is not None else None,
+            'review_count': self.review_count,
+            'avg_rating': float(self.avg_rating) if self.avg_rating is not None else 0.0,
+            'has_free_cancellation': self.has_free_cancellation,
+            'has_active_promotion': self.has_active_promotion,
+            'primary_image_url': self.primary_image_url,
+            'amenity_ids': self.amenity_id_list(),
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
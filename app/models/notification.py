@@ -14,6 +14,9 @@ class Notification(db.Model):
     is_read = db.Column(db.Boolean, default=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Phân trang cursor theo (created_at, notification_id) của từng user
+    __table_args__ = (db.Index('ix_notifications_user_created', 'user_id', 'created_at', 'notification_id'),)
+    
     def to_dict(self):
         return {
             'notification_id': self.notification_id,
@@ -0,0 +1,53 @@
+from app import db
+from datetime import datetime
+
+class PlatformStats(db.Model):
+    """Số liệu tổng quan cho dashboard admin, chia thành nhiều dòng shard (giá trị thật là tổng các dòng),
+    xem app/services/platform_stats_service.py"""
+    __tablename__ = 'platform_stats'
+    
+    stats_id = db.Column(db.Integer, primary_key=True)
+    total_users = db.Column(db.Integer, nullable=False, default=0)
+    active_users = db.Column(db.Integer, nullable=False, default=0)
+    total_hotels = db.Column(db.Integer, nullable=False, default=0)
+    pending_hotels = db.Column(db.Integer, nullable=False, default=0)
+    active_hotels = db.Column(db.Integer, nullable=False, default=0)
+    total_bookings = db.Column(db.Integer, nullable=False, default=0)
+    total_revenue = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    total_payments = db.Column(db.Integer, nullable=False, default=0)
+    total_reviews = db.Column(db.Integer, nullable=False, default=0)
+    # avg_rating = rating_sum / rating_count, lưu tổng để cộng dồn được
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    total_rooms = db.Column(db.Integer, nullable=False, default=0)
+    # Có thay đổi không tính được chênh lệch (thiếu giá trị cũ), cần đối soát
+    needs_reconcile = db.Column(db.Boolean, nullable=False, default=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    reconciled_at = db.Column(db.DateTime)
+    
+    def avg_rating(self):
+        return self.rating_sum / self.rating_count if self.rating_count else 0.0
+    
+    def to_summary(self):
+        return {
+            'total_users': self.total_users,
+            'active_users': self.active_users,
+            'total_hotels': self.total_hotels,
+            'pending_hotels': self.pending_hotels,
+            'active_hotels': self.active_hotels,
+            'total_bookings': self.total_bookings,
+            'total_revenue': float(self.total_revenue or 0),
+            'total_payments': self.total_payments,
+            'total_reviews': self.total_reviews,
+            'total_rooms': self.total_rooms,
+            'avg_rating': float(self.avg_rating())
+        }
+    
+    def freshness(self, now=None):
+        now = now or datetime.utcnow()
+        return {
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'reconciled_at': self.reconciled_at.isoformat() if self.reconciled_at else None,
+            'reconciled_seconds_ago': int((now - self.reconciled_at).total_seconds()) if self.reconciled_at else None,
+            'needs_reconcile': self.needs_reconcile
+        }
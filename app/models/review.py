@@ -23,7 +23,11 @@ class Review(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    __table_args__ = (db.UniqueConstraint('booking_id', name='unique_booking_review'),)
+    __table_args__ = (
+        db.UniqueConstraint('booking_id', name='unique_booking_review'),
+        # Phân trang cursor theo (created_at, review_id) trong từng khách sạn
+        db.Index('ix_reviews_hotel_status_created', 'hotel_id', 'status', 'created_at', 'review_id'),
+    )
     
     def to_dict(self):
         return {
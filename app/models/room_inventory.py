@@ -0,0 +1,16 @@
+from app import db
+
+class RoomInventory(db.Model):
+    """Sổ phòng theo đêm: số phòng đã giữ của từng room cho từng đêm (chỉ tính booking còn giữ phòng)"""
+    __tablename__ = 'room_inventory'
+    
+    room_id = db.Column(db.Integer, db.ForeignKey('rooms.room_id', ondelete='CASCADE'), primary_key=True)
+    night = db.Column(db.Date, primary_key=True)
+    booked = db.Column(db.Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        return {
+            'room_id': self.room_id,
+            'night': self.night.isoformat() if self.night else None,
+            'booked': self.booked
+        }
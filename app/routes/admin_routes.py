@@ -248,3 +248,38 @@ def admin_export_report():
         return redirect(url_for('admin.admin_dashboard'))
     return result
 
+
+@admin_bp.route('/stats/refresh', methods=['POST'])
+@role_required('admin')
+def admin_refresh_stats():
+    result = AdminController.refresh_platform_stats()
+    payload = _extract_payload(result)
+    if result[1] >= 400:
+        flash(payload.get('message', 'Có lỗi xảy ra'), 'error')
+    else:
+        flash(payload.get('message', 'Đã cập nhật số liệu thống kê'), 'success')
+    return redirect(url_for('admin.admin_dashboard'))
+
+
+@admin_bp.route('/perf', methods=['GET'])
+@role_required('admin')
+def admin_perf():
+    return AdminController.perf_stats()
+
+
+@admin_bp.route('/perf/reset', methods=['POST'])
+@role_required('admin')
+def admin_perf_reset():
+    return AdminController.reset_perf_stats()
+
+
+@admin_bp.route('/jobs', methods=['GET'])
+@role_required('admin')
+def admin_jobs():
+    return AdminController.job_stats()
+
+
+@admin_bp.route('/jobs/retry', methods=['POST'])
+@role_required('admin')
+def admin_jobs_retry():
+    return AdminController.retry_failed_jobs()
@@ -188,97 +188,26 @@ def create_booking():
     price_info = None
     if step == 3 and room_data and step1_data.get('check_in_date') and step1_data.get('check_out_date'):
         from datetime import datetime
-        from app.models.promotion import Promotion
+        from app.services.pricing_service import PricingEngine
         try:
             check_in = datetime.strptime(step1_data.get('check_in_date'), '%Y-%m-%d').date()
             check_out = datetime.strptime(step1_data.get('check_out_date'), '%Y-%m-%d').date()
             num_nights = (check_out - check_in).days
             
             if num_nights > 0 and room_data.get('base_price'):
-                base_price = float(room_data.get('base_price', 0))
-                total_amount = base_price * num_nights
-                
-                # Check for active promotions
-                promotion_discount = 0
-                active_promotion = None
-                now = datetime.utcnow()
-                check_in_datetime = datetime.combine(check_in, datetime.min.time())
-                check_out_datetime = datetime.combine(check_out, datetime.min.time())
-                
-                # Query promotions for this room or hotel
-                room_id_value = step1_data.get('room_id') or (room_data.get('room_id') if room_data else None)
-                hotel_id_value = step1_data.get('hotel_id') or (hotel_data.get('hotel_id') if hotel_data else None)
-                
-                if room_id_value or hotel_id_value:
-                    # Find active promotions
-                    from sqlalchemy import or_, and_
-                    
-                    # Build filter conditions
-                    date_filter = and_(
-                        Promotion.is_active == True,
-                        Promotion.start_date <= check_out_datetime,
-                        Promotion.end_date >= check_in_datetime
-                    )
-                    
-                    # Filter by room_id or hotel_id
-                    if room_id_value and hotel_id_value:
-                        # Check promotions for this specific room, or hotel-level promotions
-                        promotion_filter = or_(
-                            Promotion.room_id == room_id_value,
-                            and_(Promotion.hotel_id == hotel_id_value, Promotion.room_id.is_(None))
-                        )
-                    elif room_id_value:
-                        promotion_filter = Promotion.room_id == room_id_value
-                    elif hotel_id_value:
-                        promotion_filter = or_(
-                            Promotion.hotel_id == hotel_id_value,
-                            Promotion.hotel_id.is_(None)
-                        )
-                    else:
-                        promotion_filter = True
-                    
-                    promotions = Promotion.query.filter(
-                        date_filter,
-                        promotion_filter
-                    ).all()
-                    
-                    # Find the best promotion (highest discount)
-                    best_discount = 0
-                    for promo in promotions:
-                        # Check min_nights
-                        if promo.min_nights and num_nights < promo.min_nights:
-                            continue
-                        
-                        # Check applicable_days if specified
-                        if promo.applicable_days:
-                            # applicable_days format: "0,1,2" (Monday=0, Sunday=6)
-                            check_in_weekday = check_in.weekday()
-                            applicable_days_list = [int(d.strip()) for d in promo.applicable_days.split(',') if d.strip().isdigit()]
-                            if applicable_days_list and check_in_weekday not in applicable_days_list:
-                                continue
-                        
-                        # Calculate discount
-                        if promo.discount_type == 'percentage':
-                            discount = total_amount * (float(promo.discount_value) / 100)
-                        else:  # fixed
-                            discount = float(promo.discount_value)
-                        
-                        if discount > best_discount:
-                            best_discount = discount
-                            active_promotion = promo
-                    
-                    promotion_discount = best_discount
-                
-                final_amount = total_amount - promotion_discount
+                # Dùng chung engine với lúc tạo booking để giá hiển thị khớp giá thực tế
+                quote = PricingEngine.quote(room_data['hotel_id'], [(room_data['room_id'], 1)], check_in, check_out)
+                line = quote.lines[0]
                 
                 price_info = {
-                    'base_price': base_price,
+                    'base_price': float(line.price_per_night),
+                    'varies_by_night': bool(line.nightly_prices.min() != line.nightly_prices.max()),
                     'num_nights': num_nights,
-                    'total_amount': total_amount,
-                    'promotion_discount': promotion_discount,
-                    'discount_amount': promotion_discount,  # For compatibility
-                    'final_amount': final_amount,
-                    'promotion': active_promotion.to_dict() if active_promotion else None
+                    'total_amount': float(quote.total_amount),
+                    'promotion_discount': float(quote.promotion_discount),
+                    'discount_amount': float(quote.promotion_discount),  # For compatibility
+                    'final_amount': float(quote.final_amount),
+                    'promotion': line.promotion.to_dict() if line.promotion else None
                 }
         except Exception as e:
             import traceback
@@ -296,6 +225,10 @@ def create_booking():
                          price_info=price_info,
                          error=request.args.get('error'))
 
+@booking_bp.route('/quote', methods=['POST'])
+def quote():
+    return BookingController.quote()
+
 @booking_bp.route('/<int:booking_id>/check-price', methods=['POST'])
 def check_price(booking_id):
     result = BookingController.check_price(booking_id)
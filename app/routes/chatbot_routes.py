@@ -1,6 +1,8 @@
-from flask import Blueprint, request, jsonify, session
+import json
 
-from app.services.chatbot_service import get_chatbot_answer
+from flask import Blueprint, Response, request, jsonify, session, stream_with_context
+
+from app.services.chatbot_service import get_chatbot_answer, stream_chatbot_answer
 
 chatbot_bp = Blueprint("chatbot", __name__, url_prefix="/api/chatbot")
 
@@ -24,14 +26,71 @@ def chat_message():
         return jsonify({"error": "Có lỗi xảy ra"}), 500
 
 
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@chatbot_bp.route("/stream", methods=["POST"])
+def chat_stream():
+    """Như /message nhưng trả về text/event-stream: token và tiến trình tool gửi ngay khi có"""
+    data = request.get_json(silent=True) or {}
+    message = (data.get("message") or "").strip()
+    history = data.get("history") or []
+
+    if not message:
+        return jsonify({"error": "message is required"}), 400
+
+    user_id = session.get("user_id")
+
+    def generate():
+        try:
+            for event, payload in stream_chatbot_answer(message, history, user_id=user_id):
+                yield _sse(event, payload)
+        except Exception as exc:
+            from flask import current_app
+            current_app.logger.error(f"Chatbot stream error: {exc}", exc_info=True)
+            yield _sse("error", {"message": "Có lỗi xảy ra"})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _parse_hotel_ids(value):
+    """None nếu không truyền; list int nếu hợp lệ; raise ValueError với chuỗi / phần tử không phải số nguyên"""
+    if value is None:
+        return None
+    if not isinstance(value, list):
+        raise ValueError("hotel_ids phải là danh sách số nguyên")
+    hotel_ids = []
+    for item in value:
+        if isinstance(item, bool) or not isinstance(item, (int, str)):
+            raise ValueError("hotel_ids phải là danh sách số nguyên")
+        try:
+            hotel_ids.append(int(item))
+        except ValueError:
+            raise ValueError("hotel_ids phải là danh sách số nguyên")
+    return hotel_ids
+
+
 @chatbot_bp.route("/rebuild-vector", methods=["POST"])
 def rebuild_vector():
+    data = request.get_json(silent=True) or {}
+    try:
+        hotel_ids = _parse_hotel_ids(data.get("hotel_ids"))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
     try:
         from app.services.chatbot_service import HotelRAGChatbot
 
+        full = str(request.args.get("full", data.get("full", ""))).lower() in ("1", "true", "yes")
+
         chatbot = HotelRAGChatbot()
-        chatbot.rebuild_vectorstore()
-        return jsonify({"success": True, "message": "Vector DB rebuilt"})
+        stats = chatbot.rebuild_vectorstore(full=full, hotel_ids=hotel_ids)
+        return jsonify({"success": True, "message": "Vector DB rebuilt" if full else "Vector DB synced", "stats": stats})
     except Exception as exc:
         return jsonify({"error": str(exc)}), 500
 
@@ -68,6 +68,11 @@ def list_unread_notifications_api():
     return _render_notification_template(result, view_mode='unread')
 
 
+@notification_bp.route('/api/notifications/unread-count', methods=['GET'])
+def unread_count_api():
+    return NotificationController.unread_count()
+
+
 @notification_bp.route('/api/notifications/<int:notification_id>', methods=['GET'])
 def notification_detail_api(notification_id):
     result = NotificationController.get_notification(notification_id)
@@ -32,6 +32,14 @@ class CheckPriceSchema(Schema):
     check_in_date = fields.Date(allow_none=True)
     check_out_date = fields.Date(allow_none=True)
 
+class BookingQuoteSchema(Schema):
+    hotel_id = fields.Integer(required=True)
+    check_in_date = fields.Date(required=True)
+    check_out_date = fields.Date(required=True)
+    rooms = fields.List(fields.Nested(RoomBookingSchema), required=True, validate=validate.Length(min=1))
+    num_guests = fields.Integer(allow_none=True, validate=validate.Range(min=1))
+    discount_code = fields.String(allow_none=True)
+
 class BookingCancelSchema(Schema):
     reason = fields.String(allow_none=True)
 
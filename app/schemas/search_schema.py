@@ -17,12 +17,12 @@ class SearchSchema(Schema):
     sort = fields.Str(required=False, allow_none=True)
     
     @validates('check_in')
-    def validate_check_in(self, value):
+    def validate_check_in(self, value, **kwargs):
         if value and value < date.today():
             raise ValidationError('Ngày nhận phòng không thể là quá khứ')
     
     @validates('check_out')
-    def validate_check_out(self, value):
+    def validate_check_out(self, value, **kwargs):
         if value and value < date.today():
             raise ValidationError('Ngày trả phòng không thể là quá khứ')
     
@@ -38,6 +38,9 @@ class AdvancedSearchSchema(Schema):
     star_rating = fields.Integer(allow_none=True, validate=validate.Range(min=1, max=5))
     amenity_ids = fields.List(fields.Integer(), allow_none=True)
     is_featured = fields.Boolean(allow_none=True)
+    free_cancel = fields.Boolean(allow_none=True)
+    has_promotion = fields.Boolean(allow_none=True)
+    sort = fields.String(allow_none=True, validate=validate.OneOf(['price_asc', 'price_desc', 'rating_desc', 'rating_asc']))
 
 class CheckAvailabilitySchema(Schema):
     check_in = fields.Date(required=True)
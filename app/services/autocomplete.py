@@ -0,0 +1,197 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history, PASSIVE_NO_INITIALIZE
+
+from app import db
+from app.models.hotel import Hotel
+from app.models.hotel_search_summary import HotelSearchSummary
+from app.services.text_search import tokenize
+
+# Thay đổi các cột này mới cần build lại index gợi ý
+WATCHED_HOTEL_FIELDS = ('hotel_name', 'city', 'status', 'is_featured')
+
+# Trọng số (review_count, avg_rating...) thay đổi liên tục nên vẫn build lại định kỳ
+INDEX_TTL = 600
+
+# Tiền tố ngắn khớp rất nhiều key, tính sẵn top-k lúc build
+SHORT_PREFIX_LENGTH = 2
+SHORT_PREFIX_TOP_K = 10
+
+_HOTEL_CHANGED_KEY = 'autocomplete_hotel_changed'
+
+
+class PrefixIndex:
+    """Mảng key đã bỏ dấu, sắp xếp để tìm tiền tố bằng bisect; mỗi từ trong tên đều là điểm bắt đầu khớp"""
+
+    def __init__(self, entries):
+        keyed = []
+        self._payloads = {}
+        short_best = {}
+        for text, weight, item_key, payload in entries:
+            words = tokenize(text)
+            if not words:
+                continue
+            self._payloads[item_key] = payload
+            for start in range(len(words)):
+                key = ' '.join(words[start:])
+                keyed.append((key, weight, item_key))
+                for length in range(1, min(SHORT_PREFIX_LENGTH, len(key)) + 1):
+                    best = short_best.setdefault(key[:length], {})
+                    if weight > best.get(item_key, float('-inf')):
+                        best[item_key] = weight
+
+        keyed.sort(key=lambda row: row[0])
+        self._keys = [row[0] for row in keyed]
+        self._entries = [(row[1], row[2]) for row in keyed]
+        self._short_top = {
+            prefix: heapq.nlargest(SHORT_PREFIX_TOP_K, ((weight, item_key) for item_key, weight in best.items()), key=_rank_key)
+            for prefix, best in short_best.items()
+        }
+
+    def __len__(self):
+        return len(self._payloads)
+
+    def top(self, prefix, k=5):
+        prefix = ' '.join(tokenize(prefix))
+        if not prefix:
+            return []
+
+        if len(prefix) <= SHORT_PREFIX_LENGTH and k <= SHORT_PREFIX_TOP_K:
+            ranked = self._short_top.get(prefix, [])
+        else:
+            best = {}
+            index = bisect_left(self._keys, prefix)
+            while index < len(self._keys) and self._keys[index].startswith(prefix):
+                weight, item_key = self._entries[index]
+                if weight > best.get(item_key, float('-inf')):
+                    best[item_key] = weight
+                index += 1
+            ranked = heapq.nlargest(k, ((weight, item_key) for item_key, weight in best.items()), key=_rank_key)
+
+        return [self._payloads[item_key] for _, item_key in ranked[:k]]
+
+
+def _rank_key(row):
+    # nlargest ổn định: cùng trọng số thì giữ thứ tự key (đã sắp xếp theo chữ cái)
+    return row[0]
+
+
+class AutocompleteService:
+    _lock = threading.Lock()
+    _stale = True
+    _built_at = 0
+    _cities = None
+    _hotels = None
+
+    @staticmethod
+    def city_hotel_counts(limit=None):
+        """Số khách sạn active theo thành phố, nhiều nhất trước (dùng chung với trang chủ)"""
+        query = db.session.query(
+            Hotel.city,
+            func.count(Hotel.hotel_id).label('hotel_count')
+        ).filter(Hotel.status == 'active')\
+        .group_by(Hotel.city)\
+        .order_by(func.count(Hotel.hotel_id).desc())
+        if limit:
+            query = query.limit(limit)
+        return query.all()
+
+    @staticmethod
+    def build():
+        city_entries = [
+            (city, count, city, {'type': 'city', 'value': city, 'count': count})
+            for city, count in AutocompleteService.city_hotel_counts()
+            if city
+        ]
+
+        rows = db.session.query(
+            Hotel.hotel_id,
+            Hotel.hotel_name,
+            Hotel.city,
+            Hotel.is_featured,
+            HotelSearchSummary.review_count,
+            HotelSearchSummary.avg_rating
+        ).outerjoin(
+            HotelSearchSummary, HotelSearchSummary.hotel_id == Hotel.hotel_id
+        ).filter(Hotel.status == 'active').all()
+
+        hotel_entries = []
+        for hotel_id, hotel_name, city, is_featured, review_count, avg_rating in rows:
+            # Nổi bật trước, sau đó theo số review và điểm trung bình
+            weight = (1000000 if is_featured else 0) + (review_count or 0) * 10 + float(avg_rating or 0)
+            hotel_entries.append((
+                hotel_name,
+                weight,
+                hotel_id,
+                {'type': 'hotel', 'value': hotel_name, 'id': hotel_id, 'city': city}
+            ))
+
+        AutocompleteService._cities = PrefixIndex(city_entries)
+        AutocompleteService._hotels = PrefixIndex(hotel_entries)
+        AutocompleteService._built_at = time.monotonic()
+
+    @staticmethod
+    def _ensure_fresh():
+        if not AutocompleteService._stale and time.monotonic() - AutocompleteService._built_at < INDEX_TTL:
+            return
+        with AutocompleteService._lock:
+            if not AutocompleteService._stale and time.monotonic() - AutocompleteService._built_at < INDEX_TTL:
+                return
+            AutocompleteService._stale = False
+            try:
+                AutocompleteService.build()
+            except Exception:
+                AutocompleteService._stale = True
+                raise
+
+    @staticmethod
+    def suggest(query_text, limit=5):
+        """Gợi ý thành phố và khách sạn theo tiền tố (không phân biệt dấu)"""
+        AutocompleteService._ensure_fresh()
+        return {
+            'cities': AutocompleteService._cities.top(query_text, limit),
+            'hotels': AutocompleteService._hotels.top(query_text, limit)
+        }
+
+    @staticmethod
+    def mark_stale():
+        AutocompleteService._stale = True
+
+    @staticmethod
+    def _collect_hotel_changes(session, flush_context):
+        for obj in list(session.new) + list(session.deleted):
+            if isinstance(obj, Hotel):
+                session.info[_HOTEL_CHANGED_KEY] = True
+                return
+        for obj in session.dirty:
+            if isinstance(obj, Hotel):
+                for field in WATCHED_HOTEL_FIELDS:
+                    if get_history(obj, field, passive=PASSIVE_NO_INITIALIZE).has_changes():
+                        session.info[_HOTEL_CHANGED_KEY] = True
+                        return
+
+    @staticmethod
+    def _after_commit(session):
+        if session.info.pop(_HOTEL_CHANGED_KEY, False):
+            AutocompleteService.mark_stale()
+
+    @staticmethod
+    def _after_rollback(session, previous_transaction):
+        session.info.pop(_HOTEL_CHANGED_KEY, None)
+
+    @staticmethod
+    def register_hooks():
+        """Đánh dấu index cần build lại khi khách sạn đổi tên, thành phố hoặc trạng thái"""
+        hooks = (
+            ('after_flush', AutocompleteService._collect_hotel_changes),
+            ('after_commit', AutocompleteService._after_commit),
+            ('after_soft_rollback', AutocompleteService._after_rollback),
+        )
+        for name, handler in hooks:
+            if not event.contains(Session, name, handler):
+                event.listen(Session, name, handler)
@@ -0,0 +1,173 @@
+from datetime import timedelta
+
+import numpy as np
+
+from app import db
+from app.models.room import Room
+from app.models.booking import Booking
+from app.models.booking_detail import BookingDetail
+from app.models.room_inventory import RoomInventory
+
+# Booking ở các trạng thái này vẫn giữ phòng
+BLOCKING_STATUSES = ('pending', 'confirmed', 'checked_in')
+
+# Mỗi Room là một phòng vật lý (cột rooms.quantity đã bỏ)
+ROOM_CAPACITY = 1
+
+# Trạng thái phòng được tính là còn cho thuê khi tra cứu / khi đặt phòng.
+# 'occupied' chỉ là tình trạng hiện tại nên vẫn nhận đặt cho ngày sau.
+SEARCHABLE_STATUSES = ('available',)
+BOOKABLE_STATUSES = ('available', 'occupied')
+
+
+class AvailabilityResult:
+    """Ma trận số phòng đã đặt (rooms x đêm) cho một khoảng ngày"""
+
+    def __init__(self, room_ids, check_in, check_out, occupancy, capacity):
+        self.room_ids = room_ids
+        self.check_in = check_in
+        self.check_out = check_out
+        self.occupancy = occupancy
+        self.capacity = capacity
+        self._index = {room_id: position for position, room_id in enumerate(room_ids)}
+        # Số phòng còn trống ít nhất trong các đêm = số phòng có thể đặt cho cả kỳ
+        if occupancy.shape[1]:
+            self.free = (capacity[:, None] - occupancy).min(axis=1)
+        else:
+            self.free = capacity.copy()
+        self.free = np.maximum(self.free, 0)
+
+    @property
+    def num_nights(self):
+        return self.occupancy.shape[1]
+
+    def available_quantity(self, room_id):
+        position = self._index.get(room_id)
+        if position is None:
+            return 0
+        return int(self.free[position])
+
+    def is_available(self, room_id, quantity=1):
+        return self.available_quantity(room_id) >= quantity
+
+    def available_room_ids(self, quantity=1):
+        return [self.room_ids[position] for position in np.flatnonzero(self.free >= quantity)]
+
+    def unavailable(self, quantities):
+        """quantities: {room_id: số lượng cần}; trả về danh sách room_id không đủ phòng"""
+        return [room_id for room_id, quantity in quantities.items() if not self.is_available(room_id, quantity)]
+
+    def booked_nights(self, room_id):
+        position = self._index.get(room_id)
+        if position is None:
+            return []
+        full = np.flatnonzero(self.occupancy[position] >= self.capacity[position])
+        return [self.check_in + timedelta(days=int(night)) for night in full]
+
+
+class AvailabilityEngine:
+
+    @staticmethod
+    def _room_capacities(rooms, usable_statuses):
+        room_ids = []
+        capacity = []
+        missing_ids = []
+        for room in rooms:
+            if isinstance(room, Room):
+                room_ids.append(room.room_id)
+                capacity.append(ROOM_CAPACITY if room.status in usable_statuses else 0)
+            else:
+                missing_ids.append(room)
+
+        if missing_ids:
+            statuses = dict(db.session.query(Room.room_id, Room.status).filter(Room.room_id.in_(missing_ids)).all())
+            for room_id in missing_ids:
+                room_ids.append(room_id)
+                capacity.append(ROOM_CAPACITY if statuses.get(room_id) in usable_statuses else 0)
+
+        return room_ids, np.array(capacity, dtype=np.int32)
+
+    @staticmethod
+    def _occupancy_from_ledger(room_ids, check_in, check_out, occupancy, for_update=False):
+        """Quét khoảng (room_id, night) trên khóa chính của room_inventory"""
+        query = db.session.query(
+            RoomInventory.room_id,
+            RoomInventory.night,
+            RoomInventory.booked
+        ).filter(
+            RoomInventory.room_id.in_(room_ids),
+            RoomInventory.night >= check_in,
+            RoomInventory.night < check_out,
+            RoomInventory.booked > 0
+        )
+        if for_update:
+            # Đọc có khóa luôn thấy dữ liệu mới nhất, không phải snapshot của transaction
+            query = query.order_by(RoomInventory.room_id, RoomInventory.night).with_for_update()
+        rows = query.all()
+
+        if rows:
+            index = {room_id: position for position, room_id in enumerate(room_ids)}
+            positions = np.fromiter((index[row[0]] for row in rows), dtype=np.int64, count=len(rows))
+            nights = np.fromiter(((row[1] - check_in).days for row in rows), dtype=np.int64, count=len(rows))
+            occupancy[positions, nights] = np.fromiter((row[2] for row in rows), dtype=np.int32, count=len(rows))
+        return occupancy
+
+    @staticmethod
+    def _occupancy_from_bookings(room_ids, check_in, check_out, occupancy, exclude_booking_id=None):
+        """Tính từ bảng booking (dùng khi cần bỏ qua một booking, ví dụ lúc đổi ngày)"""
+        num_nights = occupancy.shape[1]
+        query = db.session.query(
+            BookingDetail.room_id,
+            BookingDetail.quantity,
+            Booking.check_in_date,
+            Booking.check_out_date
+        ).join(
+            Booking, Booking.booking_id == BookingDetail.booking_id
+        ).filter(
+            BookingDetail.room_id.in_(room_ids),
+            Booking.status.in_(BLOCKING_STATUSES),
+            Booking.check_in_date < check_out,
+            Booking.check_out_date > check_in
+        )
+        if exclude_booking_id:
+            query = query.filter(Booking.booking_id != exclude_booking_id)
+        rows = query.all()
+
+        if rows:
+            index = {room_id: position for position, room_id in enumerate(room_ids)}
+            positions = np.fromiter((index[row[0]] for row in rows), dtype=np.int64, count=len(rows))
+            quantities = np.fromiter((row[1] or 1 for row in rows), dtype=np.int32, count=len(rows))
+            starts = np.fromiter(((row[2] - check_in).days for row in rows), dtype=np.int64, count=len(rows))
+            ends = np.fromiter(((row[3] - check_in).days for row in rows), dtype=np.int64, count=len(rows))
+            starts = np.clip(starts, 0, num_nights)
+            ends = np.clip(ends, 0, num_nights)
+
+            # Mảng hiệu: +quantity tại đêm bắt đầu, -quantity tại đêm trả phòng, cộng dồn theo trục đêm
+            diff = np.zeros((len(room_ids), num_nights + 1), dtype=np.int32)
+            np.add.at(diff, (positions, starts), quantities)
+            np.add.at(diff, (positions, ends), -quantities)
+            occupancy = np.cumsum(diff, axis=1)[:, :num_nights].astype(np.int32)
+        return occupancy
+
+    @staticmethod
+    def load(rooms, check_in, check_out, usable_statuses=SEARCHABLE_STATUSES, exclude_booking_id=None, for_update=False):
+        """Dựng ma trận chiếm dụng theo đêm cho danh sách phòng từ sổ room_inventory (1 query).
+
+        rooms: list Room hoặc room_id (room_id thì query thêm trạng thái phòng).
+        for_update: khóa các dòng sổ phòng đọc được (dùng khi giữ phòng, xem InventoryService.lock_and_check).
+        """
+        room_ids, capacity = AvailabilityEngine._room_capacities(rooms, usable_statuses)
+        num_nights = max((check_out - check_in).days, 0)
+        occupancy = np.zeros((len(room_ids), num_nights), dtype=np.int32)
+
+        if room_ids and num_nights:
+            if exclude_booking_id:
+                occupancy = AvailabilityEngine._occupancy_from_bookings(
+                    room_ids, check_in, check_out, occupancy, exclude_booking_id
+                )
+            else:
+                occupancy = AvailabilityEngine._occupancy_from_ledger(
+                    room_ids, check_in, check_out, occupancy, for_update
+                )
+
+        return AvailabilityResult(room_ids, check_in, check_out, occupancy, capacity)
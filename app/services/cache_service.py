@@ -0,0 +1,425 @@
+import fnmatch
+import pickle
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+
+from app.models.hotel import Hotel
+from app.models.hotel_image import HotelImage
+from app.models.room import Room
+from app.models.room_image import RoomImage
+from app.models.room_type import RoomType
+from app.models.review import Review
+from app.models.promotion import Promotion
+from app.models.amenity import Amenity
+from app.models.cancellation_policy import CancellationPolicy
+from app.models.discount_code import DiscountCode
+from app.models.booking import Booking
+from app.models.user import User
+
+DEFAULT_CACHE_TTL = 300
+DEFAULT_MAX_ENTRIES = 1024
+
+# Tag dùng để xóa cache theo entity. Mỗi giá trị cache ghi kèm version của các tag tại lúc nạp,
+# invalidate chỉ tăng version nên không cần biết những key nào đang phụ thuộc tag đó.
+TAG_HOTELS = 'hotels'                # danh sách khách sạn: trang chủ, khách sạn nổi bật
+TAG_HOTEL_DETAILS = 'hotel_details'  # mọi trang chi tiết (đổi tiện nghi, loại phòng dùng chung)
+TAG_PROMOTIONS = 'promotions'
+TAG_AMENITIES = 'amenities'
+TAG_ROOM_TYPES = 'room_types'
+TAG_DISCOUNT_CODES = 'discount_codes'
+
+_CHANGED_TAGS_KEY = 'cache_changed_tags'
+
+USER_PROFILE_ATTRS = ('full_name', 'email', 'avatar_url')
+
+
+def hotel_tag(hotel_id):
+    return f'hotel:{hotel_id}'
+
+
+def user_bookings_tag(user_id):
+    return f'bookings:{user_id}'
+
+
+def user_profile_tag(user_id):
+    """Tên / avatar / email của user (hiển thị kèm review trong trang chi tiết)"""
+    return f'user:{user_id}'
+
+
+class MemoryCacheBackend:
+    """LRU trong process, mỗi entry có hạn riêng; giá trị giữ nguyên object nên không được sửa sau khi lấy ra"""
+    name = 'memory'
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # Version tag để riêng, không bị LRU đẩy ra (mất version cũ sẽ làm entry cũ hợp lệ trở lại)
+        self._versions = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def get_versions(self, tags):
+        with self._lock:
+            return tuple(self._versions.get(tag, 0) for tag in tags)
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+
+class RedisCacheBackend:
+    """Dùng chung giữa các worker: giá trị pickle, version tag là counter INCR"""
+    name = 'redis'
+
+    def __init__(self, client, prefix='hotel_cache:'):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, prefix='hotel_cache:'):
+        if url.startswith('local://'):
+            return cls(LocalRedisClient(), prefix)
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('CACHE_BACKEND=redis cần cài gói redis (pip install redis)')
+        return cls(redis.Redis.from_url(url), prefix)
+
+    def _tag_key(self, tag):
+        return f'{self.prefix}tag:{tag}'
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ex=int(ttl))
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+
+    def get_versions(self, tags):
+        if not tags:
+            return ()
+        return tuple(int(value or 0) for value in self.client.mget([self._tag_key(tag) for tag in tags]))
+
+    def bump(self, tags):
+        for tag in tags:
+            self.client.incr(self._tag_key(tag))
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=f'{self.prefix}*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+class LocalRedisClient:
+    """Thay thế Redis chạy trong process (CACHE_REDIS_URL=local://) để chạy thử / benchmark nhánh redis"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def _alive(self, name):
+        entry = self._data.get(name)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[name]
+            return None
+        return value
+
+    def get(self, name):
+        with self._lock:
+            return self._alive(name)
+
+    def mget(self, names):
+        with self._lock:
+            return [self._alive(name) for name in names]
+
+    def set(self, name, value, ex=None):
+        with self._lock:
+            if isinstance(value, str):
+                value = value.encode()
+            self._data[name] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            value = int(self._alive(name) or 0) + amount
+            self._data[name] = (str(value).encode(), None)
+            return value
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(1 for name in names if self._data.pop(name, None) is not None)
+
+    def scan_iter(self, match='*'):
+        with self._lock:
+            names = [name for name in self._data if fnmatch.fnmatchcase(name, match)]
+        return iter(names)
+
+
+class NullCacheBackend:
+    """Tắt cache (CACHE_BACKEND=none): luôn miss"""
+    name = 'none'
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def get_versions(self, tags):
+        return tuple(0 for _ in tags)
+
+    def bump(self, tags):
+        pass
+
+    def clear(self):
+        pass
+
+
+class CacheService:
+    _stats_lock = threading.Lock()
+    _stats = Counter()
+
+    @staticmethod
+    def get_backend():
+        """Backend theo config CACHE_BACKEND: auto (mặc định), memory, redis (CACHE_REDIS_URL), none"""
+        backend = current_app.extensions.get('cache')
+        if backend is not None:
+            return backend
+
+        workers = current_app.config.get('WEB_WORKERS', 1)
+        choice = (current_app.config.get('CACHE_BACKEND') or 'auto').lower()
+        redis_url = current_app.config.get('CACHE_REDIS_URL') or 'redis://localhost:6379/0'
+        backend = None
+        if choice == 'auto':
+            choice = 'redis' if workers > 1 else 'memory'
+            if choice == 'redis':
+                try:
+                    backend = RedisCacheBackend.from_url(redis_url)
+                except RuntimeError as e:
+                    current_app.logger.warning(f'{e}; dùng cache memory')
+                    choice = 'memory'
+        if backend is None:
+            if choice == 'redis':
+                backend = RedisCacheBackend.from_url(redis_url)
+            elif choice == 'none':
+                backend = NullCacheBackend()
+            else:
+                backend = MemoryCacheBackend(current_app.config.get('CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+        if backend.name == 'memory' and workers > 1:
+            # Invalidate chỉ tăng version tag trong process này: process khác vẫn trả bản cũ tới hết TTL
+            current_app.logger.warning(
+                f'CACHE_BACKEND=memory chỉ dùng cho 1 process web (WEB_CONCURRENCY={workers}); '
+                'các process khác sẽ trả dữ liệu cũ tới hết TTL, hãy dùng CACHE_BACKEND=redis'
+            )
+        current_app.extensions['cache'] = backend
+        return backend
+
+    @staticmethod
+    def _count(name):
+        with CacheService._stats_lock:
+            CacheService._stats[name] += 1
+
+    @staticmethod
+    def get_or_set(key, loader, ttl=None, tags=(), value_tags=None):
+        """Đọc qua cache: trả giá trị đã lưu nếu chưa hết hạn và không tag nào bị invalidate, ngược lại gọi loader().
+
+        value_tags(value): các tag chỉ biết sau khi nạp (ví dụ user viết review), lưu kèm entry và kiểm tra khi đọc.
+        loader trả về None thì không lưu (ví dụ không tìm thấy bản ghi). Cache lỗi (Redis mất kết nối...)
+        thì đọc thẳng từ loader.
+        """
+        if ttl is None:
+            ttl = current_app.config.get('CACHE_DEFAULT_TTL', DEFAULT_CACHE_TTL)
+        tags = tuple(tags)
+
+        try:
+            backend = CacheService.get_backend()
+            versions = backend.get_versions(tags)
+            entry = backend.get(key)
+        except Exception as e:
+            print(f'Lỗi đọc cache {key}: {str(e)}')
+            CacheService._count('errors')
+            return loader()
+
+        if entry is not None and entry[0] == versions:
+            try:
+                # Entry có tag theo giá trị: (versions, value, value_tags, version của value_tags)
+                valid = len(entry) < 4 or backend.get_versions(entry[2]) == entry[3]
+            except Exception as e:
+                print(f'Lỗi đọc cache {key}: {str(e)}')
+                CacheService._count('errors')
+                valid = False
+            if valid:
+                CacheService._count('hits')
+                return entry[1]
+
+        CacheService._count('misses')
+        # Lưu version đọc trước khi nạp: invalidate xảy ra trong lúc nạp sẽ làm entry này hết hiệu lực
+        value = loader()
+        if value is not None:
+            try:
+                if value_tags is not None:
+                    # Tag theo giá trị chỉ đọc được version sau khi nạp; thay đổi rơi vào khoảng này tự hết khi hết TTL
+                    extra_tags = tuple(value_tags(value))
+                    backend.set(key, (versions, value, extra_tags, backend.get_versions(extra_tags)), ttl)
+                else:
+                    backend.set(key, (versions, value), ttl)
+            except Exception as e:
+                print(f'Lỗi ghi cache {key}: {str(e)}')
+                CacheService._count('errors')
+        return value
+
+    @staticmethod
+    def tag_versions(tags):
+        """Version hiện tại của các tag (dùng cho cache riêng cần biết dữ liệu nguồn đã đổi chưa)"""
+        tags = tuple(tags)
+        try:
+            return CacheService.get_backend().get_versions(tags)
+        except Exception as e:
+            print(f'Lỗi đọc version cache {tags}: {str(e)}')
+            CacheService._count('errors')
+            return None
+
+    @staticmethod
+    def invalidate(*tags):
+        tags = [tag for tag in tags if tag]
+        if not tags:
+            return
+        try:
+            CacheService.get_backend().bump(tags)
+            CacheService._count('invalidations')
+        except Exception as e:
+            print(f'Lỗi xóa cache {tags}: {str(e)}')
+            CacheService._count('errors')
+
+    @staticmethod
+    def clear():
+        CacheService.get_backend().clear()
+
+    @staticmethod
+    def stats():
+        with CacheService._stats_lock:
+            stats = dict(CacheService._stats)
+        lookups = stats.get('hits', 0) + stats.get('misses', 0)
+        stats['hit_ratio'] = round(stats.get('hits', 0) / lookups, 4) if lookups else 0.0
+        stats['backend'] = CacheService.get_backend().name
+        return stats
+
+    @staticmethod
+    def reset_stats():
+        with CacheService._stats_lock:
+            CacheService._stats.clear()
+
+    @staticmethod
+    def _room_hotel_id(session, room_id):
+        # Chỉ tra identity map, không query trong after_flush
+        room = session.identity_map.get(identity_key(Room, room_id))
+        return room.hotel_id if room is not None else None
+
+    @staticmethod
+    def tags_for(session, obj):
+        """Các tag bị ảnh hưởng khi ghi một entity"""
+        if isinstance(obj, Hotel):
+            return {TAG_HOTELS, hotel_tag(obj.hotel_id)}
+        if isinstance(obj, Promotion):
+            return {TAG_HOTELS, TAG_PROMOTIONS, hotel_tag(obj.hotel_id)}
+        if isinstance(obj, (Room, Review, HotelImage, CancellationPolicy)):
+            return {TAG_HOTELS, hotel_tag(obj.hotel_id)}
+        if isinstance(obj, RoomImage):
+            hotel_id = CacheService._room_hotel_id(session, obj.room_id)
+            return {hotel_tag(hotel_id) if hotel_id else TAG_HOTEL_DETAILS}
+        if isinstance(obj, Amenity):
+            return {TAG_HOTELS, TAG_AMENITIES, TAG_HOTEL_DETAILS}
+        if isinstance(obj, RoomType):
+            return {TAG_ROOM_TYPES, TAG_HOTEL_DETAILS}
+        if isinstance(obj, DiscountCode):
+            return {TAG_DISCOUNT_CODES}
+        if isinstance(obj, Booking):
+            return {user_bookings_tag(obj.user_id)}
+        if isinstance(obj, User):
+            # Chỉ các trường hiển thị công khai; đăng nhập, đếm thông báo... không làm mất cache
+            state = inspect(obj)
+            if state.deleted or any(state.attrs[attr].history.has_changes() for attr in USER_PROFILE_ATTRS):
+                return {user_profile_tag(obj.user_id)}
+        return set()
+
+    @staticmethod
+    def _collect_changes(session, flush_context):
+        changed = None
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            tags = CacheService.tags_for(session, obj)
+            if tags:
+                if changed is None:
+                    changed = session.info.setdefault(_CHANGED_TAGS_KEY, set())
+                changed |= tags
+
+    @staticmethod
+    def _after_commit(session):
+        tags = session.info.pop(_CHANGED_TAGS_KEY, None)
+        if tags and has_app_context():
+            CacheService.invalidate(*sorted(tags))
+
+    @staticmethod
+    def _after_rollback(session, previous_transaction):
+        # Rollback savepoint thì giữ lại: xóa thừa cache không sao, bỏ sót mới gây dữ liệu cũ
+        if previous_transaction.parent is None:
+            session.info.pop(_CHANGED_TAGS_KEY, None)
+
+    @staticmethod
+    def register_hooks():
+        """Xóa cache theo entity sau khi commit các thay đổi Hotel, Room, Promotion, Review..."""
+        hooks = (
+            ('after_flush', CacheService._collect_changes),
+            ('after_commit', CacheService._after_commit),
+            ('after_soft_rollback', CacheService._after_rollback),
+        )
+        for name, handler in hooks:
+            if not event.contains(Session, name, handler):
+                event.listen(Session, name, handler)
@@ -1,23 +1,259 @@
-from functools import lru_cache
+"""
+CHATBOT CACHE - Cache câu trả lời chatbot
+
+- Giới hạn số entry (LRU) và có TTL
+- Hết hiệu lực ngay khi dữ liệu khách sạn / khuyến mãi / mã giảm giá thay đổi (theo version tag của CacheService)
+- Câu trả lời dùng dữ liệu riêng của user (booking) chỉ trả lại cho đúng user đó
+- Tùy chọn khớp câu hỏi gần giống bằng embedding (cosine similarity)
+"""
+
 import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from flask import current_app
+
+from app.services.cache_service import (
+    CacheService,
+    TAG_DISCOUNT_CODES,
+    TAG_HOTEL_DETAILS,
+    TAG_HOTELS,
+    TAG_PROMOTIONS,
+    user_bookings_tag,
+)
+
+DEFAULT_MAX_ENTRIES = 500
+DEFAULT_TTL = 600
+DEFAULT_SIMILARITY = 0.95
+
+# Câu trả lời chung dựa trên dữ liệu catalog, đổi một trong các tag này là bỏ cache
+CATALOG_TAGS = (TAG_HOTELS, TAG_HOTEL_DETAILS, TAG_PROMOTIONS, TAG_DISCOUNT_CODES)
+
+# Câu trả lời không dùng dữ liệu riêng, tách theo bộ tool: khách vãng lai không có tool booking nên
+# cùng câu hỏi có thể trả lời khác thành viên đã đăng nhập
+GUEST_SCOPE = "public:guest"
+MEMBER_SCOPE = "public:member"
+PUBLIC_SCOPES = (GUEST_SCOPE, MEMBER_SCOPE)
+
+_SPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCT_RE = re.compile(r"[\s?!.,;:]+$")
+
+
+def normalize_message(message: str) -> str:
+    message = unicodedata.normalize("NFC", message or "").lower()
+    message = _SPACE_RE.sub(" ", message).strip()
+    return _TRAILING_PUNCT_RE.sub("", message)
+
+
+def _scope(user_id: Optional[int]) -> str:
+    return f"user:{user_id}" if user_id else GUEST_SCOPE
+
+
+def _public_scope(user_id: Optional[int]) -> str:
+    return MEMBER_SCOPE if user_id else GUEST_SCOPE
+
+
+def _scope_tags(scope: str) -> Sequence[str]:
+    if scope in PUBLIC_SCOPES:
+        return CATALOG_TAGS
+    return CATALOG_TAGS + (user_bookings_tag(scope.split(":", 1)[1]),)
+
+
+class _Entry:
+    __slots__ = ("answer", "scope", "versions", "expires_at", "vector")
+
+    def __init__(self, answer, scope, versions, expires_at, vector):
+        self.answer = answer
+        self.scope = scope
+        self.versions = versions
+        self.expires_at = expires_at
+        self.vector = vector
+
+
+class ChatbotAnswerCache:
+    """LRU theo (scope, câu hỏi đã chuẩn hóa); mỗi scope giữ thêm vector embedding để tìm câu gần giống"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, similarity=DEFAULT_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._vectors: Dict[str, Dict[str, np.ndarray]] = {}
+        self._stats = Counter()
 
-_answer_cache = {}
+    def __len__(self):
+        return len(self._entries)
 
-@lru_cache(maxsize=100)
-def _get_cached_answer_hash(message_hash: str):
+    @staticmethod
+    def _key(scope: str, normalized: str) -> str:
+        return f"{scope}:{hashlib.md5(normalized.encode()).hexdigest()}"
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry.vector is not None:
+            vectors = self._vectors.get(entry.scope)
+            if vectors is not None:
+                vectors.pop(key, None)
+                if not vectors:
+                    del self._vectors[entry.scope]
+
+    def _valid(self, key: str, entry: _Entry, versions, now: float) -> bool:
+        if entry.expires_at <= now:
+            self._drop(key)
+            self._stats["expired"] += 1
+            return False
+        if versions is None or entry.versions != versions:
+            self._drop(key)
+            self._stats["stale"] += 1
+            return False
+        return True
+
+    def _semantic_match(self, scope: str, vector: np.ndarray, versions, now: float):
+        vectors = self._vectors.get(scope)
+        if not vectors:
+            return None
+        keys = list(vectors)
+        scores = np.stack([vectors[key] for key in keys]) @ vector
+        for position in np.argsort(scores)[::-1]:
+            if scores[position] < self.similarity:
+                break
+            key = keys[position]
+            entry = self._entries[key]
+            if self._valid(key, entry, versions, now):
+                return key, entry
+        return None
+
+    def get(self, normalized: str, scope: str, versions, vector: Optional[np.ndarray] = None) -> Optional[str]:
+        now = time.monotonic()
+        key = self._key(scope, normalized)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._valid(key, entry, versions, now):
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry.answer
+
+            if vector is not None:
+                match = self._semantic_match(scope, vector, versions, now)
+                if match is not None:
+                    self._entries.move_to_end(match[0])
+                    self._stats["semantic_hits"] += 1
+                    return match[1].answer
+        return None
+
+    def put(self, normalized: str, scope: str, answer: str, versions, vector: Optional[np.ndarray] = None):
+        if versions is None:
+            return
+        key = self._key(scope, normalized)
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = _Entry(answer, scope, versions, time.monotonic() + self.ttl, vector)
+            if vector is not None:
+                self._vectors.setdefault(scope, {})[key] = vector
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def record_miss(self):
+        with self._lock:
+            self._stats["misses"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._vectors.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        hits = stats.get("hits", 0) + stats.get("semantic_hits", 0)
+        lookups = hits + stats.get("misses", 0)
+        stats["hit_ratio"] = round(hits / lookups, 4) if lookups else 0.0
+        return stats
+
+
+def _get_cache() -> ChatbotAnswerCache:
+    cache = current_app.extensions.get("chatbot_cache")
+    if cache is None:
+        cache = ChatbotAnswerCache(
+            max_entries=current_app.config.get("CHATBOT_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES),
+            ttl=current_app.config.get("CHATBOT_CACHE_TTL", DEFAULT_TTL),
+            similarity=current_app.config.get("CHATBOT_CACHE_SIMILARITY", DEFAULT_SIMILARITY),
+        )
+        current_app.extensions["chatbot_cache"] = cache
+    return cache
+
+
+def semantic_enabled() -> bool:
+    return bool(current_app.config.get("CHATBOT_CACHE_SEMANTIC", False))
+
+
+def _unit_vector(embedding: Optional[List[float]]) -> Optional[np.ndarray]:
+    if embedding is None:
+        return None
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else None
+
+
+def get_cached_answer(
+    message: str,
+    user_id: Optional[int] = None,
+    embedding: Optional[List[float]] = None,
+) -> Optional[str]:
+    """Tìm trong scope của user trước (câu trả lời riêng), sau đó tới scope chung của thành viên / khách"""
+    normalized = normalize_message(message)
+    if not normalized:
+        return None
+
+    cache = _get_cache()
+    vector = _unit_vector(embedding)
+    scopes = [_scope(user_id), MEMBER_SCOPE] if user_id else [GUEST_SCOPE]
+    for scope in scopes:
+        answer = cache.get(normalized, scope, CacheService.tag_versions(_scope_tags(scope)), vector)
+        if answer is not None:
+            return answer
+
+    cache.record_miss()
     return None
 
-def get_cached_answer(message: str) -> str:
-    message_hash = hashlib.md5(message.lower().strip().encode()).hexdigest()
-    cached = _answer_cache.get(message_hash)
-    return cached
 
-def save_to_cache(message: str, answer: str):
-    message_hash = hashlib.md5(message.lower().strip().encode()).hexdigest()
-    _answer_cache[message_hash] = answer
-    return message_hash
+def save_to_cache(
+    message: str,
+    answer: str,
+    user_id: Optional[int] = None,
+    personal: bool = False,
+    embedding: Optional[List[float]] = None,
+):
+    """personal=True: câu trả lời có dùng dữ liệu riêng của user, chỉ lưu trong scope của user đó"""
+    normalized = normalize_message(message)
+    if not normalized or not answer:
+        return
+    if personal and not user_id:
+        return
+
+    scope = _scope(user_id) if personal else _public_scope(user_id)
+    _get_cache().put(
+        normalized,
+        scope,
+        answer,
+        CacheService.tag_versions(_scope_tags(scope)),
+        _unit_vector(embedding),
+    )
+
 
 def clear_cache():
-    _answer_cache.clear()
-    _get_cached_answer_hash.cache_clear()
+    _get_cache().clear()
+
 
+def cache_stats() -> Dict[str, float]:
+    stats = _get_cache().stats()
+    stats["semantic"] = semantic_enabled()
+    return stats
@@ -0,0 +1,305 @@
+"""
+CHATBOT RETRIEVAL - Lọc theo điều kiện trong câu hỏi trước khi tìm tương đồng
+
+- Tách thành phố, khoảng giá, số khách, ngày ở khỏi câu hỏi ("phòng Đà Lạt dưới 1 triệu cho 4 người")
+- Áp thành filter `where` của vector store trên metadata city / base_price / max_guests
+- Lọc lại bằng AvailabilityEngine: bỏ phòng đã ngừng cho thuê hoặc kín lịch trong kỳ ở
+"""
+
+import re
+from datetime import date, timedelta
+from typing import List, Optional, Sequence, Tuple
+
+from flask import current_app
+
+from app.services.cache_service import CacheService, TAG_HOTELS
+from app.services.text_search import fold_vietnamese
+
+DEFAULT_K = 5
+# Lấy dư để sau khi lọc tình trạng phòng vẫn còn đủ k kết quả
+RETRIEVAL_OVERFETCH = 4
+# "tầm / khoảng 1 triệu" cho phép vượt giá này bao nhiêu
+PRICE_TOLERANCE = 0.2
+CITIES_CACHE_TTL = 3600
+
+# Các cách gọi khác nhau của cùng một thành phố (đã bỏ dấu)
+CITY_ALIASES = (
+    ("ho chi minh", "tp hcm", "tphcm", "hcm", "sai gon", "saigon"),
+    ("ha noi", "hanoi"),
+    ("da lat", "dalat"),
+    ("da nang", "danang"),
+    ("nha trang", "nhatrang"),
+    ("vung tau", "vungtau"),
+    ("phu quoc", "phuquoc"),
+)
+
+_UNITS = {
+    "trieu": 1_000_000, "tr": 1_000_000, "cu": 1_000_000,
+    "nghin": 1_000, "ngan": 1_000, "k": 1_000,
+    "dong": 1, "d": 1, "vnd": 1,
+}
+_NUMBER_WORDS = {
+    "mot": 1, "hai": 2, "ba": 3, "bon": 4, "nam": 5,
+    "sau": 6, "bay": 7, "tam": 8, "chin": 9, "muoi": 10,
+}
+
+_AMOUNT = r"(\d+(?:[.,]\d+)*)\s*(trieu|tr|cu|nghin|ngan|k|dong|vnd|d)?(?![a-z0-9])"
+_RANGE_RE = re.compile(rf"(?:tu\s+)?{_AMOUNT}\s*(?:den|toi|-|~)\s*{_AMOUNT}")
+_MAX_RE = re.compile(rf"(?<![a-z])(?:duoi|khong qua|toi da|max|re hon|it hon|<=?)\s*{_AMOUNT}|{_AMOUNT}\s*tro xuong")
+_MIN_RE = re.compile(rf"(?<![a-z])(?:tren|tu|toi thieu|it nhat|(?<!re )(?<!it )hon|min|>=?)\s*{_AMOUNT}|{_AMOUNT}\s*tro len")
+_ABOUT_RE = re.compile(rf"(?<![a-z])(?:tam|khoang|co|gia)\s*{_AMOUNT}")
+_GUESTS_RE = re.compile(
+    r"(\d+|" + "|".join(_NUMBER_WORDS) + r")\s*(?:nguoi lon|nguoi|khach|tre em|tre|be|pax)(?![a-z])"
+)
+_DATE = r"(\d{1,2})[/-](\d{1,2})(?:[/-](\d{2,4}))?"
+_DATE_RANGE_RE = re.compile(rf"{_DATE}\s*(?:den|toi|-|~)\s*(?:ngay\s*)?{_DATE}")
+_DATE_NIGHTS_RE = re.compile(rf"{_DATE}\D{{0,12}}?(\d+)\s*dem")
+
+
+def _parse_number(value: str) -> float:
+    # "800.000" / "1,200,000": dấu phân cách hàng nghìn; "1.5" / "1,5": phần thập phân
+    groups = re.split(r"[.,]", value)
+    if len(groups) > 1 and all(len(group) == 3 for group in groups[1:]):
+        return float("".join(groups))
+    return float(".".join(groups[:2]))
+
+
+def _amount(number: Optional[str], unit: Optional[str]) -> Optional[float]:
+    if number is None:
+        return None
+    value = _parse_number(number)
+    if unit:
+        return value * _UNITS[unit]
+    # Không có đơn vị: chỉ nhận số tiền viết đủ ("800000"), tránh nhầm với số người / số sao
+    return value if value >= 10_000 else None
+
+
+def _first_amount(match) -> Optional[float]:
+    groups = match.groups()
+    for position in range(0, len(groups), 2):
+        if groups[position] is not None:
+            return _amount(groups[position], groups[position + 1])
+    return None
+
+
+def _make_date(day: str, month: str, year: Optional[str], today: date) -> Optional[date]:
+    try:
+        if year:
+            year_value = int(year) + (2000 if len(year) == 2 else 0)
+            return date(year_value, int(month), int(day))
+        value = date(today.year, int(month), int(day))
+        # Không ghi năm mà ngày đã qua thì hiểu là năm sau
+        return value if value >= today else date(today.year + 1, int(month), int(day))
+    except ValueError:
+        return None
+
+
+class ChatQuery:
+    """Điều kiện tách được từ câu hỏi; None = không ràng buộc"""
+
+    def __init__(
+        self,
+        cities: Sequence[str] = (),
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        guests: Optional[int] = None,
+        check_in: Optional[date] = None,
+        check_out: Optional[date] = None,
+    ):
+        self.cities = list(cities)
+        self.min_price = min_price
+        self.max_price = max_price
+        self.guests = guests
+        self.check_in = check_in
+        self.check_out = check_out
+
+    @property
+    def has_filters(self) -> bool:
+        return self.where() is not None
+
+    def where(self) -> Optional[dict]:
+        """Filter metadata theo cú pháp `where` của Chroma"""
+        conditions = []
+        if self.cities:
+            conditions.append({"city": self.cities[0]} if len(self.cities) == 1 else {"city": {"$in": self.cities}})
+        if self.min_price is not None:
+            conditions.append({"base_price": {"$gte": float(self.min_price)}})
+        if self.max_price is not None:
+            conditions.append({"base_price": {"$lte": float(self.max_price)}})
+        if self.guests:
+            conditions.append({"max_guests": {"$gte": int(self.guests)}})
+
+        if not conditions:
+            return None
+        if len(conditions) == 1:
+            return conditions[0]
+        return {"$and": conditions}
+
+    def matches(self, metadata: dict) -> bool:
+        """Kiểm tra một document theo cùng điều kiện với where() (dùng cho benchmark / lọc lại)"""
+        if self.cities and metadata.get("city") not in self.cities:
+            return False
+        price = metadata.get("base_price")
+        if self.min_price is not None and (price is None or price < self.min_price):
+            return False
+        if self.max_price is not None and (price is None or price > self.max_price):
+            return False
+        if self.guests and (metadata.get("max_guests") or 0) < self.guests:
+            return False
+        return True
+
+    def describe(self) -> str:
+        parts = []
+        if self.cities:
+            parts.append(", ".join(self.cities))
+        if self.min_price is not None:
+            parts.append(f"từ {self.min_price:,.0f}đ")
+        if self.max_price is not None:
+            parts.append(f"đến {self.max_price:,.0f}đ")
+        if self.guests:
+            parts.append(f"{self.guests} người")
+        if self.check_in and self.check_out:
+            parts.append(f"{self.check_in:%d/%m} - {self.check_out:%d/%m}")
+        return " | ".join(parts)
+
+
+def _alias_group(folded_city: str) -> Tuple[str, ...]:
+    key = re.sub(r"^(?:thanh pho|tp\.?)\s*", "", folded_city).strip()
+    for group in CITY_ALIASES:
+        if key in group or folded_city in group:
+            return group
+    return (key,)
+
+
+def _contains_phrase(text: str, phrase: str) -> bool:
+    return re.search(rf"(?<![a-z0-9]){re.escape(phrase)}(?![a-z0-9])", text) is not None
+
+
+def match_cities(folded_message: str, known_cities: Sequence[str]) -> List[str]:
+    """Tên thành phố đúng như trong DB / metadata mà câu hỏi nhắc tới"""
+    return [
+        city
+        for city in known_cities
+        if any(_contains_phrase(folded_message, alias) for alias in _alias_group(fold_vietnamese(city)))
+    ]
+
+
+def parse_chat_query(message: str, known_cities: Sequence[str] = (), today: Optional[date] = None) -> ChatQuery:
+    text = fold_vietnamese(message)
+    today = today or date.today()
+    check_in = check_out = None
+
+    # Ngày tách trước để "20/12 - 22/12" không bị đọc thành khoảng giá
+    match = _DATE_RANGE_RE.search(text)
+    if match:
+        check_in = _make_date(*match.groups()[:3], today)
+        check_out = _make_date(*match.groups()[3:], check_in or today)
+        text = text[:match.start()] + " " + text[match.end():]
+    else:
+        match = _DATE_NIGHTS_RE.search(text)
+        if match:
+            check_in = _make_date(*match.groups()[:3], today)
+            if check_in:
+                check_out = check_in + timedelta(days=int(match.group(4)))
+            text = text[:match.start()] + " " + text[match.end():]
+    if not (check_in and check_out and check_out > check_in):
+        check_in = check_out = None
+
+    guests = 0
+    for match in _GUESTS_RE.finditer(text):
+        number = match.group(1)
+        guests += int(number) if number.isdigit() else _NUMBER_WORDS[number]
+    text = _GUESTS_RE.sub(" ", text)
+
+    min_price = max_price = None
+    match = _RANGE_RE.search(text)
+    if match:
+        low = _amount(match.group(1), match.group(2) or match.group(4))
+        high = _amount(match.group(3), match.group(4))
+        if low is not None and high is not None and low <= high:
+            min_price, max_price = low, high
+    if max_price is None:
+        match = _MAX_RE.search(text)
+        if match:
+            max_price = _first_amount(match)
+    if min_price is None:
+        match = _MIN_RE.search(text)
+        if match:
+            min_price = _first_amount(match)
+    if min_price is None and max_price is None:
+        match = _ABOUT_RE.search(text)
+        if match:
+            about = _first_amount(match)
+            if about is not None:
+                max_price = about * (1 + PRICE_TOLERANCE)
+
+    return ChatQuery(
+        cities=match_cities(text, known_cities),
+        min_price=min_price,
+        max_price=max_price,
+        guests=guests or None,
+        check_in=check_in,
+        check_out=check_out,
+    )
+
+
+def _load_cities() -> List[str]:
+    from app import db
+    from app.models.hotel import Hotel
+
+    rows = db.session.query(Hotel.city).filter(Hotel.status == "active").distinct().all()
+    return sorted(row[0] for row in rows if row[0])
+
+
+def known_cities() -> List[str]:
+    return CacheService.get_or_set("chatbot:cities", _load_cities, ttl=CITIES_CACHE_TTL, tags=(TAG_HOTELS,))
+
+
+def filter_available(docs, parsed: ChatQuery) -> list:
+    """Bỏ document của phòng đã ngừng cho thuê / kín lịch (index có thể chậm hơn DB), mỗi phòng giữ một lần"""
+    from app.services.availability_service import AvailabilityEngine
+
+    room_ids = []
+    for doc in docs:
+        room_id = doc.metadata.get("room_id")
+        if room_id is not None and room_id not in room_ids:
+            room_ids.append(room_id)
+    if not room_ids:
+        return []
+
+    # Không có ngày ở: kỳ 0 đêm, chỉ kiểm tra trạng thái phòng (1 query)
+    check_in = parsed.check_in or date.today()
+    check_out = parsed.check_out or check_in
+    availability = AvailabilityEngine.load(room_ids, check_in, check_out)
+
+    kept = []
+    seen = set()
+    for doc in docs:
+        room_id = doc.metadata.get("room_id")
+        if room_id in seen or not availability.is_available(room_id):
+            continue
+        seen.add(room_id)
+        kept.append(doc)
+    return kept
+
+
+def retrieve_rooms(
+    store,
+    query: str,
+    k: int = DEFAULT_K,
+    cities: Optional[Sequence[str]] = None,
+) -> Tuple[list, ChatQuery]:
+    """Tìm tương đồng trong tập phòng đã lọc theo điều kiện của câu hỏi"""
+    parsed = parse_chat_query(query, known_cities() if cities is None else cities)
+    where = parsed.where()
+    fetch_k = k * RETRIEVAL_OVERFETCH
+    if where:
+        docs = store.similarity_search(query, k=fetch_k, filter=where)
+    else:
+        docs = store.similarity_search(query, k=fetch_k)
+
+    try:
+        docs = filter_available(docs, parsed)
+    except Exception as exc:
+        current_app.logger.warning(f"Availability filter failed: {exc}")
+    return docs[:k], parsed
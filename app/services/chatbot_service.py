@@ -1,7 +1,10 @@
 from __future__ import annotations
 
 import os
-from typing import Dict, List, Optional
+import queue
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from flask import current_app
 
@@ -11,13 +14,17 @@ try:
     from langchain.agents import AgentExecutor, create_openai_functions_agent
     from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
     from langchain.schema.output_parser import StrOutputParser
-    from langchain.schema.runnable import RunnablePassthrough
 
     try:
         from langchain_core.messages import AIMessage, HumanMessage
     except Exception:
         from langchain.schema import AIMessage, HumanMessage
 
+    try:
+        from langchain_core.callbacks import BaseCallbackHandler
+    except Exception:
+        from langchain.callbacks.base import BaseCallbackHandler
+
     LANGCHAIN_AVAILABLE = True
 except Exception:
     LANGCHAIN_AVAILABLE = False
@@ -29,21 +36,88 @@ except Exception:
     ChatPromptTemplate = None
     MessagesPlaceholder = None
     StrOutputParser = None
-    RunnablePassthrough = None
     HumanMessage = None
     AIMessage = None
+    BaseCallbackHandler = object
 
 try:
     from openai import RateLimitError
 except Exception:
     RateLimitError = Exception
 
-from app.services.chatbot_cache import get_cached_answer, save_to_cache
+from app.services.chatbot_cache import get_cached_answer, save_to_cache, semantic_enabled
+
+RAG_TEMPLATE = """
+Bạn là trợ lý tìm phòng khách sạn.
+
+THÔNG TIN PHÒNG:
+{context}
+
+CÂU HỎI: {question}
+
+TRẢ LỜI:
+- Format đẹp với emoji (🏨 📍 💰 👥 ⭐)
+- Giới thiệu 3-5 phòng phù hợp
+- Ngắn gọn, dễ đọc
+- Kết thúc bằng câu hỏi gợi ý
+
+Trả lời:"""
+
+AGENT_SYSTEM_PROMPT = """Bạn là trợ lý đặt phòng khách sạn thông minh.
+
+CÔNG CỤ:
+1. search_hotels_and_rooms - Tìm phòng/khách sạn
+2. get_hotel_reviews - Xem đánh giá
+3. get_current_promotions - Xem khuyến mãi
+4. check_discount_code - Kiểm tra mã
+5. get_my_bookings_tool - Xem booking (nếu đã đăng nhập)
+
+NHIỆM VỤ:
+- Phân tích câu hỏi
+- Chọn công cụ phù hợp
+- Trả lời tự nhiên bằng tiếng Việt
+
+VÍ DỤ:
+"Tìm phòng Đà Lạt" → search_hotels_and_rooms
+"Review Sunrise" → get_hotel_reviews
+"Booking của tôi" → get_my_bookings_tool
+"Mã SUMMER500" → check_discount_code"""
+
+_http_client_lock = threading.Lock()
+_http_client = None
+_agent_pool_lock = threading.Lock()
+
+
+def get_http_client():
+    """httpx.Client dùng chung cho mọi client OpenAI trong worker (giữ kết nối keep-alive)"""
+    global _http_client
+    if _http_client is not None:
+        return _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            try:
+                import httpx
+            except ImportError:
+                return None
+            max_connections = current_app.config.get("CHATBOT_HTTP_MAX_CONNECTIONS", 20)
+            _http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections,
+                ),
+                timeout=httpx.Timeout(15.0, connect=5.0),
+            )
+    return _http_client
+
+
+def _format_docs(docs) -> str:
+    return "\n\n---\n\n".join([d.page_content for d in docs])
 
 
 class HotelRAGChatbot:
     _instance = None
     _vectorstore = None
+    _collection_name = None
 
     def __new__(cls):
         if cls._instance is None:
@@ -64,70 +138,63 @@ class HotelRAGChatbot:
             self.initialized = False
             return
 
-        self.embeddings = OpenAIEmbeddings(api_key=self.api_key, model="text-embedding-3-small")
+        http_client = get_http_client()
         self.llm = ChatOpenAI(
-            model="gpt-4o-mini",
+            model=current_app.config.get("OPENAI_MODEL") or "gpt-4o-mini",
             temperature=0.3,
             api_key=self.api_key,
             request_timeout=15,
+            streaming=True,
+            http_client=http_client,
         )
+        self.prompt = ChatPromptTemplate.from_template(RAG_TEMPLATE)
+        # Chain dựng một lần; context lấy theo từng câu hỏi bằng retrieve_rooms (lọc metadata trước)
+        self.chain = self.prompt | self.llm | StrOutputParser()
 
         self.initialized = True
         self._load_or_create_vectorstore()
 
     def _load_or_create_vectorstore(self):
-        persist_dir = "./chroma_db"
+        from app.services.embedding_provider import current_model_id, get_embeddings
+        from app.services.vector_indexer import VectorIndexer, read_active_collection
+
+        HotelRAGChatbot._collection_name = read_active_collection()
         try:
-            if os.path.exists(persist_dir):
-                HotelRAGChatbot._vectorstore = Chroma(
-                    persist_directory=persist_dir,
-                    embedding_function=self.embeddings,
-                )
+            store = VectorIndexer(get_embeddings(), model_id=current_model_id()).open_store()
+            if store is not None:
+                HotelRAGChatbot._vectorstore = store
                 current_app.logger.info("Vector DB loaded")
             else:
                 current_app.logger.info("Vector DB not found - using SQL fallback")
         except Exception as exc:
             current_app.logger.warning(f"Load vector DB failed: {exc}")
 
-    def get_answer(self, query: str) -> str:
-        if not self.initialized or not HotelRAGChatbot._vectorstore:
-            return self._sql_fallback(query)
-
-        try:
-            retriever = HotelRAGChatbot._vectorstore.as_retriever(
-                search_type="similarity",
-                search_kwargs={"k": 5},
-            )
-
-            template = """
-Bạn là trợ lý tìm phòng khách sạn.
-
-THÔNG TIN PHÒNG:
-{context}
-
-CÂU HỎI: {question}
-
-TRẢ LỜI:
-- Format đẹp với emoji (🏨 📍 💰 👥 ⭐)
-- Giới thiệu 3-5 phòng phù hợp
-- Ngắn gọn, dễ đọc
-- Kết thúc bằng câu hỏi gợi ý
+    def _reload_if_swapped(self):
+        """Worker khác vừa dựng lại index (ACTIVE đổi) thì mở collection mới"""
+        from app.services.vector_indexer import read_active_collection
 
-Trả lời:"""
+        if read_active_collection() != HotelRAGChatbot._collection_name:
+            self._load_or_create_vectorstore()
 
-            prompt = ChatPromptTemplate.from_template(template)
+    def get_answer(self, query: str) -> str:
+        from app.services.chatbot_retrieval import retrieve_rooms
 
-            def format_docs(docs):
-                return "\n\n---\n\n".join([d.page_content for d in docs])
+        if self.initialized:
+            try:
+                self._reload_if_swapped()
+            except Exception as exc:
+                current_app.logger.warning(f"Reload vector DB failed: {exc}")
 
-            chain = (
-                {"context": retriever | format_docs, "question": RunnablePassthrough()}
-                | prompt
-                | self.llm
-                | StrOutputParser()
-            )
+        if not self.initialized or not HotelRAGChatbot._vectorstore:
+            return self._sql_fallback(query)
 
-            answer = chain.invoke(query)
+        try:
+            docs, parsed = retrieve_rooms(HotelRAGChatbot._vectorstore, query)
+            if docs:
+                context = _format_docs(docs)
+            else:
+                context = f"Không có phòng còn trống phù hợp điều kiện: {parsed.describe() or query}"
+            answer = self.chain.invoke({"context": context, "question": query})
             return (answer or "").strip()
         except Exception as exc:
             current_app.logger.error(f"RAG error: {exc}")
@@ -135,38 +202,22 @@ Trả lời:"""
 
     def _sql_fallback(self, query: str) -> str:
         from app.models.hotel import Hotel
+        from app.services.chatbot_retrieval import known_cities, parse_chat_query
+
+        cities = parse_chat_query(query, known_cities()).cities
 
-        msg = (query or "").lower()
-
-        cities = {
-            "đà lạt": "Đà Lạt",
-            "đà nẵng": "Đà Nẵng",
-            "nha trang": "Nha Trang",
-            "hà nội": "Hà Nội",
-            "hồ chí minh": "TP.HCM",
-            "vũng tàu": "Vũng Tàu",
-            "phú quốc": "Phú Quốc",
-            "huế": "Huế",
-        }
-
-        found_city = None
-        for key, value in cities.items():
-            if key in msg:
-                found_city = value
-                break
-
-        if found_city:
+        if cities:
             hotels = (
                 Hotel.query.filter(
                     Hotel.status == "active",
-                    Hotel.city.ilike(f"%{found_city}%"),
+                    Hotel.city.in_(cities),
                 )
                 .limit(3)
                 .all()
             )
 
             if hotels:
-                result = f"🏨 **Khách sạn tại {found_city}:**\n\n"
+                result = f"🏨 **Khách sạn tại {', '.join(cities)}:**\n\n"
                 for h in hotels:
                     result += f"• **{h.hotel_name}** ({h.star_rating}⭐)\n"
                     result += f"  📍 {h.address}\n\n"
@@ -175,217 +226,175 @@ Trả lời:"""
 
         return "Bạn muốn tìm phòng ở đâu? (VD: Đà Lạt, Nha Trang, Đà Nẵng...)"
 
-    def rebuild_vectorstore(self):
-        from sqlalchemy import func
+    def rebuild_vectorstore(self, full: bool = False, hotel_ids=None) -> dict:
+        """Đồng bộ vector DB: mặc định chỉ embed phòng thay đổi; full=True dựng index mới rồi chuyển sang.
 
-        from app import db
-        from app.models.amenity import Amenity
-        from app.models.hotel import Hotel
-        from app.models.hotel_amenity import hotel_amenities
-        from app.models.review import Review
-        from app.models.room import Room
-        from app.models.room_amenity import room_amenities
-        from app.models.room_type import RoomType
-
-        import shutil
-
-        if os.path.exists("./chroma_db"):
-            shutil.rmtree("./chroma_db")
-
-        current_app.logger.info("Rebuilding vector DB...")
-
-        results = (
-            db.session.query(Hotel, Room, RoomType)
-            .join(Room, Hotel.hotel_id == Room.hotel_id)
-            .join(RoomType, Room.room_type_id == RoomType.type_id)
-            .filter(
-                Hotel.status == "active",
-                Room.status == "available",
-            )
-            .all()
-        )
+        Không cần LLM: với EMBEDDING_PROVIDER=local chạy được offline, không cần OPENAI_API_KEY.
+        """
+        from app.services.embedding_provider import current_model_id, get_embeddings
+        from app.services.vector_indexer import VectorIndexer
 
-        if not results:
-            raise RuntimeError("No hotel data")
+        if not LANGCHAIN_AVAILABLE:
+            raise RuntimeError("Chatbot chưa được cấu hình (LangChain)")
 
-        documents = []
-        metadatas = []
-        ids = []
+        indexer = VectorIndexer(get_embeddings(), model_id=current_model_id())
+        if full:
+            stats = indexer.rebuild()
+        else:
+            stats = indexer.sync(hotel_ids)
 
-        for hotel, room, room_type in results:
-            hotel_amen = (
-                db.session.query(Amenity)
-                .join(hotel_amenities)
-                .filter(hotel_amenities.c.hotel_id == hotel.hotel_id)
-                .all()
-            )
+        HotelRAGChatbot._vectorstore = indexer.open_store()
+        HotelRAGChatbot._collection_name = indexer.active_collection_name()
 
-            room_amen = (
-                db.session.query(Amenity)
-                .join(room_amenities)
-                .filter(room_amenities.c.room_id == room.room_id)
-                .all()
-            )
+        current_app.logger.info(f"Vector DB synced: {stats}")
+        return stats
 
-            avg_rating = (
-                db.session.query(func.avg(Review.rating))
-                .filter(Review.hotel_id == hotel.hotel_id)
-                .scalar()
-                or 0
-            )
 
-            base_price = float(room.base_price or 0)
-            weekend_price = float(room.weekend_price) if room.weekend_price is not None else base_price
-            area_text = f"{float(room.area):g}" if room.area is not None else "N/A"
-
-            doc = f"""
-🏨 {hotel.hotel_name}
-⭐ {hotel.star_rating} sao | 📊 {avg_rating:.1f}/5
-📍 {hotel.city}, {hotel.address}
-
-🛏️ {room_type.type_name} - {room.room_name}
-💰 Giá: {base_price:,.0f}đ (thường) / {weekend_price:,.0f}đ (cuối tuần)
-👥 Tối đa {room.max_guests} người
-📏 {area_text}m²
-
-✨ Tiện nghi khách sạn: {", ".join([a.amenity_name for a in hotel_amen]) or "Không có"}
-✨ Tiện nghi phòng: {", ".join([a.amenity_name for a in room_amen]) or "Không có"}
-            """.strip()
-
-            documents.append(doc)
-            metadatas.append(
-                {
-                    "hotel_id": hotel.hotel_id,
-                    "hotel_name": hotel.hotel_name,
-                    "city": hotel.city,
-                    "room_id": room.room_id,
-                    "room_name": room.room_name,
-                    "base_price": float(room.base_price),
-                    "max_guests": room.max_guests,
-                }
-            )
-            ids.append(f"h{hotel.hotel_id}_r{room.room_id}")
-
-        HotelRAGChatbot._vectorstore = Chroma.from_texts(
-            texts=documents,
-            embedding=self.embeddings,
-            metadatas=metadatas,
-            ids=ids,
-            persist_directory="./chroma_db",
-        )
+def _query_embedding(message: str) -> Optional[List[float]]:
+    """Embedding câu hỏi cho cache khớp gần giống (chỉ khi bật CHATBOT_CACHE_SEMANTIC)"""
+    if not semantic_enabled() or not LANGCHAIN_AVAILABLE:
+        return None
+    try:
+        from app.services.embedding_provider import get_embeddings
 
-        current_app.logger.info(f"Vector DB created: {len(documents)} rooms")
+        return get_embeddings().embed_query(message)
+    except Exception as exc:
+        current_app.logger.warning(f"Embedding for cache failed: {exc}")
+        return None
 
 
-def get_chatbot_answer(
-    message: str,
-    history: Optional[List[Dict[str, str]]] = None,
-    user_id: Optional[int] = None,
-) -> str:
-    cached = get_cached_answer(message)
-    if cached:
-        current_app.logger.info("Cache hit")
-        return cached
+class ChatbotAgentPool:
+    """Agent và AgentExecutor dựng một lần mỗi worker: bản cho khách (không có tool booking) và bản cho user đã đăng nhập.
 
-    try:
-        if not LANGCHAIN_AVAILABLE:
-            return _direct_tool_call(message, user_id)
-
-        api_key = current_app.config.get("OPENAI_API_KEY") or os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            return "⚠️ Hệ thống chưa cấu hình OpenAI API"
+    User của lượt chat truyền qua chat_user_context nên không cần tạo tool/agent mới cho từng request.
+    """
 
+    def __init__(self, llm):
         from app.services.chatbot_tools import (
             check_discount_code,
             get_current_promotions,
             get_hotel_reviews,
-            get_my_bookings,
+            get_my_bookings_tool,
             search_hotels_and_rooms,
-            tool,
         )
 
-        llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0,
-            api_key=api_key,
-            request_timeout=15,
+        self.llm = llm
+        self.prompt = ChatPromptTemplate.from_messages(
+            [
+                ("system", AGENT_SYSTEM_PROMPT),
+                MessagesPlaceholder("chat_history", optional=True),
+                ("human", "{input}"),
+                MessagesPlaceholder("agent_scratchpad"),
+            ]
         )
 
-        tools = [
+        public_tools = [
             search_hotels_and_rooms,
             get_hotel_reviews,
             get_current_promotions,
             check_discount_code,
         ]
+        self.guest_executor = self._build_executor(public_tools)
+        self.member_executor = self._build_executor(public_tools + [get_my_bookings_tool])
 
-        if user_id:
-            @tool
-            def get_my_bookings_tool(_: str = "") -> str:
-                """
-                Lấy danh sách booking của user hiện tại.
-
-                Returns:
-                    Danh sách booking của user.
-                """
-                return get_my_bookings.invoke({"user_id": user_id})
-
-            tools.append(get_my_bookings_tool)
-
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "system",
-                    """Bạn là trợ lý đặt phòng khách sạn thông minh.
-
-CÔNG CỤ:
-1. search_hotels_and_rooms - Tìm phòng/khách sạn
-2. get_hotel_reviews - Xem đánh giá
-3. get_current_promotions - Xem khuyến mãi
-4. check_discount_code - Kiểm tra mã
-5. get_my_bookings_tool - Xem booking (nếu đã đăng nhập)
-
-NHIỆM VỤ:
-- Phân tích câu hỏi
-- Chọn công cụ phù hợp
-- Trả lời tự nhiên bằng tiếng Việt
-
-VÍ DỤ:
-"Tìm phòng Đà Lạt" → search_hotels_and_rooms
-"Review Sunrise" → get_hotel_reviews
-"Booking của tôi" → get_my_bookings_tool
-"Mã SUMMER500" → check_discount_code""",
-                ),
-                MessagesPlaceholder("chat_history", optional=True),
-                ("human", "{input}"),
-                MessagesPlaceholder("agent_scratchpad"),
-            ]
-        )
-
-        agent = create_openai_functions_agent(llm=llm, tools=tools, prompt=prompt)
-        agent_executor = AgentExecutor(
+    def _build_executor(self, tools):
+        agent = create_openai_functions_agent(llm=self.llm, tools=tools, prompt=self.prompt)
+        return AgentExecutor(
             agent=agent,
             tools=tools,
-            verbose=True,
+            verbose=False,
             max_iterations=3,
             max_execution_time=15,
             handle_parsing_errors=True,
         )
 
-        chat_history = []
-        if history:
-            for item in history[-5:]:
-                role = item.get("role")
-                content = item.get("content", "")
-                if role == "user":
-                    chat_history.append(HumanMessage(content=content))
-                elif role == "assistant":
-                    chat_history.append(AIMessage(content=content))
+    @staticmethod
+    def chat_history(history: Optional[List[Dict[str, str]]]) -> list:
+        messages = []
+        for item in (history or [])[-5:]:
+            role = item.get("role")
+            content = item.get("content", "")
+            if role == "user":
+                messages.append(HumanMessage(content=content))
+            elif role == "assistant":
+                messages.append(AIMessage(content=content))
+        return messages
+
+    def run(
+        self,
+        message: str,
+        history: Optional[List[Dict[str, str]]] = None,
+        user_id: Optional[int] = None,
+        callbacks: Optional[list] = None,
+    ) -> Tuple[str, bool]:
+        """Trả về (câu trả lời, có dùng dữ liệu riêng của user hay không)"""
+        from app.services.chatbot_tools import chat_user_context
+
+        executor = self.member_executor if user_id else self.guest_executor
+        config = {"callbacks": callbacks} if callbacks else None
+        with chat_user_context(user_id) as state:
+            response = executor.invoke(
+                {"input": message, "chat_history": self.chat_history(history)},
+                config=config,
+            )
+        return (response or {}).get("output", "") or "", state["personal"]
 
-        response = agent_executor.invoke({"input": message, "chat_history": chat_history})
-        answer = (response or {}).get("output", "") or ""
+    @staticmethod
+    def get() -> Optional["ChatbotAgentPool"]:
+        """Pool của app hiện tại, None nếu chưa cấu hình OpenAI API"""
+        pool = current_app.extensions.get("chatbot_agents")
+        if pool is not None:
+            return pool
+
+        api_key = current_app.config.get("OPENAI_API_KEY") or os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            return None
+
+        with _agent_pool_lock:
+            pool = current_app.extensions.get("chatbot_agents")
+            if pool is None:
+                llm = ChatOpenAI(
+                    model=current_app.config.get("OPENAI_MODEL") or "gpt-4o-mini",
+                    temperature=0,
+                    api_key=api_key,
+                    request_timeout=15,
+                    streaming=True,
+                    http_client=get_http_client(),
+                )
+                pool = ChatbotAgentPool(llm)
+                current_app.extensions["chatbot_agents"] = pool
+        return pool
+
+
+def get_chatbot_answer(
+    message: str,
+    history: Optional[List[Dict[str, str]]] = None,
+    user_id: Optional[int] = None,
+) -> str:
+    embedding = _query_embedding(message)
+    cached = get_cached_answer(message, user_id=user_id, embedding=embedding)
+    if cached:
+        current_app.logger.info("Cache hit")
+        return cached
+
+    try:
+        if not LANGCHAIN_AVAILABLE:
+            return _direct_tool_call(message, user_id)
+
+        pool = ChatbotAgentPool.get()
+        if pool is None:
+            return "⚠️ Hệ thống chưa cấu hình OpenAI API"
+
+        answer, personal = pool.run(message, history, user_id)
 
         if answer:
-            save_to_cache(message, answer)
+            save_to_cache(
+                message,
+                answer,
+                user_id=user_id,
+                personal=personal,
+                embedding=embedding,
+            )
             return answer
 
         return _direct_tool_call(message, user_id)
@@ -396,6 +405,123 @@ VÍ DỤ:
         return _direct_tool_call(message, user_id)
 
 
+# Nhãn hiển thị trên widget khi agent đang gọi tool
+TOOL_PROGRESS_LABELS = {
+    "search_hotels_and_rooms": "Đang tìm phòng phù hợp...",
+    "get_hotel_reviews": "Đang xem đánh giá...",
+    "get_current_promotions": "Đang kiểm tra khuyến mãi...",
+    "check_discount_code": "Đang kiểm tra mã giảm giá...",
+    "get_my_bookings_tool": "Đang lấy booking của bạn...",
+}
+
+# Tổng thời gian tối đa của một lượt chat stream (agent tự dừng sau max_execution_time=15s)
+STREAM_TIMEOUT = 45
+
+_STREAM_END = object()
+
+
+class ChatStreamHandler(BaseCallbackHandler):
+    """Đẩy token của LLM và tiến trình gọi tool vào hàng đợi để route SSE gửi dần cho client.
+
+    Callback của agent được truyền xuống cả chain RAG trong tool search_hotels_and_rooms, nên token của
+    HotelRAGChatbot.get_answer cũng được stream. Mỗi lần sang một lượt LLM mới phát 'reset' để client
+    bắt đầu lại nội dung đang hiển thị.
+    """
+
+    def __init__(self, events: "queue.Queue"):
+        super().__init__()
+        self.events = events
+        self._llm_run_id = None
+
+    def on_llm_new_token(self, token: str, *, run_id=None, **kwargs):
+        if not token:
+            return
+        if run_id != self._llm_run_id:
+            if self._llm_run_id is not None:
+                self.events.put(("reset", {}))
+            self._llm_run_id = run_id
+        self.events.put(("token", {"text": token}))
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name")
+        self.events.put((
+            "tool",
+            {"name": name, "status": "start", "label": TOOL_PROGRESS_LABELS.get(name, "Đang xử lý...")},
+        ))
+
+    def on_tool_end(self, output, **kwargs):
+        self.events.put(("tool", {"name": kwargs.get("name"), "status": "end"}))
+
+
+def stream_chatbot_answer(
+    message: str,
+    history: Optional[List[Dict[str, str]]] = None,
+    user_id: Optional[int] = None,
+) -> Iterator[Tuple[str, dict]]:
+    """Như get_chatbot_answer nhưng trả về dần các sự kiện (event, data):
+
+    status / tool - tiến trình, token - đoạn text mới, reset - xóa text đang hiển thị,
+    done - câu trả lời hoàn chỉnh (client nên hiển thị bản này), error.
+    """
+    embedding = _query_embedding(message)
+    cached = get_cached_answer(message, user_id=user_id, embedding=embedding)
+    if cached:
+        yield "token", {"text": cached}
+        yield "done", {"answer": cached, "cached": True}
+        return
+
+    pool = ChatbotAgentPool.get() if LANGCHAIN_AVAILABLE else None
+    if pool is None:
+        if LANGCHAIN_AVAILABLE:
+            answer = "⚠️ Hệ thống chưa cấu hình OpenAI API"
+        else:
+            answer = _direct_tool_call(message, user_id)
+        yield "token", {"text": answer}
+        yield "done", {"answer": answer, "cached": False}
+        return
+
+    # Agent chạy ở thread riêng, generator chỉ đọc hàng đợi nên byte đầu tiên tới client ngay khi có token
+    events: "queue.Queue" = queue.Queue()
+    app = current_app._get_current_object()
+
+    def run_agent():
+        with app.app_context():
+            try:
+                answer, personal = pool.run(message, history, user_id, callbacks=[ChatStreamHandler(events)])
+                if answer:
+                    save_to_cache(message, answer, user_id=user_id, personal=personal, embedding=embedding)
+                else:
+                    answer = _direct_tool_call(message, user_id)
+                events.put(("done", {"answer": answer, "cached": False}))
+            except RateLimitError:
+                events.put(("done", {"answer": "⏱️ Hệ thống đang bận. Vui lòng chờ 10s và thử lại.", "cached": False}))
+            except Exception as exc:
+                app.logger.error(f"Chatbot stream error: {exc}", exc_info=True)
+                try:
+                    events.put(("done", {"answer": _direct_tool_call(message, user_id), "cached": False}))
+                except Exception:
+                    events.put(("error", {"message": "Có lỗi xảy ra"}))
+            finally:
+                events.put(_STREAM_END)
+
+    threading.Thread(target=run_agent, name="chatbot-stream", daemon=True).start()
+    yield "status", {"message": "Đang xử lý..."}
+
+    deadline = time.monotonic() + STREAM_TIMEOUT
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            yield "error", {"message": "Trợ lý phản hồi quá lâu, vui lòng thử lại."}
+            return
+        try:
+            item = events.get(timeout=remaining)
+        except queue.Empty:
+            continue
+        if item is _STREAM_END:
+            return
+        yield item
+
+
 def _direct_tool_call(message: str, user_id: Optional[int] = None) -> str:
     from app.services.chatbot_tools import (
         check_discount_code,
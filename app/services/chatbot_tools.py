@@ -15,10 +15,27 @@ except ImportError:
                 return args[0]
             return decorator
 
+from contextlib import contextmanager
+from contextvars import ContextVar
 from flask import current_app
 from typing import Optional
 from datetime import datetime
 
+# User của lượt chat hiện tại. Agent được dựng một lần cho mọi request nên tool
+# đọc user từ context thay vì tạo closure mới cho từng user.
+_chat_context: ContextVar[Optional[dict]] = ContextVar("chatbot_chat_context", default=None)
+
+
+@contextmanager
+def chat_user_context(user_id: Optional[int]):
+    """Gắn user cho lượt chat; state['personal'] = True nếu câu trả lời có dùng dữ liệu riêng của user"""
+    state = {"user_id": user_id, "personal": False}
+    token = _chat_context.set(state)
+    try:
+        yield state
+    finally:
+        _chat_context.reset(token)
+
 
 @tool(description="Tìm kiếm khách sạn và phòng theo yêu cầu của user")
 def search_hotels_and_rooms(query: str) -> str:
@@ -106,6 +123,21 @@ def get_my_bookings(user_id: int) -> str:
         return f"Lỗi: {str(e)}"
 
 
+@tool(description="Lấy danh sách booking của user đang đăng nhập")
+def get_my_bookings_tool(_: str = "") -> str:
+    """
+    Lấy danh sách booking của user hiện tại (user lấy từ context của lượt chat).
+
+    Returns:
+        Danh sách booking của user.
+    """
+    state = _chat_context.get()
+    if not state or not state.get("user_id"):
+        return "❌ Bạn cần đăng nhập để xem booking."
+    state["personal"] = True
+    return get_my_bookings.invoke({"user_id": state["user_id"]})
+
+
 @tool(description="Xem đánh giá và review của một khách sạn")
 def get_hotel_reviews(hotel_name: str) -> str:
     """
@@ -1,7 +1,9 @@
 from flask_mail import Message
 from app import mail
+from app.services.job_queue import JobQueue
 from flask import current_app, url_for, request
-import threading
+
+SEND_EMAIL_TASK = 'send_email'
 
 class EmailService:
     
@@ -18,17 +20,20 @@ class EmailService:
         
         return 'http://localhost:5000'
     
+    @staticmethod
+    def _build_message(to, subject, body, html=None):
+        return Message(
+            subject=subject,
+            recipients=[to],
+            body=body,
+            html=html,
+            sender=current_app.config['MAIL_DEFAULT_SENDER']
+        )
+    
     @staticmethod
     def send_email(to, subject, body, html=None):
         try:
-            msg = Message(
-                subject=subject,
-                recipients=[to],
-                body=body,
-                html=html,
-                sender=current_app.config['MAIL_DEFAULT_SENDER']
-            )
-            mail.send(msg)
+            mail.send(EmailService._build_message(to, subject, body, html))
             return True
         except Exception as e:
             print(f"Error sending email: {str(e)}")
@@ -36,26 +41,43 @@ class EmailService:
     
     @staticmethod
     def send_email_async(to, subject, body, html=None):
-        app = current_app._get_current_object()
-        
-        def send():
-            with app.app_context():
+        """Thêm job gửi email vào transaction hiện tại, không commit.
+
+        Caller commit (job đi cùng dữ liệu của caller) rồi gọi JobQueue.notify(); worker gửi theo lô và thử lại khi lỗi.
+        """
+        try:
+            JobQueue.enqueue(SEND_EMAIL_TASK, {
+                'to': to,
+                'subject': subject,
+                'body': body,
+                'html': html
+            }, commit=False)
+            return True
+        except Exception as e:
+            print(f"Error queueing email: {str(e)}")
+            return False
+    
+    @staticmethod
+    @JobQueue.task(SEND_EMAIL_TASK, batch=True, queue='email')
+    def deliver_batch(payloads):
+        """Gửi cả lô qua một kết nối SMTP; trả về lỗi của từng email (None = đã gửi).
+
+        Không mở được kết nối thì raise, cả lô được thử lại sau.
+        """
+        errors = []
+        with mail.connect() as connection:
+            for payload in payloads:
                 try:
-                    msg = Message(
-                        subject=subject,
-                        recipients=[to],
-                        body=body,
-                        html=html,
-                        sender=app.config['MAIL_DEFAULT_SENDER']
-                    )
-                    mail.send(msg)
+                    connection.send(EmailService._build_message(
+                        payload['to'],
+                        payload['subject'],
+                        payload['body'],
+                        payload.get('html')
+                    ))
+                    errors.append(None)
                 except Exception as e:
-                    print(f"Error sending email async: {str(e)}")
-        
-        thread = threading.Thread(target=send)
-        thread.daemon = True
-        thread.start()
-        return True
+                    errors.append(f'{type(e).__name__}: {e}')
+        return errors
     
     @staticmethod
     def send_verification_email(user, token, async_send=True):
@@ -0,0 +1,212 @@
+"""
+EMBEDDING PROVIDER - Chọn backend embedding cho vector DB / cache của chatbot
+
+- EMBEDDING_PROVIDER=openai: OpenAI text-embedding-3-small (mặc định, cần OPENAI_API_KEY)
+- EMBEDDING_PROVIDER=local: sentence-transformers chạy CPU (backend torch hoặc onnx), không gọi mạng
+- Vector tài liệu lưu trên đĩa (SQLite) theo (model, hash nội dung): dựng lại index không embed lại;
+  vector câu hỏi chỉ giữ trong LRU bộ nhớ có giới hạn (EMBEDDING_QUERY_CACHE_SIZE), không ghi đĩa
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from flask import current_app
+
+DEFAULT_OPENAI_MODEL = "text-embedding-3-small"
+# Model đa ngôn ngữ nhỏ (384 chiều), đọc được tiếng Việt
+DEFAULT_LOCAL_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+DEFAULT_CACHE_DIR = "./embedding_cache"
+CACHE_FILE = "embeddings.sqlite3"
+# Giới hạn số tham số trong một câu IN của SQLite
+CACHE_LOOKUP_CHUNK = 500
+DEFAULT_QUERY_CACHE_SIZE = 1000
+
+_embeddings_lock = threading.Lock()
+
+
+def embedding_model_id(provider: str, model: str) -> str:
+    return f"{provider}:{model}"
+
+
+class LocalEmbeddings:
+    """Embedding trên CPU bằng sentence-transformers; vector đã chuẩn hóa (cosine = tích vô hướng)"""
+
+    def __init__(self, model_name: str = DEFAULT_LOCAL_MODEL, backend: str = "torch", batch_size: int = 32):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as exc:
+            raise RuntimeError("EMBEDDING_PROVIDER=local cần cài sentence-transformers") from exc
+
+        options = {"device": "cpu"}
+        if backend and backend != "torch":
+            # ONNX Runtime: nhanh hơn torch trên CPU, cần sentence-transformers[onnx]
+            options["backend"] = backend
+        self.model = SentenceTransformer(model_name, **options)
+        self.model_id = embedding_model_id("local", model_name)
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts: Sequence[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        vectors = self.model.encode(
+            list(texts),
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return vectors.astype(np.float32).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class CachedEmbeddings:
+    """Bọc một backend embedding, lưu vector tài liệu vào SQLite theo (model_id, sha256 nội dung).
+
+    Dùng chung được giữa các worker (WAL); đổi model thì khóa khác nên không lẫn vector.
+    Câu hỏi của người dùng không lặp lại mãi nên chỉ cache trong LRU tối đa query_cache_size vector.
+    """
+
+    def __init__(self, inner, model_id: str, cache_dir: str = DEFAULT_CACHE_DIR,
+                 query_cache_size: int = DEFAULT_QUERY_CACHE_SIZE):
+        self.inner = inner
+        self.model_id = model_id
+        self.hits = 0
+        self.misses = 0
+        self.query_cache_size = query_cache_size
+        self._queries = OrderedDict()
+        self._query_lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(cache_dir, CACHE_FILE), check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, content_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, content_hash))"
+            )
+
+    @staticmethod
+    def _hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _lookup(self, hashes: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            for start in range(0, len(unique), CACHE_LOOKUP_CHUNK):
+                chunk = unique[start:start + CACHE_LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT content_hash, vector FROM embeddings WHERE model = ? AND content_hash IN ({placeholders})",
+                    [self.model_id, *chunk],
+                ).fetchall()
+                for content_hash, blob in rows:
+                    found[content_hash] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def _store(self, items: Dict[str, List[float]]):
+        rows = [
+            (self.model_id, content_hash, np.asarray(vector, dtype=np.float32).tobytes())
+            for content_hash, vector in items.items()
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+
+    def embed_documents(self, texts: Sequence[str]) -> List[List[float]]:
+        texts = list(texts)
+        hashes = [self._hash(text) for text in texts]
+        found = self._lookup(hashes)
+
+        missing = {}
+        for content_hash, text in zip(hashes, texts):
+            if content_hash not in found:
+                missing.setdefault(content_hash, text)
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            vectors = self.inner.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            try:
+                self._store(computed)
+            except sqlite3.Error as exc:
+                current_app.logger.warning(f"Embedding cache write failed: {exc}")
+            found.update(computed)
+        return [found[content_hash] for content_hash in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.query_cache_size <= 0:
+            return self.inner.embed_query(text)
+
+        content_hash = self._hash(text)
+        with self._query_lock:
+            vector = self._queries.get(content_hash)
+            if vector is not None:
+                self._queries.move_to_end(content_hash)
+                self.hits += 1
+                return vector
+
+        vector = self.inner.embed_query(text)
+        with self._query_lock:
+            self.misses += 1
+            self._queries[content_hash] = vector
+            self._queries.move_to_end(content_hash)
+            while len(self._queries) > self.query_cache_size:
+                self._queries.popitem(last=False)
+        return vector
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "cached_queries": len(self._queries)}
+
+
+def _create_embeddings():
+    config = current_app.config
+    provider = (config.get("EMBEDDING_PROVIDER") or "openai").lower()
+
+    if provider == "local":
+        model = config.get("EMBEDDING_MODEL") or DEFAULT_LOCAL_MODEL
+        inner = LocalEmbeddings(model, backend=config.get("EMBEDDING_LOCAL_BACKEND", "torch"))
+    elif provider == "openai":
+        from app.services.chatbot_service import OpenAIEmbeddings, get_http_client
+
+        api_key = config.get("OPENAI_API_KEY") or os.getenv("OPENAI_API_KEY")
+        if OpenAIEmbeddings is None or not api_key:
+            raise RuntimeError("EMBEDDING_PROVIDER=openai cần LangChain và OPENAI_API_KEY")
+        model = config.get("EMBEDDING_MODEL") or DEFAULT_OPENAI_MODEL
+        inner = OpenAIEmbeddings(api_key=api_key, model=model, http_client=get_http_client())
+    else:
+        raise ValueError(f"EMBEDDING_PROVIDER không hợp lệ: {provider}")
+
+    model_id = embedding_model_id(provider, model)
+    cache_dir = config.get("EMBEDDING_CACHE_DIR", DEFAULT_CACHE_DIR)
+    if not cache_dir:
+        return inner, model_id
+    query_cache_size = config.get("EMBEDDING_QUERY_CACHE_SIZE", DEFAULT_QUERY_CACHE_SIZE)
+    return CachedEmbeddings(inner, model_id, cache_dir, query_cache_size=query_cache_size), model_id
+
+
+def get_embeddings():
+    """Backend embedding dùng chung trong worker (model local chỉ nạp một lần)"""
+    embeddings = current_app.extensions.get("chatbot_embeddings")
+    if embeddings is not None:
+        return embeddings
+    with _embeddings_lock:
+        embeddings = current_app.extensions.get("chatbot_embeddings")
+        if embeddings is None:
+            embeddings, model_id = _create_embeddings()
+            current_app.extensions["chatbot_embeddings"] = embeddings
+            current_app.extensions["chatbot_embedding_model"] = model_id
+    return embeddings
+
+
+def current_model_id() -> Optional[str]:
+    get_embeddings()
+    return current_app.extensions.get("chatbot_embedding_model")
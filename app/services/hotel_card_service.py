@@ -0,0 +1,172 @@
+from app import db
+from app.models.hotel import Hotel
+from app.models.room import Room
+from app.models.review import Review
+from app.models.cancellation_policy import CancellationPolicy
+from app.models.promotion import Promotion
+from app.models.hotel_search_summary import HotelSearchSummary
+from datetime import datetime
+from sqlalchemy import func, exists, and_
+
+DEFAULT_MIN_PRICE = 1000000
+
+
+class HotelCardService:
+
+    @staticmethod
+    def aggregate_stats(hotel_ids, now=None, session=None):
+        """Tính trực tiếp giá min/max, số review, rating trung bình, hủy miễn phí, khuyến mãi trong 1 query"""
+        hotel_ids = list({hid for hid in hotel_ids if hid is not None})
+        if not hotel_ids:
+            return {}
+
+        now = now or datetime.utcnow()
+        session = session or db.session
+
+        price_sub = session.query(
+            Room.hotel_id.label('hotel_id'),
+            func.min(Room.base_price).label('min_price'),
+            func.max(Room.base_price).label('max_price')
+        ).filter(
+            Room.hotel_id.in_(hotel_ids),
+            Room.status == 'available'
+        ).group_by(Room.hotel_id).subquery()
+
+        review_sub = session.query(
+            Review.hotel_id.label('hotel_id'),
+            func.count(Review.review_id).label('review_count'),
+            func.avg(Review.rating).label('avg_rating')
+        ).filter(
+            Review.hotel_id.in_(hotel_ids),
+            Review.status == 'active'
+        ).group_by(Review.hotel_id).subquery()
+
+        free_cancel = exists().where(and_(
+            CancellationPolicy.hotel_id == Hotel.hotel_id,
+            CancellationPolicy.refund_percentage == 100.00
+        ))
+
+        active_promotion = exists().where(and_(
+            Promotion.hotel_id == Hotel.hotel_id,
+            Promotion.is_active == True,
+            Promotion.start_date <= now,
+            Promotion.end_date >= now
+        ))
+
+        rows = session.query(
+            Hotel.hotel_id,
+            price_sub.c.min_price,
+            price_sub.c.max_price,
+            review_sub.c.review_count,
+            review_sub.c.avg_rating,
+            free_cancel.label('has_free_cancellation'),
+            active_promotion.label('has_active_promotion')
+        ).outerjoin(price_sub, price_sub.c.hotel_id == Hotel.hotel_id)\
+        .outerjoin(review_sub, review_sub.c.hotel_id == Hotel.hotel_id)\
+        .filter(Hotel.hotel_id.in_(hotel_ids))\
+        .all()
+
+        stats = {}
+        for hotel_id, min_price, max_price, review_count, avg_rating, has_free_cancellation, has_active_promotion in rows:
+            # Chuyển đổi avg_rating sang float an toàn
+            try:
+                avg_rating_float = float(avg_rating) if avg_rating is not None else 0.0
+            except (TypeError, ValueError):
+                avg_rating_float = 0.0
+
+            stats[hotel_id] = {
+                'min_price': min_price,
+                'max_price': max_price,
+                'review_count': int(review_count or 0),
+                'avg_rating': avg_rating_float,
+                'has_free_cancellation': bool(has_free_cancellation),
+                'has_active_promotion': bool(has_active_promotion)
+            }
+        return stats
+
+    @staticmethod
+    def format_stats(min_price, review_count, avg_rating, has_free_cancellation, has_active_promotion):
+        avg_rating_float = float(avg_rating) if avg_rating else 0.0
+        return {
+            'min_price': int(min_price) if min_price else DEFAULT_MIN_PRICE,
+            'review_count': int(review_count or 0),
+            'avg_rating': round(avg_rating_float, 1) if avg_rating_float > 0 else 0.0,
+            'has_free_cancellation': bool(has_free_cancellation),
+            'has_active_promotion': bool(has_active_promotion)
+        }
+
+    @staticmethod
+    def stats_from_summary(summary):
+        return HotelCardService.format_stats(
+            summary.min_price,
+            summary.review_count,
+            summary.avg_rating,
+            summary.has_free_cancellation,
+            summary.has_active_promotion
+        )
+
+    @staticmethod
+    def get_card_stats(hotel_ids, now=None):
+        """Lấy thống kê card từ bảng hotel_search_summary, khách sạn chưa có summary (hoặc đã hết hạn) thì tính trực tiếp"""
+        hotel_ids = list({hid for hid in hotel_ids if hid is not None})
+        if not hotel_ids:
+            return {}
+
+        now = now or datetime.utcnow()
+
+        stats = {}
+        summaries = HotelSearchSummary.query.filter(HotelSearchSummary.hotel_id.in_(hotel_ids)).all()
+        for summary in summaries:
+            if summary.expires_at is not None and summary.expires_at <= now:
+                continue
+            stats[summary.hotel_id] = HotelCardService.stats_from_summary(summary)
+
+        missing_ids = [hid for hid in hotel_ids if hid not in stats]
+        if missing_ids:
+            for hotel_id, raw in HotelCardService.aggregate_stats(missing_ids, now).items():
+                stats[hotel_id] = HotelCardService.format_stats(
+                    raw['min_price'],
+                    raw['review_count'],
+                    raw['avg_rating'],
+                    raw['has_free_cancellation'],
+                    raw['has_active_promotion']
+                )
+        return stats
+
+    @staticmethod
+    def empty_stats():
+        return {
+            'min_price': DEFAULT_MIN_PRICE,
+            'review_count': 0,
+            'avg_rating': 0.0,
+            'has_free_cancellation': False,
+            'has_active_promotion': False
+        }
+
+    @staticmethod
+    def build_cards(hotels):
+        """Ghép thông tin thống kê vào từng khách sạn theo format card dùng cho template"""
+        stats = HotelCardService.get_card_stats([hotel.hotel_id for hotel in hotels])
+
+        cards = []
+        for hotel in hotels:
+            card = {'hotel': hotel}
+            card.update(stats.get(hotel.hotel_id) or HotelCardService.empty_stats())
+            cards.append(card)
+        return cards
+
+    @staticmethod
+    def build_cards_from_rows(rows):
+        """Build card từ các cặp (Hotel, HotelSearchSummary) đã join sẵn; khách sạn chưa có summary thì tính trực tiếp"""
+        missing_ids = [hotel.hotel_id for hotel, summary in rows if summary is None]
+        fallback = HotelCardService.get_card_stats(missing_ids) if missing_ids else {}
+
+        cards = []
+        for hotel, summary in rows:
+            card = {'hotel': hotel}
+            if summary is not None:
+                card.update(HotelCardService.stats_from_summary(summary))
+            else:
+                card.update(fallback.get(hotel.hotel_id) or HotelCardService.empty_stats())
+            cards.append(card)
+        return cards
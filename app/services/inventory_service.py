@@ -0,0 +1,133 @@
+from datetime import timedelta
+
+from app import db
+from app.models.booking import Booking
+from app.models.booking_detail import BookingDetail
+from app.models.room_inventory import RoomInventory
+from app.services.availability_service import AvailabilityEngine, BLOCKING_STATUSES, BOOKABLE_STATUSES
+from app.utils.database import increment_counters
+
+
+class InventoryConflict(Exception):
+    """Không đủ phòng cho khoảng ngày đã chọn"""
+
+    def __init__(self, room_ids):
+        self.room_ids = room_ids
+        super().__init__(
+            f'Phòng ID {", ".join(str(room_id) for room_id in room_ids)} đã hết trong khoảng thời gian đã chọn'
+        )
+
+
+class InventoryService:
+    """Ghi sổ room_inventory trong cùng transaction với thay đổi booking (không tự commit)"""
+
+    @staticmethod
+    def nights(check_in, check_out):
+        return [check_in + timedelta(days=offset) for offset in range(max((check_out - check_in).days, 0))]
+
+    @staticmethod
+    def room_quantities(booking, details=None):
+        """{room_id: tổng số lượng} của booking"""
+        if details is None:
+            details = booking.booking_details
+        quantities = {}
+        for detail in details:
+            if isinstance(detail, dict):
+                room_id, quantity = detail['room_id'], detail.get('quantity')
+            else:
+                room_id, quantity = detail.room_id, detail.quantity
+            quantities[room_id] = quantities.get(room_id, 0) + (quantity or 1)
+        return quantities
+
+    @staticmethod
+    def _apply(booking, sign, details=None, check_in=None, check_out=None):
+        nights = InventoryService.nights(check_in or booking.check_in_date, check_out or booking.check_out_date)
+        rows = [
+            {'room_id': room_id, 'night': night, 'booked': sign * quantity}
+            for room_id, quantity in InventoryService.room_quantities(booking, details).items()
+            for night in nights
+        ]
+        increment_counters(RoomInventory, ('room_id', 'night'), 'booked', rows)
+
+    @staticmethod
+    def reserve(booking, details=None):
+        """Cộng số phòng của booking vào từng đêm lưu trú; details mặc định lấy từ booking.booking_details"""
+        InventoryService._apply(booking, 1, details)
+
+    @staticmethod
+    def release(booking, details=None, check_in=None, check_out=None):
+        """Trả lại phòng; check_in/check_out truyền vào khi booking vừa đổi ngày"""
+        InventoryService._apply(booking, -1, details, check_in, check_out)
+
+    @staticmethod
+    def lock_and_check(requested, check_in, check_out, usable_statuses=BOOKABLE_STATUSES):
+        """Khóa các dòng (room_id, night) cần đặt rồi kiểm tra sức chứa; thiếu phòng thì raise InventoryConflict.
+
+        requested: {room_id: số lượng}. Khóa giữ tới khi commit/rollback nên phải gọi trong cùng
+        transaction với lệnh insert booking.
+        """
+        nights = InventoryService.nights(check_in, check_out)
+        # Upsert delta 0 để đêm chưa có dòng nào cũng được tạo và khóa (tránh 2 transaction cùng thấy "trống").
+        # Sắp xếp theo khóa chính để các transaction khóa cùng thứ tự, hạn chế deadlock.
+        increment_counters(RoomInventory, ('room_id', 'night'), 'booked', [
+            {'room_id': room_id, 'night': night, 'booked': 0}
+            for room_id in sorted(requested)
+            for night in nights
+        ])
+        availability = AvailabilityEngine.load(
+            list(requested.keys()), check_in, check_out,
+            usable_statuses=usable_statuses,
+            for_update=True
+        )
+        unavailable = availability.unavailable(requested)
+        if unavailable:
+            raise InventoryConflict(unavailable)
+        return availability
+
+    @staticmethod
+    def sync_status(booking, previous_status):
+        """Gọi sau khi đổi booking.status: chỉ ghi sổ khi booking chuyển giữa giữ phòng / không giữ phòng"""
+        was_blocking = previous_status in BLOCKING_STATUSES
+        is_blocking = booking.status in BLOCKING_STATUSES
+        if is_blocking and not was_blocking:
+            InventoryService.reserve(booking)
+        elif was_blocking and not is_blocking:
+            InventoryService.release(booking)
+
+    @staticmethod
+    def rebuild(batch_size=500):
+        """Dựng lại toàn bộ sổ phòng từ các booking đang giữ phòng, trong 1 transaction"""
+        RoomInventory.query.delete(synchronize_session=False)
+
+        total = 0
+        last_id = 0
+        while True:
+            booking_ids = [row[0] for row in db.session.query(Booking.booking_id).filter(
+                Booking.status.in_(BLOCKING_STATUSES),
+                Booking.booking_id > last_id
+            ).order_by(Booking.booking_id).limit(batch_size).all()]
+            if not booking_ids:
+                break
+
+            rows = db.session.query(
+                Booking.check_in_date,
+                Booking.check_out_date,
+                BookingDetail.room_id,
+                BookingDetail.quantity
+            ).join(
+                BookingDetail, BookingDetail.booking_id == Booking.booking_id
+            ).filter(Booking.booking_id.in_(booking_ids)).all()
+
+            counts = {}
+            for check_in, check_out, room_id, quantity in rows:
+                for night in InventoryService.nights(check_in, check_out):
+                    counts[(room_id, night)] = counts.get((room_id, night), 0) + (quantity or 1)
+            increment_counters(RoomInventory, ('room_id', 'night'), 'booked', [
+                {'room_id': room_id, 'night': night, 'booked': booked}
+                for (room_id, night), booked in counts.items()
+            ])
+            total += len(booking_ids)
+            last_id = booking_ids[-1]
+
+        db.session.commit()
+        return total
@@ -0,0 +1,482 @@
+"""
+JOB QUEUE - Hàng đợi việc nền lưu trong DB (bảng background_jobs)
+
+- enqueue() ghi job rồi trả về ngay; job nằm trong DB nên worker khởi động lại không mất việc
+- Worker lấy job theo lô (UPDATE có điều kiện, MySQL/PostgreSQL thêm SKIP LOCKED) với số thread cố định
+- Lỗi thì thử lại với backoff lũy thừa, quá max_attempts chuyển 'failed' để admin xem và chạy lại
+- JOB_WORKER_MODE: thread (pool trong process web, khởi động cùng app),
+  external (chỉ chạy bằng `flask run-jobs`), sync (chạy ngay trong request, dùng khi test)
+"""
+
+import importlib
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy import func, update
+from werkzeug.serving import is_running_from_reloader
+
+from app import db
+from app.models.background_job import BackgroundJob
+
+DEFAULT_QUEUE = 'default'
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_WORKER_THREADS = 2
+DEFAULT_POLL_INTERVAL = 5
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 3600
+# Job 'running' lâu hơn mức này coi như worker đã chết giữa chừng, trả lại hàng đợi
+LOCK_TIMEOUT_SECONDS = 600
+RECOVER_INTERVAL_SECONDS = 60
+# Job đã xong giữ lại DEFAULT_RETENTION_DAYS ngày (payload có thể chứa token), worker dọn mỗi PURGE_INTERVAL_SECONDS
+DEFAULT_RETENTION_DAYS = 7
+PURGE_INTERVAL_SECONDS = 3600
+ENQUEUE_CHUNK_SIZE = 1000
+ERROR_PREVIEW_LENGTH = 2000
+# Nội dung email có link xác thực / đặt lại mật khẩu kèm token còn hạn, không đưa ra trang theo dõi
+REDACTED_PAYLOAD_KEYS = ('body', 'html')
+REDACTED_VALUE = '[đã ẩn]'
+
+# Các module khai báo task bằng @JobQueue.task, import trước khi worker chạy
+TASK_MODULES = (
+    'app.services.email_service',
+    'app.services.notification_service',
+    'app.services.platform_stats_service',
+    'app.services.search_summary_service',
+)
+
+
+class JobTask:
+    def __init__(self, name, handler, batch, queue, max_attempts):
+        self.name = name
+        self.handler = handler
+        self.batch = batch
+        self.queue = queue
+        self.max_attempts = max_attempts
+
+
+class JobQueue:
+    _tasks = {}
+    _lock = threading.Lock()
+    _recovered_at = 0.0
+    _purged_at = 0.0
+
+    @staticmethod
+    def task(name, batch=False, queue=DEFAULT_QUEUE, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """Đăng ký handler cho task.
+
+        batch=False: handler(payload), raise để báo lỗi.
+        batch=True: handler(payloads) nhận cả lô, trả về list lỗi cùng thứ tự (None = thành công).
+        """
+        def decorator(func):
+            JobQueue._tasks[name] = JobTask(name, func, batch, queue, max_attempts)
+            return func
+        return decorator
+
+    @staticmethod
+    def load_tasks():
+        for module in TASK_MODULES:
+            importlib.import_module(module)
+
+    @staticmethod
+    def _get_task(name):
+        spec = JobQueue._tasks.get(name)
+        if spec is None:
+            JobQueue.load_tasks()
+            spec = JobQueue._tasks.get(name)
+        if spec is None:
+            raise ValueError(f'Task không tồn tại: {name}')
+        return spec
+
+    # ---- ghi job ----
+
+    @staticmethod
+    def enqueue(task, payload=None, delay=0, commit=True):
+        """Ghi một job; commit=False thì job đi cùng transaction của caller (gọi notify() sau khi commit)"""
+        spec = JobQueue._get_task(task)
+        job = BackgroundJob(
+            task=task,
+            queue=spec.queue,
+            payload=json.dumps(payload or {}, ensure_ascii=False),
+            status='pending',
+            attempts=0,
+            max_attempts=spec.max_attempts,
+            run_at=datetime.utcnow() + timedelta(seconds=delay)
+        )
+        db.session.add(job)
+        if commit:
+            db.session.commit()
+            JobQueue.notify()
+        return job
+
+    @staticmethod
+    def enqueue_many(task, payloads, delay=0, commit=True):
+        """Ghi nhiều job bằng INSERT nhiều dòng theo từng khúc, không tạo object ORM"""
+        spec = JobQueue._get_task(task)
+        now = datetime.utcnow()
+        run_at = now + timedelta(seconds=delay)
+        total = 0
+        rows = []
+        for payload in payloads:
+            rows.append({
+                'task': task,
+                'queue': spec.queue,
+                'payload': json.dumps(payload or {}, ensure_ascii=False),
+                'status': 'pending',
+                'attempts': 0,
+                'max_attempts': spec.max_attempts,
+                'run_at': run_at,
+                'created_at': now
+            })
+            if len(rows) >= ENQUEUE_CHUNK_SIZE:
+                db.session.execute(BackgroundJob.__table__.insert(), rows)
+                total += len(rows)
+                rows = []
+        if rows:
+            db.session.execute(BackgroundJob.__table__.insert(), rows)
+            total += len(rows)
+        if commit:
+            db.session.commit()
+            if total:
+                JobQueue.notify()
+        return total
+
+    @staticmethod
+    def notify():
+        """Báo có job mới: mode thread đánh thức pool, mode sync chạy luôn"""
+        mode = current_app.config.get('JOB_WORKER_MODE', 'thread')
+        if mode == 'sync':
+            JobQueue.run_pending()
+        elif mode == 'thread':
+            JobQueue.get_pool().notify()
+
+    # ---- xử lý job ----
+
+    @staticmethod
+    def _skip_locked():
+        return db.session.get_bind().dialect.name in ('mysql', 'mariadb', 'postgresql')
+
+    @staticmethod
+    def claim(limit, worker_id, queues=None):
+        """Giữ tối đa limit job đến hạn cho worker_id; hai worker không bao giờ giữ cùng một job"""
+        now = datetime.utcnow()
+        query = db.session.query(BackgroundJob.job_id).filter(
+            BackgroundJob.status == 'pending',
+            BackgroundJob.run_at <= now
+        )
+        if queues:
+            query = query.filter(BackgroundJob.queue.in_(queues))
+        query = query.order_by(BackgroundJob.run_at, BackgroundJob.job_id).limit(limit)
+        if JobQueue._skip_locked():
+            query = query.with_for_update(skip_locked=True)
+        job_ids = [row[0] for row in query.all()]
+        if not job_ids:
+            db.session.commit()
+            return []
+
+        token = f'{worker_id}:{uuid.uuid4().hex[:12]}'[-100:]
+        # Điều kiện status = 'pending' bảo đảm job đã bị worker khác lấy thì không lấy lại
+        db.session.execute(
+            update(BackgroundJob)
+            .where(BackgroundJob.job_id.in_(job_ids), BackgroundJob.status == 'pending')
+            .values(
+                status='running',
+                locked_by=token,
+                locked_at=now,
+                attempts=BackgroundJob.attempts + 1
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return BackgroundJob.query.filter_by(locked_by=token, status='running')\
+            .order_by(BackgroundJob.job_id).all()
+
+    @staticmethod
+    def _backoff(attempts):
+        return min(BACKOFF_BASE_SECONDS * 2 ** max(attempts - 1, 0), BACKOFF_MAX_SECONDS)
+
+    @staticmethod
+    def _execute(spec, jobs):
+        payloads = [json.loads(job.payload) if job.payload else {} for job in jobs]
+        if spec.batch:
+            try:
+                errors = list(spec.handler(payloads))
+            except Exception as e:
+                db.session.rollback()
+                errors = [f'{type(e).__name__}: {e}'] * len(jobs)
+            if len(errors) != len(jobs):
+                errors = ['Handler trả về sai số kết quả'] * len(jobs)
+            return errors
+
+        errors = []
+        for payload in payloads:
+            try:
+                spec.handler(payload)
+                # Commit ngay để job lỗi phía sau (rollback) không cuốn theo dữ liệu của job đã xong
+                db.session.commit()
+                errors.append(None)
+            except Exception as e:
+                db.session.rollback()
+                errors.append(f'{type(e).__name__}: {e}')
+        return errors
+
+    @staticmethod
+    def _finish(job, error, now):
+        job.locked_by = None
+        if error is None:
+            job.status = 'done'
+            job.last_error = None
+            job.finished_at = now
+        elif job.attempts >= job.max_attempts:
+            job.status = 'failed'
+            job.last_error = error[:ERROR_PREVIEW_LENGTH]
+            job.finished_at = now
+        else:
+            job.status = 'pending'
+            job.last_error = error[:ERROR_PREVIEW_LENGTH]
+            job.run_at = now + timedelta(seconds=JobQueue._backoff(job.attempts))
+
+    @staticmethod
+    def run_once(worker_id=None, queues=None, limit=None):
+        """Lấy một lô job đến hạn và chạy; task batch nhận cả nhóm job cùng task. Trả về số job đã xử lý"""
+        JobQueue.load_tasks()
+        JobQueue.recover_stale()
+        JobQueue.purge_expired()
+        worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+        limit = limit or current_app.config.get('JOB_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+        jobs = JobQueue.claim(limit, worker_id, queues)
+        if not jobs:
+            return 0
+
+        groups = {}
+        for job in jobs:
+            groups.setdefault(job.task, []).append(job)
+
+        for task, group in groups.items():
+            spec = JobQueue._tasks.get(task)
+            if spec is None:
+                errors = [f'Task không tồn tại: {task}'] * len(group)
+            else:
+                errors = JobQueue._execute(spec, group)
+            now = datetime.utcnow()
+            for job, error in zip(group, errors):
+                JobQueue._finish(job, error, now)
+                if error is not None:
+                    current_app.logger.warning(f'Job {job.job_id} ({task}) lỗi lần {job.attempts}: {error}')
+            db.session.commit()
+        return len(jobs)
+
+    @staticmethod
+    def run_pending(worker_id=None, queues=None, max_batches=None):
+        """Chạy đến khi hết job đến hạn (CLI --once, mode sync)"""
+        total = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            processed = JobQueue.run_once(worker_id, queues)
+            if not processed:
+                break
+            total += processed
+            batches += 1
+        return total
+
+    @staticmethod
+    def recover_stale(force=False):
+        """Trả job 'running' của worker đã chết về hàng đợi (lần thử đó vẫn được tính)"""
+        now = time.monotonic()
+        if not force and now - JobQueue._recovered_at < RECOVER_INTERVAL_SECONDS:
+            return 0
+        JobQueue._recovered_at = now
+        cutoff = datetime.utcnow() - timedelta(seconds=LOCK_TIMEOUT_SECONDS)
+        result = db.session.execute(
+            update(BackgroundJob)
+            .where(BackgroundJob.status == 'running', BackgroundJob.locked_at < cutoff)
+            .values(status='pending', locked_by=None, run_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return result.rowcount or 0
+
+    # ---- theo dõi ----
+
+    @staticmethod
+    def stats():
+        counts = {'pending': 0, 'running': 0, 'done': 0, 'failed': 0}
+        by_task = {}
+        rows = db.session.query(BackgroundJob.task, BackgroundJob.status, func.count(BackgroundJob.job_id))\
+            .group_by(BackgroundJob.task, BackgroundJob.status).all()
+        for task, status, count in rows:
+            counts[status] = counts.get(status, 0) + count
+            by_task.setdefault(task, {})[status] = count
+
+        oldest = db.session.query(func.min(BackgroundJob.run_at)).filter(
+            BackgroundJob.status == 'pending',
+            BackgroundJob.run_at <= datetime.utcnow()
+        ).scalar()
+        pool = current_app.extensions.get('job_workers')
+        return {
+            'counts': counts,
+            'by_task': by_task,
+            # Job đến hạn lâu nhất chưa được chạy: worker có theo kịp không
+            'oldest_due_seconds': round((datetime.utcnow() - oldest).total_seconds(), 1) if oldest else 0,
+            'mode': current_app.config.get('JOB_WORKER_MODE', 'thread'),
+            'worker_threads': pool.threads if pool is not None else 0
+        }
+
+    @staticmethod
+    def _redact(payload):
+        if isinstance(payload, dict):
+            return {
+                key: REDACTED_VALUE if key in REDACTED_PAYLOAD_KEYS and value else JobQueue._redact(value)
+                for key, value in payload.items()
+            }
+        if isinstance(payload, list):
+            return [JobQueue._redact(item) for item in payload]
+        return payload
+
+    @staticmethod
+    def failed_jobs(limit=20):
+        jobs = BackgroundJob.query.filter_by(status='failed')\
+            .order_by(BackgroundJob.finished_at.desc(), BackgroundJob.job_id.desc()).limit(limit).all()
+        results = []
+        for job in jobs:
+            data = job.to_dict()
+            data['payload'] = JobQueue._redact(data['payload'])
+            results.append(data)
+        return results
+
+    @staticmethod
+    def retry_failed(job_ids=None):
+        """Đưa job failed (tất cả hoặc theo id) về hàng đợi với số lần thử mới"""
+        statement = update(BackgroundJob).where(BackgroundJob.status == 'failed')
+        if job_ids:
+            statement = statement.where(BackgroundJob.job_id.in_(job_ids))
+        result = db.session.execute(
+            statement.values(status='pending', attempts=0, run_at=datetime.utcnow(), finished_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if result.rowcount:
+            JobQueue.notify()
+        return result.rowcount or 0
+
+    @staticmethod
+    def purge_expired(force=False):
+        """Worker gọi định kỳ: xóa job đã xong quá JOB_RETENTION_DAYS ngày"""
+        now = time.monotonic()
+        if not force and now - JobQueue._purged_at < PURGE_INTERVAL_SECONDS:
+            return 0
+        JobQueue._purged_at = now
+        return JobQueue.purge_done(current_app.config.get('JOB_RETENTION_DAYS', DEFAULT_RETENTION_DAYS))
+
+    @staticmethod
+    def purge_done(older_than_days=DEFAULT_RETENTION_DAYS):
+        cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+        result = db.session.execute(
+            BackgroundJob.__table__.delete().where(
+                BackgroundJob.status == 'done',
+                BackgroundJob.finished_at < cutoff
+            )
+        )
+        db.session.commit()
+        return result.rowcount or 0
+
+    # ---- worker pool ----
+
+    @staticmethod
+    def _should_start_workers(app):
+        if app.config.get('JOB_WORKER_MODE', 'thread') != 'thread' or app.testing:
+            return False
+        # Lệnh CLI khác `flask run` không phục vụ request; job để pool web hoặc `flask run-jobs` xử lý
+        if os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+            ctx = click.get_current_context(silent=True)
+            if ctx is None or ctx.info_name != 'run':
+                return False
+        # Debug bật reloader: tiến trình cha chỉ theo dõi file, pool chạy ở tiến trình con
+        if app.debug and not is_running_from_reloader():
+            return False
+        return True
+
+    @staticmethod
+    def start_workers(app):
+        """Khởi động pool ngay khi tạo app để job còn tồn sau restart (retry, job hẹn giờ, job enqueue
+        không notify) được xử lý mà không phải chờ request nào đó enqueue"""
+        if not JobQueue._should_start_workers(app):
+            return
+        with app.app_context():
+            JobQueue.get_pool()
+
+    @staticmethod
+    def get_pool():
+        pool = current_app.extensions.get('job_workers')
+        # Pool tạo trước khi fork (gunicorn --preload) không có thread trong tiến trình con
+        if pool is None or pool.pid != os.getpid():
+            with JobQueue._lock:
+                pool = current_app.extensions.get('job_workers')
+                if pool is None or pool.pid != os.getpid():
+                    pool = JobWorkerPool(
+                        current_app._get_current_object(),
+                        threads=current_app.config.get('JOB_WORKER_THREADS', DEFAULT_WORKER_THREADS),
+                        poll_interval=current_app.config.get('JOB_POLL_INTERVAL', DEFAULT_POLL_INTERVAL)
+                    )
+                    pool.start()
+                    current_app.extensions['job_workers'] = pool
+        return pool
+
+
+class JobWorkerPool:
+    """Số thread cố định, mỗi thread lặp: lấy lô job -> chạy -> chờ (bị đánh thức khi có job mới)"""
+
+    def __init__(self, app, threads=DEFAULT_WORKER_THREADS, poll_interval=DEFAULT_POLL_INTERVAL, queues=None):
+        self.app = app
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.queues = queues
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._workers = []
+        self.pid = None
+
+    def start(self):
+        self.pid = os.getpid()
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        for index in range(self.threads):
+            worker = threading.Thread(
+                target=self._run,
+                args=(f'{prefix}:{index}',),
+                name=f'job-worker-{index}',
+                daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def notify(self):
+        self._wakeup.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wakeup.set()
+        for worker in self._workers:
+            worker.join(timeout)
+
+    def _run(self, worker_id):
+        with self.app.app_context():
+            while not self._stop.is_set():
+                try:
+                    processed = JobQueue.run_once(worker_id, self.queues)
+                except Exception as e:
+                    self.app.logger.error(f'Job worker {worker_id} lỗi: {e}')
+                    db.session.rollback()
+                    processed = 0
+                finally:
+                    db.session.remove()
+
+                if not processed:
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
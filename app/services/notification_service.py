@@ -0,0 +1,341 @@
+"""
+NOTIFICATION SERVICE - Gửi thông báo hàng loạt
+
+- Khuyến mãi mới của khách sạn: thông báo cho mọi user đã yêu thích khách sạn đó
+- Ghi notification bằng một câu INSERT ... SELECT từ favorites (không tạo object ORM cho từng user)
+- Email xếp vào hàng đợi theo lô người nhận; mỗi job gửi qua một kết nối SMTP
+- Chạy trong worker nền (JobQueue), request tạo khuyến mãi trả về ngay
+- Bộ đếm users.unread_notifications cho badge: thay đổi qua ORM cập nhật trong after_flush,
+  UPDATE / DELETE / INSERT hàng loạt gọi adjust_unread cùng transaction
+"""
+
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import event, exists, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history, PASSIVE_NO_INITIALIZE
+
+from app import db, mail
+from app.models.favorite import Favorite
+from app.models.hotel import Hotel
+from app.models.notification import Notification
+from app.models.promotion import Promotion
+from app.models.room import Room
+from app.models.user import User
+from app.services.email_service import EmailService
+from app.services.job_queue import JobQueue
+
+PROMOTION_FANOUT_TASK = 'promotion_fanout'
+PROMOTION_EMAIL_TASK = 'promotion_emails'
+# Số người nhận trong một job email (một kết nối SMTP)
+EMAIL_BATCH_SIZE = 200
+# Số user_id đọc mỗi trang khi chia lô email
+RECIPIENT_PAGE_SIZE = 5000
+EMAIL_RETRY_DELAY = 300
+MAX_EMAIL_RETRIES = 3
+# is_read cũ không có trong session (object đã expire)
+_UNKNOWN = object()
+
+
+class NotificationService:
+
+    @staticmethod
+    def unread_count(user_id):
+        """Đọc bộ đếm theo khóa chính users, không đụng bảng notifications"""
+        count = db.session.query(User.unread_notifications).filter(User.user_id == user_id).scalar()
+        return count or 0
+
+    @staticmethod
+    def _unread_update(user_id, delta):
+        users = User.__table__
+        return (
+            update(users)
+            .where(users.c.user_id == user_id)
+            .values(unread_notifications=users.c.unread_notifications + delta)
+        )
+
+    @staticmethod
+    def adjust_unread(user_id, delta):
+        """Cộng dồn ngay trong DB (UPDATE ... SET n = n + delta) nên không mất cập nhật khi ghi đồng thời"""
+        if delta:
+            db.session.execute(NotificationService._unread_update(user_id, delta))
+
+    @staticmethod
+    def _recount_update(user_ids=None):
+        users = User.__table__
+        unread = (
+            select(func.count(Notification.notification_id))
+            .where(Notification.user_id == users.c.user_id, Notification.is_read.is_(False))
+            .scalar_subquery()
+        )
+        stmt = update(users).values(unread_notifications=unread)
+        if user_ids is not None:
+            stmt = stmt.where(users.c.user_id.in_(user_ids))
+        return stmt
+
+    @staticmethod
+    def recount_unread(user_ids=None):
+        """Đếm lại từ bảng notifications (sau khi sửa dữ liệu tay / nghi lệch); trả về số user đã ghi"""
+        result = db.session.execute(NotificationService._recount_update(user_ids))
+        db.session.commit()
+        return result.rowcount
+
+    @staticmethod
+    def _old_is_read(obj):
+        """Giá trị is_read trong DB trước lần flush này; _UNKNOWN nếu thuộc tính chưa được nạp"""
+        history = get_history(obj, 'is_read', passive=PASSIVE_NO_INITIALIZE)
+        if history.deleted:
+            return history.deleted[0]
+        if history.unchanged:
+            return history.unchanged[0]
+        return _UNKNOWN
+
+    @staticmethod
+    def _collect_unread_changes(session, flush_context):
+        """Tính chênh lệch chưa đọc của các Notification vừa flush qua ORM và ghi vào bộ đếm"""
+        deltas = {}
+        # User có thay đổi mà không biết giá trị cũ (object đã expire): đếm lại từ bảng
+        recount = set()
+        for obj in session.new:
+            if isinstance(obj, Notification) and not obj.is_read:
+                deltas[obj.user_id] = deltas.get(obj.user_id, 0) + 1
+        for obj in session.deleted:
+            if not isinstance(obj, Notification):
+                continue
+            was_read = NotificationService._old_is_read(obj)
+            if was_read is _UNKNOWN:
+                recount.add(obj.user_id)
+            elif not was_read:
+                deltas[obj.user_id] = deltas.get(obj.user_id, 0) - 1
+        for obj in session.dirty:
+            if not isinstance(obj, Notification):
+                continue
+            history = get_history(obj, 'is_read', passive=PASSIVE_NO_INITIALIZE)
+            if not history.added:
+                continue
+            was_read = history.deleted[0] if history.deleted else _UNKNOWN
+            if was_read is _UNKNOWN:
+                recount.add(obj.user_id)
+            elif bool(was_read) != bool(history.added[0]):
+                deltas[obj.user_id] = deltas.get(obj.user_id, 0) + (-1 if history.added[0] else 1)
+
+        for user_id, delta in deltas.items():
+            if delta and user_id not in recount:
+                session.execute(NotificationService._unread_update(user_id, delta))
+        if recount:
+            session.execute(NotificationService._recount_update(recount))
+
+    @staticmethod
+    def register_hooks():
+        """Đăng ký event giữ bộ đếm chưa đọc đúng với các thay đổi Notification qua ORM"""
+        if not event.contains(Session, 'after_flush', NotificationService._collect_unread_changes):
+            event.listen(Session, 'after_flush', NotificationService._collect_unread_changes)
+
+    @staticmethod
+    def _promotion_hotel(promotion):
+        if promotion.hotel_id:
+            return promotion.hotel_id
+        if promotion.room_id:
+            return db.session.query(Room.hotel_id).filter(Room.room_id == promotion.room_id).scalar()
+        return None
+
+    @staticmethod
+    def _promotion_message(promotion):
+        if promotion.discount_type == 'percentage':
+            discount = f'{float(promotion.discount_value):g}%'
+        else:
+            discount = f'{float(promotion.discount_value):,.0f}đ'
+        return (
+            f'{promotion.title}: giảm {discount} '
+            f'từ {promotion.start_date.strftime("%d/%m/%Y")} đến {promotion.end_date.strftime("%d/%m/%Y")}'
+        )
+
+    @staticmethod
+    def enqueue_promotion_fanout(promotion):
+        """Gọi sau khi khuyến mãi đã commit; lỗi xếp hàng không làm hỏng việc tạo khuyến mãi"""
+        try:
+            JobQueue.enqueue(PROMOTION_FANOUT_TASK, {'promotion_id': promotion.promotion_id})
+            return True
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f'Không xếp được thông báo khuyến mãi {promotion.promotion_id}: {e}')
+            return False
+
+    @staticmethod
+    def _email_batches(hotel_id, promotion_id, after_notification_id, batch_size):
+        """Chia người nhận email thành lô: chỉ user vừa được ghi thông báo ở lần chạy này (id > after_notification_id) và đã xác thực email.
+
+        Đọc user_id theo keyset để không giữ cursor mở; chạy lại không gửi lại cho người đã nhận.
+        """
+        last_user_id = 0
+        batch = []
+        while True:
+            user_ids = [row[0] for row in db.session.query(Favorite.user_id)
+                        .join(User, User.user_id == Favorite.user_id)
+                        .join(Notification, db.and_(
+                            Notification.user_id == Favorite.user_id,
+                            Notification.type == 'promotion',
+                            Notification.related_id == promotion_id,
+                            Notification.notification_id > after_notification_id
+                        ))
+                        .filter(
+                            Favorite.hotel_id == hotel_id,
+                            Favorite.user_id > last_user_id,
+                            User.is_active.is_(True),
+                            User.email_verified.is_(True)
+                        )
+                        .order_by(Favorite.user_id)
+                        .limit(RECIPIENT_PAGE_SIZE)
+                        .all()]
+            if not user_ids:
+                break
+            for user_id in user_ids:
+                batch.append(user_id)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            last_user_id = user_ids[-1]
+        if batch:
+            yield batch
+
+    @staticmethod
+    def fan_out_promotion(promotion_id, email_batch_size=EMAIL_BATCH_SIZE):
+        """Thông báo khuyến mãi cho người yêu thích khách sạn: một INSERT ... SELECT + các job email theo lô.
+
+        Cả hai ghi trong một transaction nên job chạy lại (sau lỗi) không tạo trùng;
+        user đã có thông báo của khuyến mãi này thì bỏ qua, email chỉ xếp cho người vừa được ghi thông báo.
+        """
+        started = time.perf_counter()
+        stats = {'notifications': 0, 'email_jobs': 0, 'email_recipients': 0}
+
+        promotion = db.session.get(Promotion, promotion_id)
+        if not promotion or not promotion.is_active:
+            return stats
+        hotel_id = NotificationService._promotion_hotel(promotion)
+        if not hotel_id:
+            # Khuyến mãi toàn hệ thống không có danh sách người theo dõi
+            return stats
+
+        hotel_name = db.session.query(Hotel.hotel_name).filter(Hotel.hotel_id == hotel_id).scalar()
+        title = f'Khuyến mãi mới tại {hotel_name}'
+        message = NotificationService._promotion_message(promotion)
+        now = datetime.utcnow()
+        # Thông báo ghi ở lần chạy này có id lớn hơn mốc này (dùng để chọn người nhận email)
+        last_notification_id = db.session.query(func.max(Notification.notification_id)).scalar() or 0
+
+        already_notified = exists().where(
+            Notification.user_id == Favorite.user_id,
+            Notification.type == 'promotion',
+            Notification.related_id == promotion_id
+        )
+        recipients = select(
+            Favorite.user_id,
+            literal(title),
+            literal(message),
+            literal('promotion'),
+            literal(promotion_id),
+            literal(False),
+            literal(now)
+        ).join(
+            User, User.user_id == Favorite.user_id
+        ).where(
+            Favorite.hotel_id == hotel_id,
+            User.is_active.is_(True),
+            ~already_notified
+        )
+        result = db.session.execute(
+            insert(Notification.__table__).from_select(
+                ['user_id', 'title', 'message', 'type', 'related_id', 'is_read', 'created_at'],
+                recipients
+            )
+        )
+        stats['notifications'] = result.rowcount or 0
+        if stats['notifications']:
+            # Tăng bộ đếm chưa đọc cho đúng những user vừa được ghi thông báo, một câu UPDATE
+            users = User.__table__
+            db.session.execute(
+                update(users)
+                .where(users.c.user_id.in_(
+                    select(Notification.user_id).where(
+                        Notification.type == 'promotion',
+                        Notification.related_id == promotion_id,
+                        Notification.notification_id > last_notification_id
+                    )
+                ))
+                .values(unread_notifications=users.c.unread_notifications + 1)
+            )
+
+        payloads = []
+        if stats['notifications']:
+            batches = NotificationService._email_batches(hotel_id, promotion_id, last_notification_id, email_batch_size)
+            for user_ids in batches:
+                payloads.append({'promotion_id': promotion_id, 'user_ids': user_ids})
+                stats['email_recipients'] += len(user_ids)
+        stats['email_jobs'] = JobQueue.enqueue_many(PROMOTION_EMAIL_TASK, payloads, commit=False)
+
+        db.session.commit()
+        if stats['email_jobs']:
+            JobQueue.notify()
+
+        stats['seconds'] = round(time.perf_counter() - started, 3)
+        current_app.logger.info(f'Promotion {promotion_id} fan-out: {stats}')
+        return stats
+
+    @staticmethod
+    @JobQueue.task(PROMOTION_FANOUT_TASK)
+    def run_promotion_fanout(payload):
+        NotificationService.fan_out_promotion(payload['promotion_id'])
+
+    @staticmethod
+    @JobQueue.task(PROMOTION_EMAIL_TASK, queue='email')
+    def send_promotion_emails(payload):
+        """Gửi email khuyến mãi cho một lô user qua một kết nối SMTP.
+
+        Không gửi được cho ai thì raise (cả lô thử lại); lỗi một phần thì xếp job mới chỉ cho người bị lỗi.
+        """
+        promotion = db.session.get(Promotion, payload['promotion_id'])
+        if not promotion or not promotion.is_active:
+            return
+        hotel_id = NotificationService._promotion_hotel(promotion)
+        hotel_name = db.session.query(Hotel.hotel_name).filter(Hotel.hotel_id == hotel_id).scalar()
+        users = db.session.query(User.user_id, User.email, User.full_name).filter(
+            User.user_id.in_(payload['user_ids']),
+            User.is_active.is_(True)
+        ).all()
+        if not users:
+            return
+
+        subject = f'Khuyến mãi mới tại {hotel_name}'
+        message = NotificationService._promotion_message(promotion)
+        failed = []
+        with mail.connect() as connection:
+            for user in users:
+                body = f'''
+        Xin chào {user.full_name},
+
+        Khách sạn {hotel_name} bạn yêu thích vừa có khuyến mãi mới:
+        {message}
+
+        Trân trọng,
+        Hotel Booking Team
+        '''
+                try:
+                    connection.send(EmailService._build_message(user.email, subject, body))
+                except Exception as e:
+                    current_app.logger.warning(f'Gửi email khuyến mãi cho {user.email} lỗi: {e}')
+                    failed.append(user.user_id)
+
+        if not failed:
+            return
+        if len(failed) == len(users):
+            raise RuntimeError(f'Không gửi được email nào trong lô {len(users)} người')
+        retries = payload.get('retries', 0) + 1
+        if retries <= MAX_EMAIL_RETRIES:
+            JobQueue.enqueue(
+                PROMOTION_EMAIL_TASK,
+                {'promotion_id': promotion.promotion_id, 'user_ids': failed, 'retries': retries},
+                delay=EMAIL_RETRY_DELAY,
+                commit=False
+            )
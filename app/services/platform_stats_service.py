@@ -0,0 +1,334 @@
+"""
+PLATFORM STATS - Số liệu tổng quan của dashboard admin trong bảng platform_stats
+
+- Số liệu chia thành SHARDS dòng (stats_id 1..SHARDS), giá trị thật là tổng các dòng
+- Mỗi transaction ghi User / Hotel / Booking / Payment / Review / Room cộng chênh lệch vào một dòng chọn ngẫu nhiên
+  bằng một câu UPDATE ngay trước commit, các transaction đồng thời ít khi phải chờ khóa của nhau
+- Thay đổi không tính được chênh lệch (thiếu giá trị cũ, ghi hàng loạt bằng Core) được bù bằng đối soát:
+  đếm lại toàn bộ theo chu kỳ PLATFORM_STATS_RECONCILE_INTERVAL (job nền) hoặc khi admin bấm làm mới.
+  Đối soát đếm không giữ khóa, chỉ cộng phần lệch vào dòng gốc bằng một câu UPDATE
+- Dashboard / báo cáo đọc tổng các dòng bằng một query
+"""
+
+import random
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import case, event, func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history, PASSIVE_NO_INITIALIZE
+
+from app import db
+from app.models.background_job import BackgroundJob
+from app.models.booking import Booking
+from app.models.hotel import Hotel
+from app.models.payment import Payment
+from app.models.platform_stats import PlatformStats
+from app.models.review import Review
+from app.models.room import Room
+from app.models.user import User
+from app.services.job_queue import JobQueue
+
+# Dòng gốc (giữ reconciled_at, nhận phần lệch khi đối soát) và số dòng chia tải ghi
+STATS_ID = 1
+SHARDS = 16
+RECONCILE_TASK = 'platform_stats_reconcile'
+DEFAULT_RECONCILE_INTERVAL = 3600
+
+DELTAS_KEY = 'platform_stats_deltas'
+STALE_KEY = 'platform_stats_stale'
+
+# Thuộc tính quyết định phần đóng góp của một dòng vào số liệu
+TRACKED_ATTRS = {
+    User: ('is_active',),
+    Hotel: ('status',),
+    Booking: ('status', 'final_amount'),
+    Payment: (),
+    Review: ('rating',),
+    Room: (),
+}
+
+# Các cột cộng dồn (tổng các shard)
+COUNTER_COLUMNS = (
+    'total_users', 'active_users', 'total_hotels', 'pending_hotels', 'active_hotels', 'total_bookings',
+    'total_revenue', 'total_payments', 'total_reviews', 'rating_sum', 'rating_count', 'total_rooms',
+)
+
+_UNKNOWN = object()
+
+
+def _contribution(model, values):
+    """Phần một dòng (với các giá trị values) đóng góp vào từng cột của platform_stats"""
+    if model is User:
+        return {'total_users': 1, 'active_users': 1 if values['is_active'] else 0}
+    if model is Hotel:
+        return {
+            'total_hotels': 1,
+            'pending_hotels': 1 if values['status'] == 'pending' else 0,
+            'active_hotels': 1 if values['status'] == 'active' else 0,
+        }
+    if model is Booking:
+        revenue = values['final_amount'] if values['status'] == 'checked_out' and values['final_amount'] else 0
+        return {'total_bookings': 1, 'total_revenue': revenue}
+    if model is Payment:
+        return {'total_payments': 1}
+    if model is Review:
+        rated = values['rating'] is not None
+        return {
+            'total_reviews': 1,
+            'rating_sum': values['rating'] if rated else 0,
+            'rating_count': 1 if rated else 0,
+        }
+    return {'total_rooms': 1}
+
+
+class PlatformStatsService:
+
+    @staticmethod
+    def compute():
+        """Đếm lại toàn bộ từ các bảng (6 query gộp điều kiện)"""
+        users = db.session.query(
+            func.count(User.user_id),
+            func.coalesce(func.sum(case((User.is_active.is_(True), 1), else_=0)), 0)
+        ).one()
+        hotels = db.session.query(
+            func.count(Hotel.hotel_id),
+            func.coalesce(func.sum(case((Hotel.status == 'pending', 1), else_=0)), 0),
+            func.coalesce(func.sum(case((Hotel.status == 'active', 1), else_=0)), 0)
+        ).one()
+        bookings = db.session.query(
+            func.count(Booking.booking_id),
+            func.coalesce(func.sum(case((Booking.status == 'checked_out', Booking.final_amount), else_=0)), 0)
+        ).one()
+        reviews = db.session.query(
+            func.count(Review.review_id),
+            func.coalesce(func.sum(Review.rating), 0),
+            func.count(Review.rating)
+        ).one()
+        return {
+            'total_users': users[0],
+            'active_users': int(users[1]),
+            'total_hotels': hotels[0],
+            'pending_hotels': int(hotels[1]),
+            'active_hotels': int(hotels[2]),
+            'total_bookings': bookings[0],
+            'total_revenue': bookings[1],
+            'total_payments': db.session.query(func.count(Payment.payment_id)).scalar(),
+            'total_reviews': reviews[0],
+            'rating_sum': int(reviews[1]),
+            'rating_count': reviews[2],
+            'total_rooms': db.session.query(func.count(Room.room_id)).scalar(),
+        }
+
+    @staticmethod
+    def _ensure_shards():
+        """Tạo các dòng shard còn thiếu (giá trị 0)"""
+        existing = {stats_id for stats_id, in db.session.query(PlatformStats.stats_id)}
+        missing = [stats_id for stats_id in range(STATS_ID, STATS_ID + SHARDS) if stats_id not in existing]
+        if not missing:
+            return
+        db.session.add_all([PlatformStats(stats_id=stats_id) for stats_id in missing])
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Request khác vừa tạo các dòng này
+            db.session.rollback()
+
+    @staticmethod
+    def _read():
+        """Cộng các shard thành một PlatformStats (không gắn vào session); None nếu chưa có dòng nào"""
+        table = PlatformStats.__table__
+        row = db.session.query(
+            func.count(table.c.stats_id),
+            *[func.coalesce(func.sum(table.c[column]), 0) for column in COUNTER_COLUMNS],
+            func.max(case((table.c.needs_reconcile.is_(True), 1), else_=0)),
+            func.max(table.c.updated_at),
+            func.max(table.c.reconciled_at)
+        ).one()
+        if not row[0]:
+            return None
+
+        values = dict(zip(COUNTER_COLUMNS, row[1:1 + len(COUNTER_COLUMNS)]))
+        for column in COUNTER_COLUMNS:
+            # MySQL trả SUM của cột nguyên về Decimal
+            if column != 'total_revenue':
+                values[column] = int(values[column])
+        needs_reconcile, updated_at, reconciled_at = row[1 + len(COUNTER_COLUMNS):]
+        return PlatformStats(
+            stats_id=STATS_ID,
+            needs_reconcile=bool(needs_reconcile),
+            updated_at=updated_at,
+            reconciled_at=reconciled_at,
+            **values
+        )
+
+    @staticmethod
+    def reconcile():
+        """Đếm lại toàn bộ và sửa số liệu theo kết quả đếm; trả về PlatformStats"""
+        PlatformStatsService._ensure_shards()
+        started = datetime.utcnow()
+
+        # Tổng các shard và kết quả đếm đọc trong cùng một snapshot (REPEATABLE READ) nên phần lệch là của đúng
+        # thời điểm đó; transaction commit sau snapshot đã tự cộng chênh lệch của nó vào shard nên không bị tính hai lần.
+        # Đếm không khóa dòng nào, ghi đồng thời không phải chờ
+        current = PlatformStatsService._read()
+        counted = PlatformStatsService.compute()
+        db.session.commit()
+
+        table = PlatformStats.__table__
+        now = datetime.utcnow()
+        values = {
+            column: table.c[column] + (counted[column] - getattr(current, column))
+            for column in COUNTER_COLUMNS
+            if counted[column] != getattr(current, column)
+        }
+        # Chỉ bỏ cờ đối soát của các dòng không bị ghi sau khi bắt đầu đếm
+        db.session.execute(
+            update(table).where(table.c.needs_reconcile.is_(True), table.c.updated_at <= started)
+            .values(needs_reconcile=False)
+        )
+        db.session.execute(
+            update(table).where(table.c.stats_id == STATS_ID)
+            .values(updated_at=now, reconciled_at=now, **values)
+        )
+        db.session.commit()
+        return PlatformStatsService._read()
+
+    @staticmethod
+    def schedule_reconcile():
+        """Xếp job đối soát nếu chưa có job nào đang chờ"""
+        try:
+            pending = db.session.query(BackgroundJob.job_id).filter(
+                BackgroundJob.task == RECONCILE_TASK,
+                BackgroundJob.status.in_(('pending', 'running'))
+            ).first()
+            if pending is None:
+                JobQueue.enqueue(RECONCILE_TASK)
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.warning(f'Không xếp được job đối soát platform_stats: {e}')
+
+    @staticmethod
+    def get_snapshot():
+        """Đọc số liệu (một query cộng các shard); chưa có thì đếm ngay, quá hạn thì xếp job đối soát"""
+        stats = PlatformStatsService._read()
+        if stats is None:
+            return PlatformStatsService.reconcile()
+
+        interval = current_app.config.get('PLATFORM_STATS_RECONCILE_INTERVAL', DEFAULT_RECONCILE_INTERVAL)
+        expired = stats.reconciled_at is None or stats.reconciled_at < datetime.utcnow() - timedelta(seconds=interval)
+        if stats.needs_reconcile or expired:
+            PlatformStatsService.schedule_reconcile()
+        return stats
+
+    @staticmethod
+    @JobQueue.task(RECONCILE_TASK)
+    def run_reconcile(payload):
+        PlatformStatsService.reconcile()
+
+    # ---- cộng dồn theo session ----
+
+    @staticmethod
+    def _values(obj, attrs, old):
+        """Giá trị các thuộc tính trước (old=True) hoặc sau lần flush; _UNKNOWN nếu không có trong session"""
+        values = {}
+        for attr in attrs:
+            history = get_history(obj, attr, passive=PASSIVE_NO_INITIALIZE)
+            if history.added or history.deleted:
+                if old:
+                    value = history.deleted[0] if history.deleted else _UNKNOWN
+                else:
+                    value = history.added[0] if history.added else None
+            elif history.unchanged:
+                value = history.unchanged[0]
+            elif attr in obj.__dict__:
+                value = obj.__dict__[attr]
+            else:
+                value = _UNKNOWN
+            if value is _UNKNOWN:
+                return _UNKNOWN
+            values[attr] = value
+        return values
+
+    @staticmethod
+    def _add(deltas, contribution, sign):
+        for column, value in contribution.items():
+            if value:
+                deltas[column] = deltas.get(column, 0) + sign * value
+
+    @staticmethod
+    def _collect_changes(session, flush_context):
+        deltas = session.info.setdefault(DELTAS_KEY, {})
+        add = PlatformStatsService._add
+
+        for obj in session.new:
+            attrs = TRACKED_ATTRS.get(type(obj))
+            if attrs is not None:
+                add(deltas, _contribution(type(obj), {attr: getattr(obj, attr) for attr in attrs}), 1)
+
+        for obj in session.deleted:
+            attrs = TRACKED_ATTRS.get(type(obj))
+            if attrs is None:
+                continue
+            old = PlatformStatsService._values(obj, attrs, old=True)
+            if old is _UNKNOWN:
+                session.info[STALE_KEY] = True
+            else:
+                add(deltas, _contribution(type(obj), old), -1)
+
+        for obj in session.dirty:
+            attrs = TRACKED_ATTRS.get(type(obj))
+            if not attrs:
+                continue
+            if not any(get_history(obj, attr, passive=PASSIVE_NO_INITIALIZE).has_changes() for attr in attrs):
+                continue
+            old = PlatformStatsService._values(obj, attrs, old=True)
+            new = PlatformStatsService._values(obj, attrs, old=False)
+            if old is _UNKNOWN or new is _UNKNOWN:
+                session.info[STALE_KEY] = True
+                continue
+            add(deltas, _contribution(type(obj), old), -1)
+            add(deltas, _contribution(type(obj), new), 1)
+
+    @staticmethod
+    def _apply_before_commit(session):
+        # before_commit chạy trước lần flush cuối của commit, flush trước để after_flush gom đủ thay đổi
+        session.flush()
+        deltas = {column: value for column, value in session.info.pop(DELTAS_KEY, {}).items() if value}
+        stale = session.info.pop(STALE_KEY, False)
+        if not deltas and not stale:
+            return
+
+        table = PlatformStats.__table__
+        values = {column: table.c[column] + value for column, value in deltas.items()}
+        values['updated_at'] = datetime.utcnow()
+        if stale:
+            values['needs_reconcile'] = True
+        # Chia tải ghi: mỗi transaction chỉ khóa một shard ngẫu nhiên
+        shard = random.randrange(STATS_ID, STATS_ID + SHARDS)
+        result = session.execute(update(table).where(table.c.stats_id == shard).values(**values))
+        if result.rowcount == 0 and shard != STATS_ID:
+            # Shard chưa được tạo: cộng vào dòng gốc. Chưa có dòng nào thì lần đọc đầu tiên sẽ đếm lại
+            session.execute(update(table).where(table.c.stats_id == STATS_ID).values(**values))
+
+    @staticmethod
+    def _discard_changes(session, previous_transaction):
+        had_changes = bool(session.info.pop(DELTAS_KEY, None))
+        if had_changes and session.in_transaction():
+            # Rollback savepoint: không tách được phần đã hủy, đánh dấu cần đối soát
+            session.info[STALE_KEY] = True
+        elif not session.in_transaction():
+            session.info.pop(STALE_KEY, None)
+
+    @staticmethod
+    def register_hooks():
+        """Đăng ký event để cộng chênh lệch vào platform_stats trong transaction ghi dữ liệu"""
+        hooks = (
+            ('after_flush', PlatformStatsService._collect_changes),
+            ('before_commit', PlatformStatsService._apply_before_commit),
+            ('after_soft_rollback', PlatformStatsService._discard_changes),
+        )
+        for name, handler in hooks:
+            if not event.contains(Session, name, handler):
+                event.listen(Session, name, handler)
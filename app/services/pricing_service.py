@@ -0,0 +1,390 @@
+import calendar
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import or_, and_
+
+from app.models.hotel import Hotel
+from app.models.room import Room
+from app.models.promotion import Promotion
+from app.models.discount_code import DiscountCode
+from app.services.availability_service import AvailabilityEngine
+
+# Bitmask tất cả các ngày trong tuần (Thứ 2 = bit 0 ... Chủ nhật = bit 6)
+ALL_DAYS_MASK = 0b1111111
+
+# Đêm thứ 6 và thứ 7 tính theo weekend_price (nếu phòng có)
+WEEKEND_DAYS = (4, 5)
+
+PRICE_CALENDAR_CACHE_SIZE = 4096
+
+
+class PricingError(ValueError):
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def parse_day_mask(applicable_days):
+    """'0,1,2' -> bitmask; rỗng hoặc không có số hợp lệ thì áp dụng mọi ngày"""
+    mask = 0
+    for value in (applicable_days or '').split(','):
+        value = value.strip()
+        if value.isdigit() and int(value) < 7:
+            mask |= 1 << int(value)
+    return mask or ALL_DAYS_MASK
+
+
+class PromotionRule:
+    """Promotion đã parse sẵn để tính nhiều lần không cần đọc lại chuỗi applicable_days"""
+
+    __slots__ = ('promotion', 'room_id', 'hotel_id', 'discount_type', 'discount_value', 'min_nights', 'day_mask',
+                 'start_day', 'end_day')
+
+    def __init__(self, promotion):
+        self.promotion = promotion
+        self.room_id = promotion.room_id
+        self.hotel_id = promotion.hotel_id
+        self.discount_type = promotion.discount_type
+        self.discount_value = float(promotion.discount_value)
+        self.min_nights = promotion.min_nights or 0
+        self.day_mask = parse_day_mask(promotion.applicable_days)
+        self.start_day = np.datetime64(promotion.start_date.date(), 'D')
+        self.end_day = np.datetime64(promotion.end_date.date(), 'D')
+
+    def night_mask(self, nights, weekdays):
+        """Mảng bool: đêm nào nằm trong thời gian khuyến mãi và đúng ngày áp dụng"""
+        return (((self.day_mask >> weekdays) & 1) == 1) & (nights >= self.start_day) & (nights <= self.end_day)
+
+    def discount(self, nightly_prices, mask, quantity):
+        if self.min_nights and len(nightly_prices) < self.min_nights:
+            return 0
+        if not mask.any():
+            return 0
+        if self.discount_type == 'percentage':
+            # Chỉ giảm trên các đêm được áp dụng
+            return float(nightly_prices[mask].sum()) * quantity * (self.discount_value / 100)
+        return self.discount_value * quantity  # fixed: áp dụng theo từng phòng
+
+
+class PriceCalendar:
+    """Giá từng đêm của phòng theo tháng (base / weekend), cache LRU theo (room, tháng, giá)"""
+
+    _cache = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _build_month(base_price, weekend_price, year, month):
+        first_weekday, days = calendar.monthrange(year, month)
+        weekdays = (first_weekday + np.arange(days)) % 7
+        prices = np.full(days, base_price, dtype=np.float64)
+        if weekend_price:
+            prices[np.isin(weekdays, WEEKEND_DAYS)] = weekend_price
+        return prices
+
+    @staticmethod
+    def month_prices(room, year, month):
+        base_price = float(room.base_price)
+        weekend_price = float(room.weekend_price) if room.weekend_price else None
+        # Giá nằm trong key nên đổi giá phòng là tự có entry mới, không cần xóa cache
+        key = (room.room_id, year, month, base_price, weekend_price)
+        with PriceCalendar._lock:
+            prices = PriceCalendar._cache.get(key)
+            if prices is not None:
+                PriceCalendar._cache.move_to_end(key)
+                return prices
+
+        prices = PriceCalendar._build_month(base_price, weekend_price, year, month)
+        prices.setflags(write=False)
+        with PriceCalendar._lock:
+            PriceCalendar._cache[key] = prices
+            while len(PriceCalendar._cache) > PRICE_CALENDAR_CACHE_SIZE:
+                PriceCalendar._cache.popitem(last=False)
+        return prices
+
+    @staticmethod
+    def nightly_prices(room, check_in, check_out):
+        """Giá từng đêm trong [check_in, check_out): ghép các lát tháng, số lần gọi theo số tháng chứ không theo số đêm"""
+        parts = []
+        day = check_in
+        while day < check_out:
+            days_in_month = calendar.monthrange(day.year, day.month)[1]
+            month_end = day.replace(day=days_in_month) + timedelta(days=1)
+            stop = min(check_out, month_end)
+            parts.append(PriceCalendar.month_prices(room, day.year, day.month)[day.day - 1:day.day - 1 + (stop - day).days])
+            day = stop
+        if not parts:
+            return np.zeros(0, dtype=np.float64)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    @staticmethod
+    def clear():
+        with PriceCalendar._lock:
+            PriceCalendar._cache.clear()
+
+
+class QuoteLine:
+
+    def __init__(self, room, quantity, check_in, nightly_prices):
+        self.room = room
+        self.quantity = quantity
+        self.check_in = check_in
+        self.nightly_prices = nightly_prices
+        self.num_nights = len(nightly_prices)
+        self.subtotal = float(nightly_prices.sum()) * quantity
+        # Giá trung bình mỗi đêm (đêm cuối tuần có thể khác ngày thường)
+        self.price_per_night = round(self.subtotal / quantity / self.num_nights, 2) if self.num_nights else float(room.base_price)
+        self.promotion = None
+        self.promotion_discount = 0
+
+    @property
+    def final_amount(self):
+        return self.subtotal - self.promotion_discount
+
+    def to_detail(self):
+        """Dữ liệu cho BookingDetail"""
+        return {
+            'room_id': self.room.room_id,
+            'quantity': self.quantity,
+            'price_per_night': self.price_per_night,
+            'num_nights': self.num_nights,
+            'subtotal': self.subtotal
+        }
+
+    def to_dict(self):
+        return {
+            'room_id': self.room.room_id,
+            'room_name': self.room.room_name,
+            'quantity': self.quantity,
+            'price_per_night': float(self.price_per_night),
+            'num_nights': self.num_nights,
+            'subtotal': self.subtotal,
+            'nightly_prices': [
+                {'date': (self.check_in + timedelta(days=offset)).isoformat(), 'price': float(price)}
+                for offset, price in enumerate(self.nightly_prices)
+            ],
+            'promotion_discount': self.promotion_discount,
+            'promotion': self.promotion.to_dict() if self.promotion else None
+        }
+
+
+class Quote:
+
+    def __init__(self, hotel_id, check_in, check_out, lines):
+        self.hotel_id = hotel_id
+        self.check_in = check_in
+        self.check_out = check_out
+        self.num_nights = (check_out - check_in).days
+        self.lines = lines
+        self.total_amount = sum(line.subtotal for line in lines)
+        self.promotion_discount = sum(line.promotion_discount for line in lines)
+        self.discount_code = None
+        self.discount_code_amount = 0
+
+    @property
+    def total_after_promotion(self):
+        return self.total_amount - self.promotion_discount
+
+    @property
+    def total_discount(self):
+        return self.promotion_discount + self.discount_code_amount
+
+    @property
+    def final_amount(self):
+        return self.total_after_promotion - self.discount_code_amount
+
+    def booking_details(self):
+        return [line.to_detail() for line in self.lines]
+
+    def to_dict(self):
+        return {
+            'hotel_id': self.hotel_id,
+            'check_in_date': self.check_in.isoformat(),
+            'check_out_date': self.check_out.isoformat(),
+            'num_nights': self.num_nights,
+            'lines': [line.to_dict() for line in self.lines],
+            'total_amount': float(self.total_amount),
+            'promotion_discount': float(self.promotion_discount),
+            'discount_code': self.discount_code.code if self.discount_code else None,
+            'discount_code_amount': float(self.discount_code_amount),
+            'total_discount': float(self.total_discount),
+            'final_amount': float(self.final_amount)
+        }
+
+
+class PriceBook:
+    """Phòng và promotion đã nạp sẵn cho một khoảng ngày để báo giá trong memory.
+
+    hotel_id=None khi nạp cho nhiều khách sạn (trang tìm kiếm).
+    """
+
+    def __init__(self, hotel_id, check_in, check_out, rooms, promotions):
+        self.hotel_id = hotel_id
+        self.check_in = check_in
+        self.check_out = check_out
+        self.num_nights = (check_out - check_in).days
+        self.rooms = {room.room_id: room for room in rooms}
+        self.nights = np.arange(np.datetime64(check_in, 'D'), np.datetime64(check_out, 'D'))
+        # 1970-01-01 là thứ 5 (weekday 3)
+        self.weekdays = (self.nights.astype(np.int64) + 3) % 7
+        self._hotel_rules = {}
+        self._room_rules = {}
+        self._masks = {}
+        for promotion in promotions:
+            rule = PromotionRule(promotion)
+            if rule.room_id is None:
+                self._hotel_rules.setdefault(rule.hotel_id, []).append(rule)
+            else:
+                self._room_rules.setdefault(rule.room_id, []).append(rule)
+
+    def rules_for(self, room):
+        return self._room_rules.get(room.room_id, []) + self._hotel_rules.get(room.hotel_id, [])
+
+    def _mask(self, rule):
+        mask = self._masks.get(id(rule))
+        if mask is None:
+            mask = rule.night_mask(self.nights, self.weekdays)
+            self._masks[id(rule)] = mask
+        return mask
+
+    def price_line(self, room, quantity):
+        line = QuoteLine(room, quantity, self.check_in, PriceCalendar.nightly_prices(room, self.check_in, self.check_out))
+        # Chọn promotion giảm nhiều nhất cho từng dòng phòng
+        for rule in self.rules_for(room):
+            discount = rule.discount(line.nightly_prices, self._mask(rule), quantity)
+            if discount > line.promotion_discount:
+                line.promotion_discount = discount
+                line.promotion = rule.promotion
+        return line
+
+    def quote(self, lines):
+        """lines: list (room_id, quantity); raise PricingError nếu phòng không hợp lệ"""
+        quote_lines = []
+        for room_id, quantity in lines:
+            room = self.rooms.get(room_id)
+            if not room:
+                raise PricingError(f'Không tìm thấy phòng ID {room_id}', 404)
+            if self.hotel_id is not None and room.hotel_id != self.hotel_id:
+                raise PricingError('Phòng không thuộc khách sạn này', 400)
+            quote_lines.append(self.price_line(room, quantity))
+
+        return Quote(self.hotel_id, self.check_in, self.check_out, quote_lines)
+
+    def cheapest_by_hotel(self):
+        """{hotel_id: QuoteLine rẻ nhất (1 phòng, đã trừ khuyến mãi)}"""
+        cheapest = {}
+        for room in self.rooms.values():
+            line = self.price_line(room, 1)
+            current = cheapest.get(room.hotel_id)
+            if current is None or line.final_amount < current.final_amount:
+                cheapest[room.hotel_id] = line
+        return cheapest
+
+
+class PricingEngine:
+
+    @staticmethod
+    def load(hotel_id, room_ids, check_in, check_out):
+        """2 query: các phòng được yêu cầu và promotion còn hiệu lực trong khoảng ngày (theo phòng hoặc cả khách sạn)"""
+        room_ids = list({room_id for room_id in room_ids if room_id is not None})
+        rooms = Room.query.filter(Room.room_id.in_(room_ids)).all() if room_ids else []
+
+        check_in_datetime = datetime.combine(check_in, datetime.min.time())
+        check_out_datetime = datetime.combine(check_out, datetime.min.time())
+        scope = and_(Promotion.hotel_id == hotel_id, Promotion.room_id.is_(None))
+        if room_ids:
+            scope = or_(Promotion.room_id.in_(room_ids), scope)
+        promotions = Promotion.query.filter(
+            Promotion.is_active == True,
+            Promotion.start_date <= check_out_datetime,
+            Promotion.end_date >= check_in_datetime,
+            scope
+        ).all()
+
+        return PriceBook(hotel_id, check_in, check_out, rooms, promotions)
+
+    @staticmethod
+    def load_for_hotels(hotel_ids, check_in, check_out, num_guests=None):
+        """Nạp phòng còn trống cả kỳ và promotion của nhiều khách sạn (3 query) để tính giá cả kỳ ở trang tìm kiếm"""
+        hotel_ids = list({hotel_id for hotel_id in hotel_ids if hotel_id is not None})
+        if not hotel_ids:
+            return PriceBook(None, check_in, check_out, [], [])
+
+        room_query = Room.query.filter(Room.hotel_id.in_(hotel_ids), Room.status == 'available')
+        if num_guests:
+            room_query = room_query.filter(Room.max_guests >= num_guests)
+        rooms = room_query.all()
+        # Bỏ phòng đã kín trong kỳ để giá báo ra là giá đặt được thật
+        if rooms:
+            available_ids = set(AvailabilityEngine.load(rooms, check_in, check_out).available_room_ids())
+            rooms = [room for room in rooms if room.room_id in available_ids]
+
+        check_in_datetime = datetime.combine(check_in, datetime.min.time())
+        check_out_datetime = datetime.combine(check_out, datetime.min.time())
+        promotions = Promotion.query.filter(
+            Promotion.is_active == True,
+            Promotion.start_date <= check_out_datetime,
+            Promotion.end_date >= check_in_datetime,
+            Promotion.hotel_id.in_(hotel_ids)
+        ).all()
+
+        return PriceBook(None, check_in, check_out, rooms, promotions)
+
+    @staticmethod
+    def stay_prices(hotel_ids, check_in, check_out, num_guests=None):
+        """{hotel_id: {'stay_total', 'nightly_price', 'num_nights'}} theo phòng rẻ nhất còn trống, cùng cách tính với lúc đặt phòng"""
+        price_book = PricingEngine.load_for_hotels(hotel_ids, check_in, check_out, num_guests)
+        return {
+            hotel_id: {
+                'stay_total': line.final_amount,
+                'nightly_price': line.final_amount / line.num_nights,
+                'num_nights': line.num_nights
+            }
+            for hotel_id, line in price_book.cheapest_by_hotel().items()
+        }
+
+    @staticmethod
+    def quote(hotel_id, lines, check_in, check_out, discount_code=None, now=None):
+        """Báo giá cho nhiều dòng phòng (room_id, quantity), có thể kèm mã giảm giá"""
+        lines = list(lines)
+        price_book = PricingEngine.load(hotel_id, [room_id for room_id, _ in lines], check_in, check_out)
+        quote = price_book.quote(lines)
+        if discount_code:
+            PricingEngine.apply_discount_code(quote, discount_code, now)
+        return quote
+
+    @staticmethod
+    def apply_discount_code(quote, code, now=None):
+        """Áp dụng mã giảm giá sau promotion; mã hết hạn / chưa đủ điều kiện thì bỏ qua như trước"""
+        discount_code = DiscountCode.query.filter_by(code=code, is_active=True).first()
+        if not discount_code:
+            return quote
+
+        hotel = Hotel.query.get(quote.hotel_id)
+        if not hotel:
+            raise PricingError('Không tìm thấy khách sạn', 404)
+        if hotel.owner_id != discount_code.owner_id:
+            raise PricingError('Mã giảm giá không áp dụng cho khách sạn này', 400)
+
+        now = now or datetime.utcnow()
+        if not (discount_code.start_date <= now <= discount_code.end_date):
+            return quote
+        total = quote.total_after_promotion
+        if total < (discount_code.min_order_amount or 0):
+            return quote
+        if discount_code.usage_limit and discount_code.used_count >= discount_code.usage_limit:
+            return quote
+
+        if discount_code.discount_type == 'percentage':
+            amount = total * (float(discount_code.discount_value) / 100)
+        else:
+            amount = float(discount_code.discount_value)
+        if discount_code.max_discount_amount:
+            amount = min(amount, float(discount_code.max_discount_amount))
+
+        quote.discount_code = discount_code
+        quote.discount_code_amount = amount
+        return quote
@@ -0,0 +1,255 @@
+from app import db
+from app.models.hotel import Hotel
+from app.models.hotel_image import HotelImage
+from app.models.hotel_amenity import hotel_amenities
+from app.models.room import Room
+from app.models.review import Review
+from app.models.cancellation_policy import CancellationPolicy
+from app.models.promotion import Promotion
+from app.models.hotel_search_summary import HotelSearchSummary
+from app.models.background_job import BackgroundJob
+from app.services.cache_service import CacheService, TAG_HOTELS
+from app.services.hotel_card_service import HotelCardService
+from app.services.job_queue import JobQueue
+from datetime import datetime, timedelta
+from itertools import chain
+from sqlalchemy import event, func, case
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history, PASSIVE_NO_INITIALIZE
+
+# Các model mà khi thay đổi cần tính lại summary của khách sạn tương ứng
+TRACKED_MODELS = (Hotel, Room, Review, CancellationPolicy, Promotion, HotelImage)
+
+DIRTY_KEY = 'search_summary_dirty_hotels'
+PROMOTIONS_CHANGED_KEY = 'search_summary_promotions_changed'
+REFRESH_EXPIRED_TASK = 'search_summary_refresh_expired'
+# Job hẹn lại không sớm hơn khoảng này, tránh vòng lặp chạy liên tục khi mốc cũ vẫn còn
+MIN_REFRESH_DELAY_SECONDS = 60
+
+
+class SearchSummaryService:
+
+    @staticmethod
+    def compute(hotel_ids, now=None, session=None):
+        """Tính giá trị các cột summary cho danh sách khách sạn (4 query cho cả danh sách)"""
+        now = now or datetime.utcnow()
+        session = session or db.session
+
+        stats = HotelCardService.aggregate_stats(hotel_ids, now=now, session=session)
+        if not stats:
+            return {}
+        ids = list(stats.keys())
+
+        # Ảnh đại diện: ưu tiên is_primary, sau đó theo display_order
+        primary_images = {}
+        images = session.query(HotelImage.hotel_id, HotelImage.image_url).filter(
+            HotelImage.hotel_id.in_(ids)
+        ).order_by(
+            HotelImage.hotel_id,
+            HotelImage.is_primary.desc(),
+            HotelImage.display_order,
+            HotelImage.image_id
+        ).all()
+        for hotel_id, image_url in images:
+            primary_images.setdefault(hotel_id, image_url)
+
+        amenity_sets = {}
+        amenity_rows = session.query(hotel_amenities.c.hotel_id, hotel_amenities.c.amenity_id).filter(
+            hotel_amenities.c.hotel_id.in_(ids)
+        ).all()
+        for hotel_id, amenity_id in amenity_rows:
+            amenity_sets.setdefault(hotel_id, set()).add(amenity_id)
+
+        # Mốc khuyến mãi gần nhất bắt đầu hoặc kết thúc -> summary hết hạn tại mốc đó
+        boundaries = session.query(
+            Promotion.hotel_id,
+            func.min(case((Promotion.start_date > now, Promotion.start_date))),
+            func.min(case((Promotion.end_date >= now, Promotion.end_date)))
+        ).filter(
+            Promotion.hotel_id.in_(ids),
+            Promotion.is_active == True,
+            Promotion.end_date >= now
+        ).group_by(Promotion.hotel_id).all()
+        expires = {}
+        for hotel_id, next_start, next_end in boundaries:
+            candidates = [value for value in (next_start, next_end) if value is not None]
+            expires[hotel_id] = min(candidates) if candidates else None
+
+        values = {}
+        for hotel_id, raw in stats.items():
+            amenity_ids = sorted(amenity_sets.get(hotel_id, ()))
+            values[hotel_id] = {
+                'min_price': raw['min_price'],
+                'max_price': raw['max_price'],
+                'review_count': raw['review_count'],
+                'avg_rating': round(raw['avg_rating'], 2),
+                'has_free_cancellation': raw['has_free_cancellation'],
+                'has_active_promotion': raw['has_active_promotion'],
+                'primary_image_url': primary_images.get(hotel_id),
+                'amenity_ids': ',' + ''.join(f'{amenity_id},' for amenity_id in amenity_ids),
+                'expires_at': expires.get(hotel_id),
+                'updated_at': now
+            }
+        return values
+
+    @staticmethod
+    def refresh(hotel_ids, now=None, session=None):
+        """Ghi lại summary cho các khách sạn, xóa summary của khách sạn không còn tồn tại. Không commit."""
+        hotel_ids = {hid for hid in hotel_ids if hid is not None}
+        if not hotel_ids:
+            return 0
+
+        session = session or db.session
+        values = SearchSummaryService.compute(hotel_ids, now=now, session=session)
+
+        existing = {
+            summary.hotel_id: summary
+            for summary in session.query(HotelSearchSummary).filter(
+                HotelSearchSummary.hotel_id.in_(hotel_ids)
+            ).all()
+        }
+
+        for hotel_id, columns in values.items():
+            summary = existing.get(hotel_id)
+            if summary is None:
+                summary = HotelSearchSummary(hotel_id=hotel_id)
+                session.add(summary)
+            for key, value in columns.items():
+                setattr(summary, key, value)
+
+        for hotel_id, summary in existing.items():
+            if hotel_id not in values:
+                session.delete(summary)
+
+        return len(values)
+
+    @staticmethod
+    def refresh_expired(now=None):
+        """Tính lại các summary đã qua mốc khuyến mãi (bắt đầu/kết thúc); lỗi được raise để job thử lại với backoff"""
+        now = now or datetime.utcnow()
+        try:
+            expired_ids = [
+                hotel_id for (hotel_id,) in db.session.query(HotelSearchSummary.hotel_id).filter(
+                    HotelSearchSummary.expires_at <= now
+                ).all()
+            ]
+            if not expired_ids:
+                return 0
+            count = SearchSummaryService.refresh(expired_ids, now=now)
+            db.session.commit()
+            return count
+        except Exception:
+            db.session.rollback()
+            raise
+
+    @staticmethod
+    def rebuild_all(batch_size=500):
+        """Tính lại toàn bộ bảng summary theo từng lô khách sạn"""
+        total = 0
+        last_id = 0
+        while True:
+            hotel_ids = [
+                hotel_id for (hotel_id,) in db.session.query(Hotel.hotel_id).filter(
+                    Hotel.hotel_id > last_id
+                ).order_by(Hotel.hotel_id).limit(batch_size).all()
+            ]
+            if not hotel_ids:
+                break
+            total += SearchSummaryService.refresh(hotel_ids)
+            db.session.commit()
+            last_id = hotel_ids[-1]
+
+        # Dọn summary mồ côi (khách sạn đã bị xóa khi DB không bật cascade)
+        orphan_ids = [
+            hotel_id for (hotel_id,) in db.session.query(HotelSearchSummary.hotel_id).outerjoin(
+                Hotel, Hotel.hotel_id == HotelSearchSummary.hotel_id
+            ).filter(Hotel.hotel_id.is_(None)).all()
+        ]
+        if orphan_ids:
+            HotelSearchSummary.query.filter(
+                HotelSearchSummary.hotel_id.in_(orphan_ids)
+            ).delete(synchronize_session=False)
+            db.session.commit()
+        SearchSummaryService.schedule_refresh_expired()
+        return total
+
+    @staticmethod
+    def schedule_refresh_expired(session=None, commit=True):
+        """Hẹn job làm mới summary vào mốc khuyến mãi gần nhất (expires_at nhỏ nhất, trễ ít nhất MIN_REFRESH_DELAY_SECONDS); đã có job sớm hơn thì thôi"""
+        session = session or db.session
+        next_at = session.query(func.min(HotelSearchSummary.expires_at)).scalar()
+        if next_at is None:
+            return None
+
+        job = session.query(BackgroundJob).filter(
+            BackgroundJob.task == REFRESH_EXPIRED_TASK,
+            BackgroundJob.status == 'pending'
+        ).order_by(BackgroundJob.run_at).first()
+        run_at = max(next_at, datetime.utcnow() + timedelta(seconds=MIN_REFRESH_DELAY_SECONDS))
+        if job is not None:
+            if job.run_at > run_at:
+                job.run_at = run_at
+        else:
+            delay = (run_at - datetime.utcnow()).total_seconds()
+            job = JobQueue.enqueue(REFRESH_EXPIRED_TASK, delay=delay, commit=False)
+        if commit:
+            session.commit()
+        return job
+
+    @staticmethod
+    @JobQueue.task(REFRESH_EXPIRED_TASK, max_attempts=3)
+    def run_refresh_expired(payload):
+        count = SearchSummaryService.refresh_expired()
+        if count:
+            # Card trang chủ / danh sách đọc cờ khuyến mãi từ summary
+            CacheService.invalidate(TAG_HOTELS)
+        SearchSummaryService.schedule_refresh_expired()
+
+    @staticmethod
+    def _hotel_ids_of(obj):
+        attr = 'hotel_id'
+        history = get_history(obj, attr, passive=PASSIVE_NO_INITIALIZE)
+        values = list(chain(history.added or (), history.unchanged or (), history.deleted or ()))
+        if not values:
+            value = obj.__dict__.get(attr)
+            values = [value] if value is not None else []
+        return {value for value in values if value is not None}
+
+    @staticmethod
+    def _collect_dirty_hotels(session, flush_context):
+        dirty = session.info.setdefault(DIRTY_KEY, set())
+        for obj in chain(session.new, session.dirty, session.deleted):
+            if isinstance(obj, TRACKED_MODELS):
+                dirty.update(SearchSummaryService._hotel_ids_of(obj))
+                if isinstance(obj, Promotion):
+                    session.info[PROMOTIONS_CHANGED_KEY] = True
+
+    @staticmethod
+    def _refresh_before_commit(session):
+        # before_commit chạy trước lần flush cuối của commit, flush trước để after_flush gom đủ hotel_id
+        session.flush()
+        if not session.info.get(DIRTY_KEY):
+            return
+        hotel_ids = session.info.pop(DIRTY_KEY, set())
+        SearchSummaryService.refresh(hotel_ids, session=session)
+        if session.info.pop(PROMOTIONS_CHANGED_KEY, False):
+            # Mốc bắt đầu / kết thúc khuyến mãi có thể đã đổi: hẹn lại job làm mới, đi cùng transaction này
+            session.flush()
+            SearchSummaryService.schedule_refresh_expired(session=session, commit=False)
+
+    @staticmethod
+    def _discard_dirty_hotels(session, previous_transaction):
+        session.info.pop(DIRTY_KEY, None)
+        session.info.pop(PROMOTIONS_CHANGED_KEY, None)
+
+    @staticmethod
+    def register_hooks():
+        """Đăng ký event để cập nhật hotel_search_summary ngay trong transaction ghi dữ liệu"""
+        hooks = (
+            ('after_flush', SearchSummaryService._collect_dirty_hotels),
+            ('before_commit', SearchSummaryService._refresh_before_commit),
+            ('after_soft_rollback', SearchSummaryService._discard_dirty_hotels),
+        )
+        for name, handler in hooks:
+            if not event.contains(Session, name, handler):
+                event.listen(Session, name, handler)
@@ -0,0 +1,222 @@
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+
+from flask import current_app
+from sqlalchemy import event, false, text
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.hotel import Hotel
+
+DEFAULT_INDEX_TTL = 300
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Tăng mỗi khi có commit thay đổi Hotel, index trong process so sánh để biết cần build lại
+_catalog_version = 0
+_HOTEL_CHANGED_KEY = 'text_search_hotel_changed'
+
+
+def fold_vietnamese(value):
+    """Bỏ dấu tiếng Việt và đưa về chữ thường: 'Đà Lạt' -> 'da lat'"""
+    if not value:
+        return ''
+    value = value.replace('đ', 'd').replace('Đ', 'D')
+    decomposed = unicodedata.normalize('NFD', value)
+    stripped = ''.join(ch for ch in decomposed if unicodedata.category(ch) != 'Mn')
+    return ' '.join(stripped.lower().split())
+
+
+def tokenize(value):
+    return _TOKEN_RE.findall(fold_vietnamese(value))
+
+
+def build_search_text(hotel):
+    return fold_vietnamese(' '.join(part for part in (hotel.hotel_name, hotel.city, hotel.address) if part))
+
+
+class InMemoryTextIndex:
+    """Inverted index token -> tập id; token cuối của truy vấn được so khớp theo tiền tố"""
+
+    def __init__(self):
+        # (postings, tokens đã sắp xếp) được thay cùng lúc bằng một phép gán để luồng đọc không thấy nửa cũ nửa mới
+        self._data = ({}, [])
+
+    def build(self, documents):
+        postings = {}
+        for doc_id, value in documents:
+            for token in set(tokenize(value)):
+                postings.setdefault(token, set()).add(doc_id)
+        self._data = (postings, sorted(postings))
+
+    @staticmethod
+    def _prefix_matches(data, prefix):
+        postings, tokens = data
+        matched = set()
+        index = bisect_left(tokens, prefix)
+        while index < len(tokens) and tokens[index].startswith(prefix):
+            matched |= postings[tokens[index]]
+            index += 1
+        return matched
+
+    def search(self, query_text):
+        tokens = tokenize(query_text)
+        if not tokens:
+            return set()
+
+        # Đọc một bản chụp: build() chạy đồng thời không làm lẫn index cũ và mới
+        data = self._data
+        result = None
+        for position, token in enumerate(tokens):
+            if position == len(tokens) - 1:
+                matched = InMemoryTextIndex._prefix_matches(data, token)
+            else:
+                matched = data[0].get(token, set())
+            result = matched if result is None else result & matched
+            if not result:
+                return set()
+        return result
+
+
+class MemoryTextSearchBackend:
+    """Fallback chạy được trên mọi DB: index toàn bộ khách sạn active trong process"""
+    name = 'memory'
+
+    def __init__(self, ttl=DEFAULT_INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._version = None
+        self._built_at = 0
+        self.destinations = InMemoryTextIndex()
+
+    def _ensure_fresh(self):
+        # TTL để các worker khác cũng nhận thay đổi dù không thấy commit
+        if self._version == _catalog_version and time.monotonic() - self._built_at < self.ttl:
+            return
+        with self._lock:
+            if self._version == _catalog_version and time.monotonic() - self._built_at < self.ttl:
+                return
+            version = _catalog_version
+            rows = db.session.query(
+                Hotel.hotel_id, Hotel.hotel_name, Hotel.city, Hotel.address
+            ).filter(Hotel.status == 'active').all()
+
+            self.destinations.build(
+                (hotel_id, f'{hotel_name} {city} {address}') for hotel_id, hotel_name, city, address in rows
+            )
+            self._version = version
+            self._built_at = time.monotonic()
+
+    def destination_clause(self, query_text):
+        self._ensure_fresh()
+        hotel_ids = self.destinations.search(query_text)
+        if not hotel_ids:
+            return false()
+        return Hotel.hotel_id.in_(sorted(hotel_ids))
+
+
+class MySQLFulltextBackend(MemoryTextSearchBackend):
+    """FULLTEXT (ngram) trên cột hotels.search_text đã bỏ dấu; danh sách thành phố nhỏ nên vẫn giữ trong memory"""
+    name = 'mysql'
+
+    # ngram_token_size mặc định của MySQL là 2, chuỗi ngắn hơn không dùng được FULLTEXT
+    MIN_FULLTEXT_LENGTH = 2
+
+    def destination_clause(self, query_text):
+        folded = fold_vietnamese(query_text).replace('"', ' ').strip()
+        if not folded:
+            return false()
+        if len(folded) < self.MIN_FULLTEXT_LENGTH:
+            return Hotel.search_text.like(f'%{folded}%')
+        return text('MATCH (hotels.search_text) AGAINST (:ft_query IN BOOLEAN MODE)').bindparams(
+            ft_query=f'"{folded}"'
+        )
+
+
+class TextSearchService:
+
+    @staticmethod
+    def get_backend():
+        """Backend theo config TEXT_SEARCH_BACKEND: auto (MySQL -> FULLTEXT, còn lại memory), mysql, memory"""
+        backend = current_app.extensions.get('text_search')
+        if backend is not None:
+            return backend
+
+        choice = (current_app.config.get('TEXT_SEARCH_BACKEND') or 'auto').lower()
+        ttl = current_app.config.get('TEXT_SEARCH_INDEX_TTL', DEFAULT_INDEX_TTL)
+        if choice == 'auto':
+            choice = 'mysql' if db.engine.dialect.name == 'mysql' else 'memory'
+
+        backend = MySQLFulltextBackend(ttl) if choice == 'mysql' else MemoryTextSearchBackend(ttl)
+        current_app.extensions['text_search'] = backend
+        return backend
+
+    @staticmethod
+    def destination_clause(query_text):
+        """Điều kiện lọc Hotel theo tên/thành phố/địa chỉ, không phân biệt dấu"""
+        return TextSearchService.get_backend().destination_clause(query_text)
+
+    @staticmethod
+    def mark_stale():
+        global _catalog_version
+        _catalog_version += 1
+
+    @staticmethod
+    def rebuild_search_text(batch_size=500):
+        """Ghi lại cột hotels.search_text cho toàn bộ khách sạn (migration đã điền sẵn, dùng khi cần sửa dữ liệu)"""
+        total = 0
+        last_id = 0
+        while True:
+            hotels = Hotel.query.filter(Hotel.hotel_id > last_id).order_by(Hotel.hotel_id).limit(batch_size).all()
+            if not hotels:
+                break
+            for hotel in hotels:
+                hotel.search_text = build_search_text(hotel)
+            db.session.commit()
+            total += len(hotels)
+            last_id = hotels[-1].hotel_id
+        TextSearchService.mark_stale()
+        return total
+
+    @staticmethod
+    def _set_search_text(mapper, connection, hotel):
+        hotel.search_text = build_search_text(hotel)
+
+    @staticmethod
+    def _collect_hotel_changes(session, flush_context):
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, Hotel):
+                session.info[_HOTEL_CHANGED_KEY] = True
+                return
+
+    @staticmethod
+    def _after_commit(session):
+        if session.info.pop(_HOTEL_CHANGED_KEY, False):
+            TextSearchService.mark_stale()
+
+    @staticmethod
+    def _after_rollback(session, previous_transaction):
+        session.info.pop(_HOTEL_CHANGED_KEY, None)
+
+    @staticmethod
+    def register_hooks():
+        """Giữ search_text đồng bộ khi ghi Hotel và đánh dấu index trong memory cần build lại"""
+        mapper_hooks = (
+            ('before_insert', TextSearchService._set_search_text),
+            ('before_update', TextSearchService._set_search_text),
+        )
+        for name, handler in mapper_hooks:
+            if not event.contains(Hotel, name, handler):
+                event.listen(Hotel, name, handler)
+
+        session_hooks = (
+            ('after_flush', TextSearchService._collect_hotel_changes),
+            ('after_commit', TextSearchService._after_commit),
+            ('after_soft_rollback', TextSearchService._after_rollback),
+        )
+        for name, handler in session_hooks:
+            if not event.contains(Session, name, handler):
+                event.listen(Session, name, handler)
@@ -0,0 +1,426 @@
+"""
+VECTOR INDEXER - Đồng bộ vector DB (Chroma) của chatbot với dữ liệu phòng
+
+- Mỗi phòng là một document id h{hotel_id}_r{room_id}
+- Hash nội dung lưu trong metadata: document không đổi thì không embed lại
+- sync(): chỉ upsert phòng mới / thay đổi và xóa phòng không còn hiển thị
+- rebuild(): dựng collection mới rồi mới chuyển con trỏ ACTIVE sang, chatbot không lúc nào thấy index rỗng
+- Collection ghi model embedding đã dùng; đổi model thì sync() từ chối, phải rebuild()
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from flask import current_app
+
+CHROMA_DIR = "./chroma_db"
+ACTIVE_FILE = "ACTIVE"
+# Tên collection mặc định của langchain Chroma (index tạo bởi bản cũ)
+DEFAULT_COLLECTION = "langchain"
+COLLECTION_PREFIX = "hotel_rooms_"
+# Metadata collection ghi model embedding đã dùng; index cũ không có thì là model OpenAI trước đây
+COLLECTION_MODEL_KEY = "embedding_model"
+LEGACY_MODEL_ID = "openai:text-embedding-3-small"
+EMBED_BATCH_SIZE = 100
+ROOM_PAGE_SIZE = 1000
+PROGRESS_LOG_SECONDS = 10
+
+
+def read_active_collection(persist_dir: str = CHROMA_DIR) -> str:
+    try:
+        with open(os.path.join(persist_dir, ACTIVE_FILE), encoding="utf-8") as handle:
+            return handle.read().strip() or DEFAULT_COLLECTION
+    except FileNotFoundError:
+        return DEFAULT_COLLECTION
+
+
+def document_id(hotel_id: int, room_id: int) -> str:
+    return f"h{hotel_id}_r{room_id}"
+
+
+def content_hash(text: str, metadata: dict) -> str:
+    payload = text + "\n" + json.dumps(metadata, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RoomDocument:
+    __slots__ = ("id", "text", "metadata", "hash")
+
+    def __init__(self, doc_id: str, text: str, metadata: dict):
+        # Chroma chỉ nhận metadata kiểu str/int/float/bool
+        metadata = {key: value for key, value in metadata.items() if value is not None}
+        self.id = doc_id
+        self.text = text
+        self.hash = content_hash(text, metadata)
+        self.metadata = dict(metadata, content_hash=self.hash)
+
+
+def format_room_document(row, hotel_amenities, room_amenities, avg_rating) -> RoomDocument:
+    """row: dòng có các cột hotel_id, hotel_name, star_rating, city, address, room_id, room_name,
+    base_price, weekend_price, max_guests, area, type_name"""
+    base_price = float(row.base_price or 0)
+    weekend_price = float(row.weekend_price) if row.weekend_price is not None else base_price
+    area_text = f"{float(row.area):g}" if row.area is not None else "N/A"
+
+    text = f"""
+🏨 {row.hotel_name}
+⭐ {row.star_rating} sao | 📊 {avg_rating:.1f}/5
+📍 {row.city}, {row.address}
+
+🛏️ {row.type_name} - {row.room_name}
+💰 Giá: {base_price:,.0f}đ (thường) / {weekend_price:,.0f}đ (cuối tuần)
+👥 Tối đa {row.max_guests} người
+📏 {area_text}m²
+
+✨ Tiện nghi khách sạn: {", ".join(hotel_amenities) or "Không có"}
+✨ Tiện nghi phòng: {", ".join(room_amenities) or "Không có"}
+    """.strip()
+
+    metadata = {
+        "hotel_id": row.hotel_id,
+        "hotel_name": row.hotel_name,
+        "city": row.city,
+        "room_id": row.room_id,
+        "room_name": row.room_name,
+        "base_price": base_price,
+        "max_guests": row.max_guests,
+    }
+    return RoomDocument(document_id(row.hotel_id, row.room_id), text, metadata)
+
+
+def iter_batches(items: Iterable, batch_size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class RoomDocumentBuilder:
+    """Dựng document theo trang phòng (keyset theo room_id), bộ nhớ chỉ phụ thuộc kích thước trang.
+
+    Tiện nghi khách sạn và điểm trung bình nạp một lần cho các khách sạn active (2 query gộp),
+    tiện nghi phòng nạp theo từng trang (1 query gộp / trang) thay vì 3 query cho mỗi phòng.
+    """
+
+    @staticmethod
+    def _hotel_lookups(hotel_ids):
+        from sqlalchemy import func
+
+        from app import db
+        from app.models.amenity import Amenity
+        from app.models.hotel import Hotel
+        from app.models.hotel_amenity import hotel_amenities
+        from app.models.review import Review
+
+        amenity_query = (
+            db.session.query(hotel_amenities.c.hotel_id, Amenity.amenity_name)
+            .join(Amenity, Amenity.amenity_id == hotel_amenities.c.amenity_id)
+            .join(Hotel, Hotel.hotel_id == hotel_amenities.c.hotel_id)
+            .filter(Hotel.status == "active")
+            .order_by(hotel_amenities.c.hotel_id, Amenity.amenity_id)
+        )
+        rating_query = (
+            db.session.query(Review.hotel_id, func.avg(Review.rating))
+            .join(Hotel, Hotel.hotel_id == Review.hotel_id)
+            .filter(Hotel.status == "active")
+            .group_by(Review.hotel_id)
+        )
+        if hotel_ids is not None:
+            amenity_query = amenity_query.filter(hotel_amenities.c.hotel_id.in_(hotel_ids))
+            rating_query = rating_query.filter(Review.hotel_id.in_(hotel_ids))
+
+        amenities_by_hotel = {}
+        for hotel_id, amenity_name in amenity_query:
+            amenities_by_hotel.setdefault(hotel_id, []).append(amenity_name)
+        ratings = {hotel_id: float(avg or 0) for hotel_id, avg in rating_query}
+        return amenities_by_hotel, ratings
+
+    @staticmethod
+    def _room_amenities(room_ids):
+        from app import db
+        from app.models.amenity import Amenity
+        from app.models.room_amenity import room_amenities
+
+        amenities_by_room = {}
+        rows = (
+            db.session.query(room_amenities.c.room_id, Amenity.amenity_name)
+            .join(Amenity, Amenity.amenity_id == room_amenities.c.amenity_id)
+            .filter(room_amenities.c.room_id.in_(room_ids))
+            .order_by(room_amenities.c.room_id, Amenity.amenity_id)
+        )
+        for room_id, amenity_name in rows:
+            amenities_by_room.setdefault(room_id, []).append(amenity_name)
+        return amenities_by_room
+
+    @staticmethod
+    def iter_documents(hotel_ids: Optional[Iterable[int]] = None, page_size: int = ROOM_PAGE_SIZE) -> Iterator[RoomDocument]:
+        """Document cho các phòng available của khách sạn active (lọc theo hotel_ids nếu có)"""
+        from app import db
+        from app.models.hotel import Hotel
+        from app.models.room import Room
+        from app.models.room_type import RoomType
+
+        if hotel_ids is not None:
+            hotel_ids = list(hotel_ids)
+        amenities_by_hotel, ratings = RoomDocumentBuilder._hotel_lookups(hotel_ids)
+
+        # Chỉ lấy cột cần dùng: không tạo object ORM, identity map không phình theo số phòng
+        query = (
+            db.session.query(
+                Hotel.hotel_id,
+                Hotel.hotel_name,
+                Hotel.star_rating,
+                Hotel.city,
+                Hotel.address,
+                Room.room_id,
+                Room.room_name,
+                Room.base_price,
+                Room.weekend_price,
+                Room.max_guests,
+                Room.area,
+                RoomType.type_name,
+            )
+            .join(Room, Hotel.hotel_id == Room.hotel_id)
+            .join(RoomType, Room.room_type_id == RoomType.type_id)
+            .filter(
+                Hotel.status == "active",
+                Room.status == "available",
+            )
+        )
+        if hotel_ids is not None:
+            query = query.filter(Hotel.hotel_id.in_(hotel_ids))
+
+        last_room_id = 0
+        while True:
+            rows = query.filter(Room.room_id > last_room_id).order_by(Room.room_id).limit(page_size).all()
+            if not rows:
+                break
+            amenities_by_room = RoomDocumentBuilder._room_amenities([row.room_id for row in rows])
+            for row in rows:
+                yield format_room_document(
+                    row,
+                    amenities_by_hotel.get(row.hotel_id, []),
+                    amenities_by_room.get(row.room_id, []),
+                    ratings.get(row.hotel_id, 0.0),
+                )
+            last_room_id = rows[-1].room_id
+
+
+class VectorIndexer:
+    """Ghi document vào Chroma theo lô; embeddings là object có embed_documents (OpenAIEmbeddings...)"""
+
+    def __init__(
+        self,
+        embeddings,
+        persist_dir: str = CHROMA_DIR,
+        batch_size: Optional[int] = None,
+        model_id: Optional[str] = None,
+    ):
+        import chromadb
+
+        self.embeddings = embeddings
+        # None: không kiểm tra model của collection
+        self.model_id = model_id or getattr(embeddings, "model_id", None)
+        self.persist_dir = persist_dir
+        if batch_size is None:
+            batch_size = current_app.config.get("VECTOR_EMBED_BATCH_SIZE", EMBED_BATCH_SIZE)
+        self.batch_size = batch_size
+        os.makedirs(persist_dir, exist_ok=True)
+        self.client = chromadb.PersistentClient(path=persist_dir)
+
+    # ---- collection đang dùng ----
+
+    def _active_path(self) -> str:
+        return os.path.join(self.persist_dir, ACTIVE_FILE)
+
+    def active_collection_name(self) -> str:
+        return read_active_collection(self.persist_dir)
+
+    def _set_active(self, name: str):
+        # Ghi file tạm rồi os.replace: process khác đọc ACTIVE luôn thấy tên cũ hoặc tên mới đầy đủ
+        tmp_path = self._active_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            handle.write(name)
+        os.replace(tmp_path, self._active_path())
+
+    def _collection_names(self) -> List[str]:
+        return [getattr(item, "name", item) for item in self.client.list_collections()]
+
+    def _collection_metadata(self) -> Optional[dict]:
+        return {COLLECTION_MODEL_KEY: self.model_id} if self.model_id else None
+
+    @staticmethod
+    def collection_model(collection) -> str:
+        return (collection.metadata or {}).get(COLLECTION_MODEL_KEY, LEGACY_MODEL_ID)
+
+    def _model_matches(self, collection) -> bool:
+        return self.model_id is None or self.collection_model(collection) == self.model_id
+
+    def open_store(self):
+        """langchain Chroma trên collection đang dùng, None nếu chưa có index hoặc index dựng bằng model khác"""
+        from langchain_community.vectorstores import Chroma
+
+        name = self.active_collection_name()
+        if name not in self._collection_names():
+            return None
+        collection = self.client.get_collection(name)
+        if not self._model_matches(collection):
+            current_app.logger.warning(
+                f"Vector DB {name} dùng {self.collection_model(collection)}, đang cấu hình {self.model_id}: "
+                "cần dựng lại index (flask sync-vector-index --full)"
+            )
+            return None
+        return Chroma(client=self.client, collection_name=name, embedding_function=self.embeddings)
+
+    # ---- ghi ----
+
+    def _upsert(self, collection, documents: List[RoomDocument]):
+        if not documents:
+            return
+        vectors = self.embeddings.embed_documents([doc.text for doc in documents])
+        collection.upsert(
+            ids=[doc.id for doc in documents],
+            embeddings=vectors,
+            documents=[doc.text for doc in documents],
+            metadatas=[doc.metadata for doc in documents],
+        )
+
+    @staticmethod
+    def _existing_hashes(collection, hotel_ids: Optional[List[int]] = None) -> Dict[str, Optional[str]]:
+        where = {"hotel_id": {"$in": hotel_ids}} if hotel_ids is not None else None
+        existing = collection.get(where=where, include=["metadatas"])
+        return {
+            doc_id: (metadata or {}).get("content_hash")
+            for doc_id, metadata in zip(existing["ids"], existing["metadatas"])
+        }
+
+    def _write(self, collection, documents: Iterable[RoomDocument], existing: Dict[str, Optional[str]]) -> dict:
+        stats = {"upserted": 0, "unchanged": 0, "deleted": 0}
+        started = time.perf_counter()
+        seen = set()
+        pending = []
+        logged_at = started
+
+        for doc in documents:
+            seen.add(doc.id)
+            if existing.get(doc.id) == doc.hash:
+                stats["unchanged"] += 1
+                continue
+            pending.append(doc)
+            if len(pending) >= self.batch_size:
+                self._upsert(collection, pending)
+                stats["upserted"] += len(pending)
+                pending = []
+                if time.perf_counter() - logged_at >= PROGRESS_LOG_SECONDS:
+                    logged_at = time.perf_counter()
+                    processed = len(seen)
+                    current_app.logger.info(
+                        f"Vector index: {processed} docs, {processed / (logged_at - started):.0f} docs/s"
+                    )
+
+        self._upsert(collection, pending)
+        stats["upserted"] += len(pending)
+
+        stale_ids = [doc_id for doc_id in existing if doc_id not in seen]
+        for start in range(0, len(stale_ids), self.batch_size):
+            collection.delete(ids=stale_ids[start:start + self.batch_size])
+        stats["deleted"] = len(stale_ids)
+        elapsed = time.perf_counter() - started
+        stats["seconds"] = round(elapsed, 3)
+        stats["docs_per_sec"] = round(len(seen) / elapsed, 1) if elapsed > 0 else 0.0
+        return stats
+
+    def sync(self, hotel_ids: Optional[Iterable[int]] = None, documents: Optional[Iterable[RoomDocument]] = None) -> dict:
+        """Cập nhật tại chỗ collection đang dùng: chỉ embed document mới / đổi hash, xóa phòng không còn.
+
+        hotel_ids: chỉ đồng bộ các khách sạn này (document của khách sạn khác giữ nguyên).
+        """
+        if hotel_ids is not None:
+            hotel_ids = sorted(set(hotel_ids))
+        name = self.active_collection_name()
+        if name in self._collection_names():
+            collection = self.client.get_collection(name)
+            if not self._model_matches(collection):
+                # Vector của hai model khác nhau không so sánh được, phải dựng lại toàn bộ
+                raise RuntimeError(
+                    f"Index {name} dùng {self.collection_model(collection)}, đang cấu hình {self.model_id}: "
+                    "cần dựng lại toàn bộ (full=True)"
+                )
+        else:
+            collection = self.client.create_collection(name, metadata=self._collection_metadata())
+        existing = self._existing_hashes(collection, hotel_ids)
+        if documents is None:
+            documents = RoomDocumentBuilder.iter_documents(hotel_ids)
+        stats = self._write(collection, documents, existing)
+        stats["collection"] = collection.name
+        return stats
+
+    def rebuild(self, documents: Optional[Iterable[RoomDocument]] = None) -> dict:
+        """Dựng index mới bên cạnh index cũ rồi mới chuyển sang; document trùng hash với index cũ thì copy vector"""
+        old_name = self.active_collection_name()
+        new_name = f"{COLLECTION_PREFIX}{int(time.time() * 1000)}"
+        collection = self.client.create_collection(new_name, metadata=self._collection_metadata())
+
+        old_collection = self.client.get_collection(old_name) if old_name in self._collection_names() else None
+        if old_collection is not None and not self._model_matches(old_collection):
+            old_collection = None
+        if documents is None:
+            documents = RoomDocumentBuilder.iter_documents()
+
+        reused = {"count": 0}
+        try:
+            if old_collection is not None:
+                documents = self._reuse_vectors(old_collection, collection, documents, reused)
+            stats = self._write(collection, documents, {})
+            stats["unchanged"] = reused["count"]
+        except Exception:
+            self.client.delete_collection(new_name)
+            raise
+
+        self._set_active(new_name)
+        # Giữ lại index vừa thay cho worker khác còn đang đọc (tự chuyển khi thấy ACTIVE đổi), xóa các bản cũ hơn
+        for name in self._collection_names():
+            if name in (new_name, old_name):
+                continue
+            if name == DEFAULT_COLLECTION or name.startswith(COLLECTION_PREFIX):
+                self.client.delete_collection(name)
+
+        stats["collection"] = new_name
+        return stats
+
+    def _reuse_vectors(self, old_collection, new_collection, documents: Iterable[RoomDocument], reused_counter: dict) -> Iterator[RoomDocument]:
+        """Document không đổi so với index cũ được copy sang kèm vector cũ, chỉ document đổi mới đi embed"""
+        batch = []
+
+        def flush(batch):
+            found = old_collection.get(ids=[doc.id for doc in batch], include=["metadatas", "embeddings"])
+            old = {
+                doc_id: (metadata or {}, embedding)
+                for doc_id, metadata, embedding in zip(found["ids"], found["metadatas"], found["embeddings"])
+            }
+            reused = [doc for doc in batch if old.get(doc.id, ({}, None))[0].get("content_hash") == doc.hash]
+            if reused:
+                new_collection.upsert(
+                    ids=[doc.id for doc in reused],
+                    embeddings=[old[doc.id][1] for doc in reused],
+                    documents=[doc.text for doc in reused],
+                    metadatas=[doc.metadata for doc in reused],
+                )
+            reused_counter["count"] += len(reused)
+            reused_ids = {doc.id for doc in reused}
+            return [doc for doc in batch if doc.id not in reused_ids]
+
+        for doc in documents:
+            batch.append(doc)
+            if len(batch) >= self.batch_size:
+                yield from flush(batch)
+                batch = []
+        if batch:
+            yield from flush(batch)
@@ -205,39 +205,166 @@
 
       showTyping();
 
+      let answer;
       try {
-        const response = await fetch("/api/chatbot/message", {
-          method: "POST",
-          headers: {
-            "Content-Type": "application/json",
-          },
-          body: JSON.stringify({
-            message: text,
-            history: newHistory,
-          }),
-        });
+        answer = await streamAnswer(text, newHistory);
+      } catch (streamErr) {
+        if (streamErr instanceof StreamUnavailableError) {
+          // Server chưa nhận xử lý qua /stream nên gọi /message không chạy lại agent lần hai
+          console.warn("Chatbot stream unavailable, falling back", streamErr);
+          try {
+            answer = await fetchAnswer(text, newHistory);
+          } catch (err) {
+            console.error("Chatbot error", err);
+            answer = CONNECTION_ERROR_ANSWER;
+          }
+        } else {
+          console.error("Chatbot stream error", streamErr);
+          answer = CONNECTION_ERROR_ANSWER;
+        }
+      }
 
-        const data = await response.json();
-        hideTyping();
+      hideTyping();
+      removeStreamingMessage();
+      appendMessage("assistant", answer);
+      const updatedHistory = [...newHistory, { role: "assistant", content: answer }];
+      saveHistory(updatedHistory);
+    });
+
+    const FALLBACK_ANSWER =
+      "Xin lỗi, hiện mình không thể trả lời yêu cầu này. Vui lòng thử lại sau.";
+    const CONNECTION_ERROR_ANSWER =
+      "Đã có lỗi kết nối tới trợ lý. Vui lòng kiểm tra lại mạng hoặc thử lại sau ít phút.";
+    const INTERRUPTED_NOTE = "\n\n(Kết nối bị gián đoạn, câu trả lời có thể chưa đầy đủ.)";
+
+    // Chỉ lỗi này mới được chuyển sang /message: endpoint stream không dùng được, chưa nhận event nào
+    class StreamUnavailableError extends Error {}
+
+    async function fetchAnswer(text, history) {
+      const response = await fetch("/api/chatbot/message", {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+        },
+        body: JSON.stringify({
+          message: text,
+          history: history,
+        }),
+      });
 
-        const answer =
-          data && data.answer
-            ? data.answer
-            : "Xin lỗi, hiện mình không thể trả lời yêu cầu này. Vui lòng thử lại sau.";
+      const data = await response.json();
+      return data && data.answer ? data.answer : FALLBACK_ANSWER;
+    }
+
+    function setTypingLabel(label) {
+      const typing = document.getElementById("chatbotTyping");
+      if (!typing) return;
+      let labelEl = typing.querySelector(".chatbot-typing-label");
+      if (!labelEl) {
+        labelEl = document.createElement("div");
+        labelEl.className = "chatbot-typing-label small text-muted";
+        typing.appendChild(labelEl);
+      }
+      labelEl.textContent = label || "";
+    }
 
-        appendMessage("assistant", answer);
-        const updatedHistory = [...newHistory, { role: "assistant", content: answer }];
-        saveHistory(updatedHistory);
-      } catch (err) {
-        console.error("Chatbot error", err);
+    function updateStreamingMessage(content) {
+      let msg = document.getElementById("chatbotStreaming");
+      if (!msg) {
         hideTyping();
-        const fallback =
-          "Đã có lỗi kết nối tới trợ lý. Vui lòng kiểm tra lại mạng hoặc thử lại sau ít phút.";
-        appendMessage("assistant", fallback);
-        const updatedHistory = [...newHistory, { role: "assistant", content: fallback }];
-        saveHistory(updatedHistory);
+        msg = document.createElement("div");
+        msg.id = "chatbotStreaming";
+        msg.className = "chatbot-message chatbot-message-assistant";
+        messagesEl.appendChild(msg);
       }
-    });
+      msg.innerHTML = `<div class="chatbot-bubble">${formatMessage(content, "assistant")}</div>`;
+      messagesEl.scrollTop = messagesEl.scrollHeight;
+    }
+
+    function removeStreamingMessage() {
+      const msg = document.getElementById("chatbotStreaming");
+      if (msg) msg.remove();
+    }
+
+    // Đọc text/event-stream từ /api/chatbot/stream, hiển thị dần token; trả về câu trả lời cuối (event done)
+    async function streamAnswer(text, history) {
+      const response = await fetch("/api/chatbot/stream", {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+          Accept: "text/event-stream",
+        },
+        body: JSON.stringify({
+          message: text,
+          history: history,
+        }),
+      });
+
+      if (!response.ok || !response.body || !response.body.getReader) {
+        throw new StreamUnavailableError(`Stream not available (${response.status})`);
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder("utf-8");
+      let buffer = "";
+      let content = "";
+      let finalAnswer = null;
+      let started = false;
+
+      while (true) {
+        let chunk;
+        try {
+          chunk = await reader.read();
+        } catch (err) {
+          if (!started) throw new StreamUnavailableError(`Stream read failed: ${err}`);
+          // Đã nhận một phần: giữ nội dung đã hiện, không gọi lại agent
+          return content ? content + INTERRUPTED_NOTE : CONNECTION_ERROR_ANSWER;
+        }
+        const { value, done } = chunk;
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+          const block = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+
+          let eventName = "message";
+          let dataText = "";
+          block.split("\n").forEach((line) => {
+            if (line.startsWith("event:")) eventName = line.slice(6).trim();
+            else if (line.startsWith("data:")) dataText += line.slice(5).trim();
+          });
+
+          let data = {};
+          try {
+            data = dataText ? JSON.parse(dataText) : {};
+          } catch (e) {
+            continue;
+          }
+          started = true;
+
+          if (eventName === "token") {
+            content += data.text || "";
+            updateStreamingMessage(content);
+          } else if (eventName === "reset") {
+            content = "";
+          } else if (eventName === "tool" && data.status === "start") {
+            setTypingLabel(data.label);
+          } else if (eventName === "done") {
+            finalAnswer = data.answer || FALLBACK_ANSWER;
+          } else if (eventName === "error") {
+            finalAnswer = data.message || FALLBACK_ANSWER;
+          }
+        }
+      }
+
+      if (finalAnswer === null) {
+        if (!started) throw new StreamUnavailableError("Stream ended without events");
+        finalAnswer = content ? content + INTERRUPTED_NOTE : CONNECTION_ERROR_ANSWER;
+      }
+      return finalAnswer;
+    }
   }
 
   if (document.readyState === "loading") {
@@ -0,0 +1,41 @@
+import csv
+import io
+import zlib
+
+# Số dòng gom lại trước khi đẩy một khúc ra response
+CHUNK_ROWS = 500
+GZIP_LEVEL = 6
+
+
+def iter_csv(rows, compress=False, chunk_rows=CHUNK_ROWS):
+    """Sinh CSV (UTF-8 có BOM để Excel đọc đúng tiếng Việt) thành từng khúc bytes.
+
+    compress=True thì nén gzip liên tục theo từng khúc; bộ nhớ chỉ phụ thuộc chunk_rows, không phụ thuộc số dòng.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # wbits=31: định dạng gzip (có header / CRC) thay vì zlib thô
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31) if compress else None
+
+    def drain():
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate(0)
+        return compressor.compress(data) if compressor else data
+
+    buffer.write('\ufeff')
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= chunk_rows:
+            chunk = drain()
+            if chunk:
+                yield chunk
+            pending = 0
+
+    chunk = drain()
+    if compressor:
+        chunk += compressor.flush()
+    if chunk:
+        yield chunk
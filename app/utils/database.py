@@ -0,0 +1,71 @@
+import random
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.exc import OperationalError
+
+from app import db
+
+# MySQL: 1205 lock wait timeout, 1213 deadlock
+RETRYABLE_ERROR_CODES = (1205, 1213)
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.05
+
+
+def increment_counters(model, key_columns, counter_column, rows, session=None):
+    """Cộng delta vào cột đếm theo khóa, chưa có bản ghi thì insert (1 câu lệnh upsert cho cả lô).
+
+    rows: list dict chứa các key_columns và counter_column (giá trị delta, có thể âm).
+    """
+    if not rows:
+        return
+    session = session or db.session
+    table = model.__table__
+    dialect = session.get_bind().dialect.name
+
+    if dialect == 'mysql':
+        stmt = mysql.insert(table).values(rows)
+        stmt = stmt.on_duplicate_key_update({counter_column: table.c[counter_column] + stmt.inserted[counter_column]})
+    elif dialect in ('postgresql', 'sqlite'):
+        module = postgresql if dialect == 'postgresql' else sqlite
+        stmt = module.insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key_columns),
+            set_={counter_column: table.c[counter_column] + stmt.excluded[counter_column]}
+        )
+    else:
+        # DB khác: update từng dòng, không có thì insert
+        for row in rows:
+            condition = [table.c[column] == row[column] for column in key_columns]
+            result = session.execute(
+                table.update().where(*condition).values({counter_column: table.c[counter_column] + row[counter_column]})
+            )
+            if not result.rowcount:
+                session.execute(insert(table).values(row))
+        return
+
+    session.execute(stmt)
+
+
+def is_retryable_error(error):
+    orig = getattr(error, 'orig', None)
+    args = getattr(orig, 'args', None) or ()
+    if args and args[0] in RETRYABLE_ERROR_CODES:
+        return True
+    message = str(orig or error).lower()
+    return 'deadlock' in message or 'database is locked' in message
+
+
+def run_with_retries(operation, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, session=None):
+    """Chạy operation() (tự commit bên trong); gặp deadlock / hết thời gian chờ khóa thì rollback và chạy lại"""
+    session = session or db.session
+    for attempt in range(retries + 1):
+        try:
+            return operation()
+        except OperationalError as e:
+            session.rollback()
+            if attempt >= retries or not is_retryable_error(e):
+                raise
+            # Backoff lũy thừa có jitter để các transaction tranh chấp không chạy lại cùng lúc
+            time.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
@@ -0,0 +1,212 @@
+import base64
+import json
+import threading
+import time
+from datetime import datetime, date
+from decimal import Decimal
+
+from flask import request, session
+from sqlalchemy import and_, or_
+
+DEFAULT_PER_PAGE = 10
+MAX_PER_PAGE = 100
+
+# Cache tổng số bản ghi theo (endpoint, filter) để không COUNT lại mỗi request
+COUNT_CACHE_TTL = 60
+COUNT_CACHE_MAX_ENTRIES = 1024
+COUNT_MODES = ('exact', 'cached', 'none')
+
+# Tham số phân trang không ảnh hưởng tới tổng số bản ghi
+PAGING_PARAMS = ('page', 'per_page', 'after', 'count')
+
+_count_cache = {}
+_count_cache_lock = threading.Lock()
+
+
+class CursorError(ValueError):
+    pass
+
+
+class Page:
+    def __init__(self, items, page, per_page, total, next_cursor):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+        self.next_cursor = next_cursor
+
+    @property
+    def has_more(self):
+        return self.next_cursor is not None
+
+    @property
+    def pages(self):
+        if self.total is None:
+            return None
+        return (self.total + self.per_page - 1) // self.per_page
+
+    def to_dict(self):
+        return {
+            'page': self.page,
+            'per_page': self.per_page,
+            'total': self.total,
+            'pages': self.pages,
+            'next_cursor': self.next_cursor,
+            'has_more': self.has_more
+        }
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'dec': str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return date.fromisoformat(value['d'])
+        if 'dec' in value:
+            return Decimal(value['dec'])
+        raise CursorError('Cursor không hợp lệ')
+    return value
+
+
+def encode_cursor(values):
+    payload = json.dumps([_encode_value(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (ValueError, TypeError, UnicodeError):
+        raise CursorError('Cursor không hợp lệ')
+    if not isinstance(values, list):
+        raise CursorError('Cursor không hợp lệ')
+    return [_decode_value(value) for value in values]
+
+
+def _keyset_condition(order_by, values):
+    """(k1, k2, ..., id) > cursor theo đúng chiều sắp xếp của từng cột"""
+    clauses = []
+    for index, (expr, descending) in enumerate(order_by):
+        value = values[index]
+        compare = expr < value if descending else expr > value
+        equals = [order_by[i][0] == values[i] for i in range(index)]
+        clauses.append(and_(*equals, compare) if equals else compare)
+    return or_(*clauses)
+
+
+def get_pagination_args(default_per_page=DEFAULT_PER_PAGE, default_count='exact', user_scoped=False):
+    """Đọc page/per_page/after/count từ query string.
+
+    user_scoped=True: danh sách riêng của user đăng nhập, không dùng tổng đã cache (count=cached chuyển thành exact)
+    """
+    page = request.args.get('page', 1, type=int) or 1
+    per_page = request.args.get('per_page', default_per_page, type=int) or default_per_page
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    after = request.args.get('after') or None
+
+    count_mode = request.args.get('count') or default_count
+    if count_mode not in COUNT_MODES:
+        count_mode = default_count
+    if user_scoped and count_mode == 'cached':
+        count_mode = 'exact'
+
+    return {
+        'page': max(page, 1),
+        'per_page': per_page,
+        'after': after,
+        'count': count_mode
+    }
+
+
+def request_count_key():
+    """Khóa cache tổng: endpoint + user đăng nhập + các filter trên query string (bỏ tham số phân trang)"""
+    args = sorted(
+        (key, tuple(request.args.getlist(key)))
+        for key in request.args.keys()
+        if key not in PAGING_PARAMS
+    )
+    # Kết quả có thể phụ thuộc user (lịch sử, khách sạn của owner...): không dùng chung tổng giữa các user
+    return (request.path, session.get('user_id'), tuple(args))
+
+
+def cached_count(query, key, ttl=COUNT_CACHE_TTL):
+    now = time.monotonic()
+    with _count_cache_lock:
+        entry = _count_cache.get(key)
+        if entry and entry[1] > now:
+            return entry[0]
+
+    total = query.order_by(None).count()
+
+    with _count_cache_lock:
+        if len(_count_cache) >= COUNT_CACHE_MAX_ENTRIES:
+            # Xóa entry hết hạn, nếu vẫn đầy thì bỏ entry cũ nhất
+            for stale_key in [k for k, (_, expires) in _count_cache.items() if expires <= now]:
+                _count_cache.pop(stale_key, None)
+            while len(_count_cache) >= COUNT_CACHE_MAX_ENTRIES:
+                _count_cache.pop(next(iter(_count_cache)))
+        _count_cache[key] = (total, now + ttl)
+    return total
+
+
+def clear_count_cache():
+    with _count_cache_lock:
+        _count_cache.clear()
+
+
+def paginate(query, order_by, page=1, per_page=DEFAULT_PER_PAGE, after=None, count='exact', count_key=None):
+    """Phân trang theo page (OFFSET) hoặc theo cursor `after` (keyset).
+
+    order_by: list (biểu thức, descending) - cột cuối phải duy nhất (thường là khóa chính).
+    Luôn trả next_cursor để client chuyển sang chế độ cursor từ bất kỳ trang nào.
+    """
+    total = None
+    if count == 'exact':
+        total = query.order_by(None).count()
+    elif count == 'cached':
+        total = cached_count(query, count_key or request_count_key())
+
+    single_entity = len(query.column_descriptions) == 1
+
+    if after:
+        values = decode_cursor(after)
+        if len(values) != len(order_by):
+            raise CursorError('Cursor không hợp lệ')
+        query = query.filter(_keyset_condition(order_by, values))
+        page = None
+        offset = 0
+    else:
+        offset = (page - 1) * per_page
+
+    query = query.order_by(None).order_by(
+        *[expr.desc() if descending else expr.asc() for expr, descending in order_by]
+    )
+    key_count = len(order_by)
+    query = query.add_columns(*[expr.label(f'_page_key_{index}') for index, (expr, _) in enumerate(order_by)])
+
+    if offset:
+        query = query.offset(offset)
+    rows = query.limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(list(rows[-1][-key_count:]))
+
+    if single_entity:
+        items = [row[0] for row in rows]
+    else:
+        items = [tuple(row[:-key_count]) for row in rows]
+
+    return Page(items, page, per_page, total, next_cursor)
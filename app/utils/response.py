@@ -36,7 +36,7 @@ def validation_error_response(errors):
         errors=errors
     )
 
-def paginated_response(items, page, per_page, total, message='Success'):
+def paginated_response(items, page, per_page, total, message='Success', next_cursor=None):
     return jsonify({
         'success': True,
         'message': message,
@@ -45,6 +45,8 @@ def paginated_response(items, page, per_page, total, message='Success'):
             'page': page,
             'per_page': per_page,
             'total': total,
-            'pages': (total + per_page - 1) // per_page
+            'pages': (total + per_page - 1) // per_page if total is not None else None,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
         }
     }), 200
\ No newline at end of file
@@ -16,6 +16,7 @@ from app.services.chatbot_service import get_chatbot_answer
 from flask import Flask
 from flask.testing import FlaskClient
 import os
+import sys
 
 # Load environment variables
 from dotenv import load_dotenv
@@ -32,7 +33,21 @@ results = {
     'hotel_detail': [],
     'check_availability': [],
     'chatbot_response': [],
-    'page_load': []
+    'page_load': [],
+    'autocomplete': [],
+    'concurrent_booking': [],
+    'hotel_detail_full': [],
+    'hotel_detail_cached': [],
+    'chatbot_agent_rebuild': [],
+    'chatbot_agent_pooled': [],
+    'vector_document_batch': [],
+    'chatbot_retrieval_plain': [],
+    'chatbot_retrieval_filtered': [],
+    'embedding_query_cached': [],
+    'promotion_fanout': [],
+    'dashboard_stats_full': [],
+    'dashboard_stats_snapshot': [],
+    'report_export_stream': []
 }
 
 def measure_time(func, *args, **kwargs):
@@ -227,6 +242,44 @@ def test_chatbot():
         print(f"   Average: {avg_time:.2f}ms (min: {min(times):.2f}ms, max: {max(times):.2f}ms)")
     return avg_time
 
+def test_chatbot_agent_overhead(iterations=200):
+    """Chi phí mỗi request của agent (không gọi mạng, LLM giả): dựng agent mỗi lần vs dùng pool"""
+    print("🤖 Testing chatbot agent overhead (fake LLM)...")
+    try:
+        from langchain_core.language_models.fake_chat_models import FakeListChatModel
+        from app.services.chatbot_service import ChatbotAgentPool
+    except ImportError as e:
+        print(f"   ⚠️  Thiếu LangChain ({e}), bỏ qua")
+        return None
+    
+    llm = FakeListChatModel(responses=["Xin chào, bạn muốn tìm phòng ở đâu?"])
+    history = [
+        {'role': 'user', 'content': 'Tìm phòng Đà Lạt'},
+        {'role': 'assistant', 'content': 'Bạn đi mấy người?'}
+    ]
+    rebuild_times = []
+    pooled_times = []
+    
+    with app.app_context():
+        # Cách cũ: prompt, agent và executor dựng lại cho mỗi tin nhắn
+        for _ in range(iterations):
+            start = time.perf_counter()
+            ChatbotAgentPool(llm).run("Xin chào", history, user_id=1)
+            rebuild_times.append((time.perf_counter() - start) * 1000)
+        
+        pool = ChatbotAgentPool(llm)
+        for _ in range(iterations):
+            start = time.perf_counter()
+            pool.run("Xin chào", history, user_id=1)
+            pooled_times.append((time.perf_counter() - start) * 1000)
+    
+    results['chatbot_agent_rebuild'] = rebuild_times
+    results['chatbot_agent_pooled'] = pooled_times
+    rebuild_avg = statistics.mean(rebuild_times)
+    pooled_avg = statistics.mean(pooled_times)
+    print(f"   Dựng mỗi lần: {rebuild_avg:.3f}ms, pool: {pooled_avg:.3f}ms ({rebuild_avg / pooled_avg:.1f}x)")
+    return pooled_avg
+
 def test_page_load():
     """Test thời gian load trang (simulated)"""
     print("🌐 Testing page load (simulated)...")
@@ -256,6 +309,568 @@ def test_page_load():
     print(f"   Average: {avg_time:.2f}ms")
     return avg_time
 
+def test_autocomplete():
+    """Test gợi ý search-as-you-type (index tiền tố trong memory)"""
+    print("⌨️  Testing autocomplete suggestions...")
+    from app.services.autocomplete import AutocompleteService
+    times = []
+    
+    with app.app_context():
+        # Lần đầu build index, không tính vào kết quả
+        build_ms, _ = measure_time(AutocompleteService.suggest, 'h')
+        print(f"   Build index: {build_ms:.2f}ms")
+        
+        typed = ['h', 'ha', 'ha n', 'ha no', 'da', 'da l', 'da lat', 'nha tr', 'hotel', 'ho chi']
+        for _ in range(100):
+            for prefix in typed:
+                elapsed, _ = measure_time(AutocompleteService.suggest, prefix)
+                times.append(elapsed)
+    
+    avg_time = statistics.mean(times) if times else 0
+    results['autocomplete'] = times
+    if times:
+        print(f"   Average: {avg_time * 1000:.1f}µs (p99: {sorted(times)[int(len(times) * 0.99) - 1] * 1000:.1f}µs)")
+    return avg_time
+
+def test_concurrent_booking(num_requests=40, workers=20):
+    """Bắn nhiều booking song song vào cùng 1 phòng, cùng khoảng ngày: chỉ được 1 booking thành công"""
+    print("🔒 Testing concurrent booking (oversell)...")
+    from concurrent.futures import ThreadPoolExecutor
+    from datetime import date, timedelta
+    from flask import session
+    from app.models.user import User
+    from app.controllers.booking_controller import BookingController
+    from app.services.inventory_service import InventoryService
+    times = []
+    
+    with app.app_context():
+        room = Room.query.filter_by(status='available').first()
+        user = User.query.first()
+        if not room or not user:
+            print("   ⚠️  Không có dữ liệu phòng/user, bỏ qua")
+            return 0
+        room_id, hotel_id, user_id = room.room_id, room.hotel_id, user.user_id
+        # Khoảng ngày xa để không trùng booking thật
+        check_in = date.today() + timedelta(days=900)
+        check_out = check_in + timedelta(days=2)
+    
+    payload = {
+        'hotel_id': hotel_id,
+        'check_in_date': check_in.isoformat(),
+        'check_out_date': check_out.isoformat(),
+        'num_guests': 1,
+        'rooms': [{'room_id': room_id, 'quantity': 1}]
+    }
+    
+    def book(_):
+        with app.test_request_context('/bookings/create', method='POST', json=payload):
+            session['user_id'] = user_id
+            elapsed, response = measure_time(BookingController.create_booking)
+            status = response[1] if response else 500
+            db.session.remove()
+            return elapsed, status
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        outcomes = list(executor.map(book, range(num_requests)))
+    wall = time.perf_counter() - start
+    
+    times = [elapsed for elapsed, _ in outcomes]
+    statuses = [status for _, status in outcomes]
+    created = statuses.count(201)
+    
+    with app.app_context():
+        # Dọn booking vừa tạo và trả lại sổ phòng
+        bookings = Booking.query.join(Booking.booking_details).filter(
+            Booking.check_in_date == check_in,
+            Booking.user_id == user_id
+        ).all()
+        for booking in bookings:
+            InventoryService.release(booking)
+            db.session.delete(booking)
+        db.session.commit()
+    
+    results['concurrent_booking'] = times
+    print(f"   {num_requests} requests / {workers} workers: {created} thành công, "
+          f"{statuses.count(409)} bị từ chối (409), {len(statuses) - created - statuses.count(409)} lỗi khác")
+    print(f"   Throughput: {num_requests / wall:.1f} req/s, Average: {statistics.mean(times):.2f}ms")
+    print(f"   {'✅ Không oversell' if created <= 1 else '❌ OVERSELL: ' + str(created) + ' booking cho 1 phòng'}")
+    return statistics.mean(times)
+
+# hotel (+images, amenities, policies) 4, rating 1, rooms (+images, amenities, room_type) 4,
+# reviews (+user, booking, booking_details, room, room_type) 6, eligible bookings 1
+HOTEL_DETAIL_MAX_QUERIES = 16
+
+def count_queries(func, *args, **kwargs):
+    """Đếm số câu SQL mà func phát ra"""
+    from sqlalchemy import event
+    statements = []
+    
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return len(statements), result
+
+def test_hotel_detail_query_count(rooms_per_hotel=100, num_reviews=30):
+    """Regression: trang chi tiết khách sạn phải chạy số query cố định, không phụ thuộc số phòng/review.
+    
+    Chạy trên catalog SQLite tự tạo (không cần DB thật), trả về False nếu vượt HOTEL_DETAIL_MAX_QUERIES.
+    """
+    print("🧮 Testing hotel detail query count...")
+    from datetime import date, timedelta
+    from flask import session
+    from app.models.booking_detail import BookingDetail
+    from app.models.hotel_image import HotelImage
+    from app.models.review import Review
+    from app.models.room_image import RoomImage
+    from app.models.user import User
+    from app.controllers.hotel_controller import HotelController
+    from app.services.cache_service import CacheService, hotel_tag
+    times = []
+    
+    # Khách sạn 1, 2: rooms_per_hotel phòng; khách sạn 1 có num_reviews review; khách sạn 3: 1 phòng, không review
+    bench_app = create_synthetic_catalog(rooms_per_hotel * 2, rooms_per_hotel)
+    with bench_app.app_context():
+        room_type_id = db.session.query(Room.room_type_id).limit(1).scalar()
+        db.session.execute(Hotel.__table__.insert(), [
+            {'hotel_id': 3, 'owner_id': 1, 'hotel_name': 'Hotel 3', 'address': '3 Trần Phú', 'city': SYNTHETIC_CITIES[0],
+             'star_rating': 3, 'status': 'active'}
+        ])
+        db.session.execute(Room.__table__.insert(), [
+            {'hotel_id': 3, 'room_type_id': room_type_id, 'room_name': 'Phòng đơn', 'base_price': 400000,
+             'max_guests': 2, 'status': 'available'}
+        ])
+        db.session.execute(HotelImage.__table__.insert(), [
+            {'hotel_id': h, 'image_url': f'/img/{h}-{i}.jpg', 'is_primary': i == 0} for h in (1, 2) for i in range(5)
+        ])
+        db.session.execute(RoomImage.__table__.insert(), [
+            {'room_id': r, 'image_url': f'/img/room-{r}.jpg'} for r in range(1, rooms_per_hotel * 2 + 1)
+        ])
+        
+        first_user_id = 100
+        check_out = date.today() - timedelta(days=1)
+        db.session.execute(User.__table__.insert(), [
+            {'user_id': first_user_id + i, 'email': f'guest{i}@example.com', 'full_name': f'Khách {i}',
+             'password_hash': 'x', 'role_id': 1}
+            for i in range(num_reviews + 1)
+        ])
+        db.session.execute(Booking.__table__.insert(), [
+            {'booking_id': i + 1, 'booking_code': f'BENCH{i}', 'user_id': first_user_id + i, 'hotel_id': 1,
+             'check_in_date': check_out - timedelta(days=2), 'check_out_date': check_out, 'num_guests': 2,
+             'total_amount': 1000000, 'final_amount': 1000000, 'status': 'checked_out'}
+            for i in range(num_reviews + 1)
+        ])
+        db.session.execute(BookingDetail.__table__.insert(), [
+            {'booking_id': i + 1, 'room_id': i % rooms_per_hotel + 1, 'quantity': 1, 'price_per_night': 500000,
+             'num_nights': 2, 'subtotal': 1000000}
+            for i in range(num_reviews + 1)
+        ])
+        # User cuối cùng chưa review: trang chi tiết còn query booking chờ review
+        db.session.execute(Review.__table__.insert(), [
+            {'booking_id': i + 1, 'user_id': first_user_id + i, 'hotel_id': 1, 'rating': 1 + i % 5,
+             'comment': 'Tốt', 'status': 'active'}
+            for i in range(num_reviews)
+        ])
+        db.session.commit()
+        viewer_id = first_user_id + num_reviews
+    
+    counts = {}
+    for hotel_id in (1, 2, 3):
+        with bench_app.test_request_context(f'/hotels/{hotel_id}'):
+            session['user_id'] = viewer_id
+            # Lần đầu để warm-up (metadata), sau đó xóa cache để đếm đúng đường đọc DB
+            HotelController.get_hotel(hotel_id)
+            CacheService.invalidate(hotel_tag(hotel_id))
+            start = time.perf_counter()
+            counts[hotel_id], _ = count_queries(HotelController.get_hotel, hotel_id)
+            times.append((time.perf_counter() - start) * 1000)
+            CacheService.invalidate(hotel_tag(hotel_id))
+    
+    with bench_app.app_context():
+        db.drop_all()
+    
+    results['hotel_detail_full'] = times
+    for hotel_id, count in counts.items():
+        print(f"   Hotel {hotel_id}: {count} queries")
+    # Khách sạn chưa có review/phòng thì selectinload bỏ qua query con nên có thể ít hơn, nhưng không được vượt trần
+    within_bound = max(counts.values()) <= HOTEL_DETAIL_MAX_QUERIES
+    print(f"   {'✅' if within_bound else '❌'} Tối đa {max(counts.values())}/{HOTEL_DETAIL_MAX_QUERIES} queries")
+    return within_bound
+
+def test_read_cache(iterations=50):
+    """Trang chủ / chi tiết khách sạn khi đã có cache: không query DB, nhanh hơn hẳn lần đọc đầu"""
+    print("🗃️  Testing read-through cache...")
+    from app.controllers.main_controller import MainController
+    from app.controllers.hotel_controller import HotelController
+    from app.services.cache_service import CacheService, TAG_HOTELS, hotel_tag
+    times = []
+    
+    with app.app_context():
+        hotel = Hotel.query.filter_by(status='active').first()
+        if not hotel:
+            print("   ⚠️  Không có dữ liệu khách sạn, bỏ qua")
+            return True
+        hotel_id = hotel.hotel_id
+    
+    with app.test_request_context(f'/hotels/{hotel_id}'):
+        CacheService.invalidate(TAG_HOTELS, hotel_tag(hotel_id))
+        start = time.perf_counter()
+        MainController.get_home_data()
+        HotelController.get_hotel(hotel_id)
+        cold_ms = (time.perf_counter() - start) * 1000
+        
+        query_counts = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            home_queries, _ = count_queries(MainController.get_home_data)
+            # Khách vãng lai: phần chi tiết lấy hoàn toàn từ cache
+            detail_queries, _ = count_queries(HotelController.get_hotel, hotel_id)
+            times.append((time.perf_counter() - start) * 1000)
+            query_counts.append(home_queries + detail_queries)
+    
+    results['hotel_detail_cached'] = times
+    warm_ms = statistics.mean(times)
+    print(f"   Lần đầu: {cold_ms:.2f}ms, có cache: {warm_ms:.2f}ms, {max(query_counts)} queries")
+    print(f"   {CacheService.stats()}")
+    passed = max(query_counts) == 0
+    print(f"   {'✅' if passed else '❌'} Đọc từ cache không chạy query")
+    return passed
+
+class HashEmbeddings:
+    """Embedding giả (hash nội dung), chỉ dùng để đo phần dựng document không cần gọi mạng"""
+    
+    def __init__(self, dimensions=16):
+        self.dimensions = dimensions
+    
+    def embed_documents(self, texts):
+        import hashlib
+        vectors = []
+        for text in texts:
+            digest = hashlib.sha256(text.encode()).digest()
+            vectors.append([byte / 255 for byte in digest[:self.dimensions]])
+        return vectors
+    
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+SYNTHETIC_CITIES = ('Đà Lạt', 'Hà Nội', 'Nha Trang', 'Đà Nẵng', 'Huế')
+
+def create_synthetic_catalog(num_rooms, rooms_per_hotel=50):
+    """App SQLite in-memory với catalog giả num_rooms phòng (bulk insert), dùng cho benchmark indexer / retrieval"""
+    from config.config import config as app_config
+    from app.models.role import Role
+    from app.models.user import User
+    from app.models.room_type import RoomType
+    from app.models.amenity import Amenity
+    from app.models.hotel_amenity import hotel_amenities
+    from app.models.room_amenity import room_amenities
+    
+    class BenchmarkConfig(app_config['development']):
+        SQLALCHEMY_DATABASE_URI = 'sqlite://'
+        QUERY_PROFILER_ENABLED = False
+    
+    bench_app = create_app(BenchmarkConfig)
+    
+    with bench_app.app_context():
+        db.create_all()
+        role = Role(role_name='hotel_owner')
+        db.session.add(role)
+        db.session.flush()
+        owner = User(email='bench@example.com', full_name='Bench', password_hash='x', role_id=role.role_id)
+        room_type = RoomType(type_name='Deluxe')
+        db.session.add_all([owner, room_type])
+        db.session.flush()
+        amenity_ids = []
+        for name in ('Wifi', 'Hồ bơi', 'Điều hòa', 'Minibar'):
+            amenity = Amenity(amenity_name=name)
+            db.session.add(amenity)
+            db.session.flush()
+            amenity_ids.append(amenity.amenity_id)
+        
+        num_hotels = max(1, num_rooms // rooms_per_hotel)
+        db.session.execute(Hotel.__table__.insert(), [
+            {'hotel_id': h, 'owner_id': owner.user_id, 'hotel_name': f'Hotel {h}', 'address': f'{h} Trần Phú',
+             'city': SYNTHETIC_CITIES[h % len(SYNTHETIC_CITIES)], 'star_rating': 3 + h % 3, 'status': 'active'}
+            for h in range(1, num_hotels + 1)
+        ])
+        db.session.execute(hotel_amenities.insert(), [
+            {'hotel_id': h, 'amenity_id': amenity_id}
+            for h in range(1, num_hotels + 1) for amenity_id in amenity_ids[:2]
+        ])
+        db.session.execute(Room.__table__.insert(), [
+            {'room_id': r, 'hotel_id': (r - 1) // rooms_per_hotel + 1, 'room_type_id': room_type.type_id,
+             'room_name': f'Phòng {r}', 'base_price': 500000 + r % 10 * 100000, 'max_guests': 2 + r % 3,
+             'status': 'available'}
+            for r in range(1, num_rooms + 1)
+        ])
+        db.session.execute(room_amenities.insert(), [
+            {'room_id': r, 'amenity_id': amenity_id}
+            for r in range(1, num_rooms + 1) for amenity_id in amenity_ids[2:]
+        ])
+        db.session.commit()
+    return bench_app
+
+def test_vector_document_build(num_rooms=50000, rooms_per_hotel=50, batch_size=100):
+    """Dựng document RAG cho catalog lớn (SQLite in-memory) + embedding giả: số query cố định theo trang, báo docs/s"""
+    print(f"🧱 Testing vector document build ({num_rooms} rooms, fake embeddings)...")
+    from app.services.vector_indexer import ROOM_PAGE_SIZE, RoomDocumentBuilder, iter_batches
+    
+    bench_app = create_synthetic_catalog(num_rooms, rooms_per_hotel)
+    times = []
+    
+    with bench_app.app_context():
+        embeddings = HashEmbeddings()
+        
+        def build():
+            count = 0
+            for batch in iter_batches(RoomDocumentBuilder.iter_documents(), batch_size):
+                start = time.perf_counter()
+                embeddings.embed_documents([doc.text for doc in batch])
+                times.append((time.perf_counter() - start) * 1000)
+                count += len(batch)
+            return count
+        
+        start = time.perf_counter()
+        queries, count = count_queries(build)
+        elapsed = time.perf_counter() - start
+        db.drop_all()
+    
+    results['vector_document_batch'] = times
+    # 2 query gộp cho khách sạn + mỗi trang 1 query phòng và 1 query tiện nghi phòng (+1 trang rỗng cuối)
+    expected_queries = 2 + 2 * -(-num_rooms // ROOM_PAGE_SIZE) + 1
+    print(f"   {count} documents trong {elapsed:.2f}s ({count / elapsed:.0f} docs/s), {queries} queries")
+    passed = count == num_rooms and queries <= expected_queries
+    print(f"   {'✅' if passed else '❌'} Tối đa {expected_queries} queries, không phụ thuộc số phòng mỗi trang")
+    return passed
+
+def test_chatbot_retrieval(num_rooms=5000, num_queries=100, k=5):
+    """Tìm phòng cho chatbot trên catalog giả: similarity trên toàn bộ catalog vs lọc metadata trước (latency, recall@k)"""
+    print(f"🔎 Testing chatbot retrieval ({num_rooms} rooms, fake embeddings)...")
+    try:
+        import chromadb
+        from langchain_community.vectorstores import Chroma
+    except ImportError as e:
+        print(f"   ⚠️  Thiếu Chroma / LangChain ({e}), bỏ qua")
+        return None
+    import random
+    import shutil
+    import tempfile
+    from app.services.chatbot_retrieval import retrieve_rooms
+    from app.services.vector_indexer import VectorIndexer
+    
+    bench_app = create_synthetic_catalog(num_rooms)
+    persist_dir = tempfile.mkdtemp(prefix='bench_chroma_')
+    rng = random.Random(42)
+    plain_times = []
+    filtered_times = []
+    recall = {'plain': [], 'filtered': []}
+    
+    try:
+        with bench_app.app_context():
+            indexer = VectorIndexer(HashEmbeddings(), persist_dir=persist_dir)
+            indexer.rebuild()
+            store = indexer.open_store()
+            rooms = db.session.query(Room.room_id, Hotel.city, Room.base_price, Room.max_guests)\
+                .join(Hotel, Hotel.hotel_id == Room.hotel_id).all()
+            
+            for _ in range(num_queries):
+                city = rng.choice(SYNTHETIC_CITIES)
+                max_price = rng.choice((600000, 800000, 1000000, 1200000))
+                guests = rng.choice((2, 3, 4))
+                message = f"phòng {city} dưới {max_price // 1000}k cho {guests} người"
+                # Ground truth: mọi phòng thỏa điều kiện (embedding giả nên không có thứ hạng ngữ nghĩa)
+                relevant = {
+                    row.room_id for row in rooms
+                    if row.city == city and float(row.base_price) <= max_price and row.max_guests >= guests
+                }
+                if not relevant:
+                    continue
+                expected = min(k, len(relevant))
+                
+                start = time.perf_counter()
+                docs = store.similarity_search(message, k=k)
+                plain_times.append((time.perf_counter() - start) * 1000)
+                recall['plain'].append(len({doc.metadata['room_id'] for doc in docs} & relevant) / expected)
+                
+                start = time.perf_counter()
+                docs, _ = retrieve_rooms(store, message, k=k, cities=SYNTHETIC_CITIES)
+                filtered_times.append((time.perf_counter() - start) * 1000)
+                recall['filtered'].append(len({doc.metadata['room_id'] for doc in docs} & relevant) / expected)
+            
+            db.drop_all()
+    finally:
+        shutil.rmtree(persist_dir, ignore_errors=True)
+    
+    results['chatbot_retrieval_plain'] = plain_times
+    results['chatbot_retrieval_filtered'] = filtered_times
+    plain_recall = statistics.mean(recall['plain'])
+    filtered_recall = statistics.mean(recall['filtered'])
+    print(f"   Similarity thuần: {statistics.mean(plain_times):.2f}ms, recall@{k} {plain_recall:.2f}")
+    print(f"   Lọc metadata + tình trạng phòng: {statistics.mean(filtered_times):.2f}ms, recall@{k} {filtered_recall:.2f}")
+    passed = filtered_recall >= 0.99
+    print(f"   {'✅' if passed else '❌'} Kết quả đều đúng thành phố / giá / số khách")
+    return passed
+
+def test_embedding_latency(iterations=50):
+    """Embedding câu hỏi với provider đang cấu hình (EMBEDDING_PROVIDER): lần đầu vs lấy lại từ LRU trong bộ nhớ"""
+    print("🧬 Testing query embedding latency...")
+    from app.services.embedding_provider import current_model_id, get_embeddings
+    times = []
+    
+    with app.app_context():
+        try:
+            embeddings = get_embeddings()
+        except (RuntimeError, ValueError) as e:
+            print(f"   ⚠️  {e}, bỏ qua")
+            return None
+        
+        # Câu hỏi mới mỗi lần chạy để lần đầu chắc chắn phải embed
+        message = f"phòng Đà Lạt cho 2 người {time.time_ns()}"
+        start = time.perf_counter()
+        embeddings.embed_query(message)
+        cold_ms = (time.perf_counter() - start) * 1000
+        
+        for _ in range(iterations):
+            start = time.perf_counter()
+            embeddings.embed_query(message)
+            times.append((time.perf_counter() - start) * 1000)
+    
+    results['embedding_query_cached'] = times
+    print(f"   {current_model_id()}: lần đầu {cold_ms:.2f}ms, có cache {statistics.mean(times):.2f}ms")
+    return statistics.mean(times)
+
+def test_promotion_fanout(num_recipients=100000):
+    """Fan-out khuyến mãi cho num_recipients người yêu thích một khách sạn: INSERT ... SELECT + job email theo lô"""
+    print(f"📣 Testing promotion fan-out ({num_recipients} recipients)...")
+    from app.models.favorite import Favorite
+    from app.models.notification import Notification
+    from app.models.promotion import Promotion
+    from app.models.user import User
+    from app.models.background_job import BackgroundJob
+    from app.services.notification_service import NotificationService, PROMOTION_EMAIL_TASK
+    
+    bench_app = create_synthetic_catalog(50)
+    bench_app.config['JOB_WORKER_MODE'] = 'external'
+    
+    with bench_app.app_context():
+        first_user_id = 1000
+        db.session.execute(User.__table__.insert(), [
+            {'user_id': first_user_id + i, 'email': f'fan{i}@example.com', 'full_name': f'Fan {i}', 'password_hash': 'x',
+             'role_id': 1, 'is_active': True, 'email_verified': i % 2 == 0}
+            for i in range(num_recipients)
+        ])
+        db.session.execute(Favorite.__table__.insert(), [
+            {'user_id': first_user_id + i, 'hotel_id': 1} for i in range(num_recipients)
+        ])
+        promotion = Promotion(hotel_id=1, title='Giảm giá cuối tuần', discount_type='percentage', discount_value=20,
+                              start_date=datetime.now(), end_date=datetime.now(), is_active=True)
+        db.session.add(promotion)
+        db.session.commit()
+        
+        start = time.perf_counter()
+        stats = NotificationService.fan_out_promotion(promotion.promotion_id)
+        elapsed = time.perf_counter() - start
+        # Chạy lại (như job bị thử lại) không được tạo thông báo trùng
+        again = NotificationService.fan_out_promotion(promotion.promotion_id)
+        
+        notifications = Notification.query.filter_by(type='promotion', related_id=promotion.promotion_id).count()
+        email_jobs = BackgroundJob.query.filter_by(task=PROMOTION_EMAIL_TASK).count()
+        db.drop_all()
+    
+    results['promotion_fanout'] = [elapsed * 1000]
+    print(f"   {stats['notifications']} thông báo, {stats['email_jobs']} job email "
+          f"({stats['email_recipients']} người nhận) trong {elapsed:.2f}s")
+    passed = notifications == num_recipients and again['notifications'] == 0 and email_jobs > 0
+    print(f"   {'✅' if passed else '❌'} Mỗi người một thông báo, chạy lại không trùng")
+    return passed
+
+def test_dashboard_stats(num_rooms=50000, iterations=20):
+    """Số liệu dashboard admin: đếm lại toàn bộ các bảng vs cộng các dòng shard platform_stats"""
+    print(f"📊 Testing admin dashboard stats ({num_rooms} rooms)...")
+    from app.services.platform_stats_service import PlatformStatsService
+    
+    bench_app = create_synthetic_catalog(num_rooms)
+    full_times = []
+    snapshot_times = []
+    
+    with bench_app.app_context():
+        PlatformStatsService.reconcile()
+        for _ in range(iterations):
+            start = time.perf_counter()
+            PlatformStatsService.compute()
+            full_times.append((time.perf_counter() - start) * 1000)
+            
+            db.session.expire_all()
+            start = time.perf_counter()
+            PlatformStatsService.get_snapshot()
+            snapshot_times.append((time.perf_counter() - start) * 1000)
+        full_queries, _ = count_queries(PlatformStatsService.compute)
+        db.session.expire_all()
+        snapshot_queries, _ = count_queries(PlatformStatsService.get_snapshot)
+        db.drop_all()
+    
+    results['dashboard_stats_full'] = full_times
+    results['dashboard_stats_snapshot'] = snapshot_times
+    print(f"   Đếm lại: {statistics.mean(full_times):.2f}ms ({full_queries} query)")
+    print(f"   Snapshot: {statistics.mean(snapshot_times):.2f}ms ({snapshot_queries} query)")
+    return statistics.mean(snapshot_times)
+
+def test_report_export(num_bookings=100000):
+    """Xuất báo cáo CSV (gzip) toàn bộ booking: thời gian và bộ nhớ đỉnh khi stream"""
+    print(f"📤 Testing streaming report export ({num_bookings} bookings)...")
+    import tracemalloc
+    from datetime import date, timedelta
+    from app.controllers.admin_controller import AdminController
+    from app.utils.csv_stream import iter_csv
+    
+    bench_app = create_synthetic_catalog(1000)
+    
+    with bench_app.app_context():
+        owner_id = db.session.query(db.func.min(Hotel.owner_id)).scalar()
+        created = datetime(2025, 1, 1)
+        for offset in range(0, num_bookings, 50000):
+            db.session.execute(Booking.__table__.insert(), [
+                {'user_id': owner_id, 'hotel_id': k % 20 + 1, 'booking_code': f'BENCH{k}',
+                 'check_in_date': date(2025, 1, 1), 'check_out_date': date(2025, 1, 3), 'num_guests': 2,
+                 'total_amount': 1000000, 'final_amount': 1000000, 'status': 'checked_out',
+                 'created_at': created + timedelta(minutes=k)}
+                for k in range(offset, min(offset + 50000, num_bookings))
+            ])
+        db.session.commit()
+        
+        summary = {key: 0 for key in (
+            'total_users', 'active_users', 'total_hotels', 'active_hotels', 'pending_hotels', 'total_bookings',
+            'total_payments', 'total_reviews', 'total_rooms', 'total_revenue', 'avg_rating'
+        )}
+        
+        def export():
+            size = 0
+            for chunk in iter_csv(AdminController._report_rows(summary, None, None, None), compress=True):
+                size += len(chunk)
+            return size
+        
+        start = time.perf_counter()
+        size = export()
+        elapsed = time.perf_counter() - start
+        
+        # Lần hai chỉ để đo bộ nhớ đỉnh (tracemalloc làm chậm nhiều lần)
+        tracemalloc.start()
+        export()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        db.drop_all()
+    
+    results['report_export_stream'] = [elapsed * 1000]
+    print(f"   {num_bookings} booking trong {elapsed:.2f}s ({num_bookings / elapsed:,.0f} dòng/s), "
+          f"file gzip {size / 1024:,.0f}KB, bộ nhớ đỉnh {peak / 1024 / 1024:.1f}MB")
+    return peak
+
 def generate_report():
     """Tạo báo cáo kết quả"""
     print("\n" + "="*60)
@@ -294,6 +909,10 @@ if __name__ == '__main__':
     print("🚀 Bắt đầu đo lường performance...\n")
     
     try:
+        # Regression số query chạy trên SQLite tự tạo, không cần DB thật
+        query_count_ok = test_hotel_detail_query_count()
+        print()
+        
         # Chạy các tests
         test_database_queries()
         print()
@@ -307,12 +926,42 @@ if __name__ == '__main__':
         test_hotel_detail()
         print()
         
+        test_read_cache()
+        print()
+        
+        test_chatbot_agent_overhead()
+        print()
+        
+        test_vector_document_build()
+        print()
+        
+        test_chatbot_retrieval()
+        print()
+        
+        test_promotion_fanout()
+        print()
+        
+        test_dashboard_stats()
+        print()
+        
+        test_report_export()
+        print()
+        
+        test_embedding_latency()
+        print()
+        
         test_check_availability()
         print()
         
         test_page_load()
         print()
         
+        test_autocomplete()
+        print()
+        
+        test_concurrent_booking()
+        print()
+        
         # Chatbot test (có thể skip nếu không có API key)
         try:
             test_chatbot()
@@ -329,4 +978,9 @@ if __name__ == '__main__':
         print(f"\n❌ Lỗi: {str(e)}")
         import traceback
         traceback.print_exc()
+        sys.exit(1)
+    
+    if not query_count_ok:
+        print(f"\n❌ Trang chi tiết khách sạn vượt {HOTEL_DETAIL_MAX_QUERIES} queries")
+        sys.exit(1)
 
@@ -37,6 +37,59 @@ class Config:
     
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
     OPENAI_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-4o-mini')
+    # Số kết nối HTTP giữ lại cho client OpenAI dùng chung trong mỗi worker
+    CHATBOT_HTTP_MAX_CONNECTIONS = int(os.environ.get('CHATBOT_HTTP_MAX_CONNECTIONS', 20))
+    # Số document gửi đi embed mỗi lần khi đồng bộ vector DB
+    VECTOR_EMBED_BATCH_SIZE = int(os.environ.get('VECTOR_EMBED_BATCH_SIZE', 100))
+    # Embedding: openai (text-embedding-3-small) hoặc local (sentence-transformers trên CPU, backend torch/onnx).
+    # Đổi provider / model thì phải dựng lại index: flask sync-vector-index --full
+    EMBEDDING_PROVIDER = os.environ.get('EMBEDDING_PROVIDER', 'openai')
+    EMBEDDING_MODEL = os.environ.get('EMBEDDING_MODEL')
+    EMBEDDING_LOCAL_BACKEND = os.environ.get('EMBEDDING_LOCAL_BACKEND', 'torch')
+    # Cache vector trên đĩa theo hash nội dung, để trống để tắt
+    EMBEDDING_CACHE_DIR = os.environ.get('EMBEDDING_CACHE_DIR', './embedding_cache')
+    # Số vector câu hỏi giữ trong bộ nhớ (LRU), không ghi đĩa
+    EMBEDDING_QUERY_CACHE_SIZE = int(os.environ.get('EMBEDDING_QUERY_CACHE_SIZE', 1000))
+    
+    # Tìm kiếm điểm đến: auto (MySQL dùng FULLTEXT ngram, DB khác dùng index trong memory), mysql, memory
+    TEXT_SEARCH_BACKEND = os.environ.get('TEXT_SEARCH_BACKEND', 'auto')
+    TEXT_SEARCH_INDEX_TTL = int(os.environ.get('TEXT_SEARCH_INDEX_TTL', 300))
+    
+    # Đo số query / thời gian DB mỗi request; request chậm hơn SLOW_REQUEST_MS được lưu mẫu ở /admin/perf.
+    # Mặc định tắt; header Server-Timing chỉ gửi khi chạy debug (không lộ thông tin DB cho client ở production)
+    QUERY_PROFILER_ENABLED = os.environ.get('QUERY_PROFILER_ENABLED', 'False').lower() == 'true'
+    SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 500))
+    SLOW_REQUEST_SAMPLES = int(os.environ.get('SLOW_REQUEST_SAMPLES', 50))
+    
+    # Số process web (cùng biến WEB_CONCURRENCY mà gunicorn đọc)
+    WEB_WORKERS = int(os.environ.get('WEB_CONCURRENCY', 1))
+    
+    # Cache đọc cho các trang công khai: memory (LRU trong process, chỉ đúng khi có 1 process web vì invalidate
+    # không lan sang process khác), redis (dùng chung giữa worker, cần gói redis), none;
+    # auto = redis khi WEB_WORKERS > 1, ngược lại memory.
+    # CACHE_REDIS_URL=local:// dùng bản giả lập Redis trong process để chạy thử.
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'auto')
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL', 300))
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))
+    
+    # Cache câu trả lời chatbot; CHATBOT_CACHE_SEMANTIC bật khớp câu hỏi gần giống bằng embedding (tốn 1 lần gọi embedding / câu)
+    CHATBOT_CACHE_MAX_ENTRIES = int(os.environ.get('CHATBOT_CACHE_MAX_ENTRIES', 500))
+    CHATBOT_CACHE_TTL = int(os.environ.get('CHATBOT_CACHE_TTL', 600))
+    CHATBOT_CACHE_SEMANTIC = os.environ.get('CHATBOT_CACHE_SEMANTIC', 'False').lower() == 'true'
+    CHATBOT_CACHE_SIMILARITY = float(os.environ.get('CHATBOT_CACHE_SIMILARITY', 0.95))
+    
+    # Hàng đợi việc nền (email...): thread = pool thread trong mỗi process web, khởi động cùng app;
+    # external = chỉ xử lý bằng `flask run-jobs`; sync = chạy ngay trong request (test)
+    JOB_WORKER_MODE = os.environ.get('JOB_WORKER_MODE', 'thread')
+    JOB_WORKER_THREADS = int(os.environ.get('JOB_WORKER_THREADS', 2))
+    JOB_BATCH_SIZE = int(os.environ.get('JOB_BATCH_SIZE', 50))
+    JOB_POLL_INTERVAL = int(os.environ.get('JOB_POLL_INTERVAL', 5))
+    # Job đã xong bị xóa sau số ngày này (worker tự dọn, hoặc `flask purge-jobs`)
+    JOB_RETENTION_DAYS = int(os.environ.get('JOB_RETENTION_DAYS', 7))
+    
+    # Bảng platform_stats (dashboard admin) cộng dồn theo từng ghi; đối soát lại toàn bộ sau mỗi khoảng này (giây)
+    PLATFORM_STATS_RECONCILE_INTERVAL = int(os.environ.get('PLATFORM_STATS_RECONCILE_INTERVAL', 3600))
 config = {
     'development': Config,
     'production': Config,
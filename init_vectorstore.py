@@ -8,8 +8,9 @@ if __name__ == "__main__":
         print("Initializing vector database...")
         try:
             chatbot = HotelRAGChatbot()
-            chatbot.rebuild_vectorstore()
-            print("Done!")
+            # EMBEDDING_PROVIDER=local: chạy offline, không cần OPENAI_API_KEY
+            stats = chatbot.rebuild_vectorstore()
+            print(f"Done! {stats}")
             print("Vector DB at: ./chroma_db/")
         except Exception as exc:
             print(f"Error: {exc}")
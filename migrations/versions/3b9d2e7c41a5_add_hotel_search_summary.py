@@ -0,0 +1,94 @@
+"""Add hotel_search_summary table
+
+Revision ID: 3b9d2e7c41a5
+Revises: fa7076c38616
+Create Date: 2026-10-18 09:12:31.204117
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b9d2e7c41a5'
+down_revision = 'fa7076c38616'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('hotel_search_summary',
+        sa.Column('hotel_id', sa.Integer(), nullable=False),
+        sa.Column('min_price', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('max_price', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('review_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('avg_rating', sa.Numeric(precision=3, scale=2), nullable=False, server_default='0'),
+        sa.Column('has_free_cancellation', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('has_active_promotion', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('primary_image_url', sa.String(length=255), nullable=True),
+        sa.Column('amenity_ids', sa.String(length=500), nullable=False, server_default=','),
+        sa.Column('expires_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['hotel_id'], ['hotels.hotel_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('hotel_id')
+    )
+    with op.batch_alter_table('hotel_search_summary', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_hotel_search_summary_min_price'), ['min_price'], unique=False)
+        batch_op.create_index(batch_op.f('ix_hotel_search_summary_max_price'), ['max_price'], unique=False)
+        batch_op.create_index(batch_op.f('ix_hotel_search_summary_avg_rating'), ['avg_rating'], unique=False)
+        batch_op.create_index(batch_op.f('ix_hotel_search_summary_has_free_cancellation'), ['has_free_cancellation'], unique=False)
+        batch_op.create_index(batch_op.f('ix_hotel_search_summary_has_active_promotion'), ['has_active_promotion'], unique=False)
+        batch_op.create_index(batch_op.f('ix_hotel_search_summary_expires_at'), ['expires_at'], unique=False)
+
+    _backfill_summary()
+
+
+def _backfill_summary():
+    """Điền summary cho mọi khách sạn hiện có (cùng công thức với SearchSummaryService.compute)
+    để tìm kiếm không mất khách sạn nào ngay sau khi deploy"""
+    bind = op.get_bind()
+    if bind.dialect.name == 'mysql':
+        amenity_list = "CONCAT(',', GROUP_CONCAT(ha.amenity_id ORDER BY ha.amenity_id SEPARATOR ','), ',')"
+    else:
+        amenity_list = "',' || GROUP_CONCAT(ha.amenity_id, ',') || ','"
+
+    bind.execute(sa.text(f"""
+        INSERT INTO hotel_search_summary (
+            hotel_id, min_price, max_price, review_count, avg_rating,
+            has_free_cancellation, has_active_promotion, primary_image_url, amenity_ids, expires_at, updated_at
+        )
+        SELECT
+            h.hotel_id,
+            (SELECT MIN(r.base_price) FROM rooms r WHERE r.hotel_id = h.hotel_id AND r.status = 'available'),
+            (SELECT MAX(r.base_price) FROM rooms r WHERE r.hotel_id = h.hotel_id AND r.status = 'available'),
+            (SELECT COUNT(*) FROM reviews rv WHERE rv.hotel_id = h.hotel_id AND rv.status = 'active'),
+            COALESCE((SELECT ROUND(AVG(rv.rating), 2) FROM reviews rv
+                      WHERE rv.hotel_id = h.hotel_id AND rv.status = 'active'), 0),
+            CASE WHEN EXISTS (SELECT 1 FROM cancellation_policies cp
+                              WHERE cp.hotel_id = h.hotel_id AND cp.refund_percentage = 100) THEN 1 ELSE 0 END,
+            CASE WHEN EXISTS (SELECT 1 FROM promotions p
+                              WHERE p.hotel_id = h.hotel_id AND p.is_active = 1
+                                AND p.start_date <= :now AND p.end_date >= :now) THEN 1 ELSE 0 END,
+            (SELECT hi.image_url FROM hotel_images hi WHERE hi.hotel_id = h.hotel_id
+             ORDER BY hi.is_primary DESC, hi.display_order, hi.image_id LIMIT 1),
+            COALESCE((SELECT {amenity_list} FROM hotel_amenities ha
+                      WHERE ha.hotel_id = h.hotel_id), ','),
+            (SELECT MIN(CASE WHEN p.start_date > :now THEN p.start_date ELSE p.end_date END)
+             FROM promotions p WHERE p.hotel_id = h.hotel_id AND p.is_active = 1 AND p.end_date >= :now),
+            :now
+        FROM hotels h
+    """), {'now': datetime.utcnow()})
+
+
+def downgrade():
+    with op.batch_alter_table('hotel_search_summary', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_hotel_search_summary_expires_at'))
+        batch_op.drop_index(batch_op.f('ix_hotel_search_summary_has_active_promotion'))
+        batch_op.drop_index(batch_op.f('ix_hotel_search_summary_has_free_cancellation'))
+        batch_op.drop_index(batch_op.f('ix_hotel_search_summary_avg_rating'))
+        batch_op.drop_index(batch_op.f('ix_hotel_search_summary_max_price'))
+        batch_op.drop_index(batch_op.f('ix_hotel_search_summary_min_price'))
+
+    op.drop_table('hotel_search_summary')
@@ -0,0 +1,29 @@
+"""Add users.unread_notifications counter
+
+Revision ID: 3e5f8a1c7b26
+Revises: 9a7d3e5b2c14
+Create Date: 2026-10-18 16:20:37.214905
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3e5f8a1c7b26'
+down_revision = '9a7d3e5b2c14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('users', sa.Column('unread_notifications', sa.Integer(), nullable=False, server_default='0'))
+    op.execute(
+        "UPDATE users SET unread_notifications = ("
+        "SELECT COUNT(*) FROM notifications "
+        "WHERE notifications.user_id = users.user_id AND notifications.is_read = 0)"
+    )
+
+
+def downgrade():
+    op.drop_column('users', 'unread_notifications')
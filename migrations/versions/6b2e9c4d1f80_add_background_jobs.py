@@ -0,0 +1,48 @@
+"""Add background_jobs queue table
+
+Revision ID: 6b2e9c4d1f80
+Revises: d4a7b19e3f62
+Create Date: 2026-10-18 14:05:31.218904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6b2e9c4d1f80'
+down_revision = 'd4a7b19e3f62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('background_jobs',
+    sa.Column('job_id', sa.Integer(), nullable=False),
+    sa.Column('queue', sa.String(length=50), nullable=False),
+    sa.Column('task', sa.String(length=100), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('status', sa.Enum('pending', 'running', 'done', 'failed'), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('run_at', sa.DateTime(), nullable=False),
+    sa.Column('locked_by', sa.String(length=100), nullable=True),
+    sa.Column('locked_at', sa.DateTime(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('job_id')
+    )
+    with op.batch_alter_table('background_jobs', schema=None) as batch_op:
+        batch_op.create_index('ix_background_jobs_claim', ['status', 'queue', 'run_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_background_jobs_task'), ['task'], unique=False)
+        batch_op.create_index(batch_op.f('ix_background_jobs_locked_by'), ['locked_by'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('background_jobs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_background_jobs_locked_by'))
+        batch_op.drop_index(batch_op.f('ix_background_jobs_task'))
+        batch_op.drop_index('ix_background_jobs_claim')
+
+    op.drop_table('background_jobs')
@@ -0,0 +1,43 @@
+"""Add platform_stats snapshot table
+
+Revision ID: 7d1b4c9e2f38
+Revises: 3e5f8a1c7b26
+Create Date: 2026-10-18 17:05:52.483310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d1b4c9e2f38'
+down_revision = '3e5f8a1c7b26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Các dòng shard được tạo ở lần đọc / đối soát đầu tiên (PlatformStatsService.reconcile)
+    op.create_table('platform_stats',
+    sa.Column('stats_id', sa.Integer(), nullable=False),
+    sa.Column('total_users', sa.Integer(), nullable=False),
+    sa.Column('active_users', sa.Integer(), nullable=False),
+    sa.Column('total_hotels', sa.Integer(), nullable=False),
+    sa.Column('pending_hotels', sa.Integer(), nullable=False),
+    sa.Column('active_hotels', sa.Integer(), nullable=False),
+    sa.Column('total_bookings', sa.Integer(), nullable=False),
+    sa.Column('total_revenue', sa.Numeric(precision=15, scale=2), nullable=False),
+    sa.Column('total_payments', sa.Integer(), nullable=False),
+    sa.Column('total_reviews', sa.Integer(), nullable=False),
+    sa.Column('rating_sum', sa.Integer(), nullable=False),
+    sa.Column('rating_count', sa.Integer(), nullable=False),
+    sa.Column('total_rooms', sa.Integer(), nullable=False),
+    sa.Column('needs_reconcile', sa.Boolean(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('reconciled_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('stats_id')
+    )
+
+
+def downgrade():
+    op.drop_table('platform_stats')
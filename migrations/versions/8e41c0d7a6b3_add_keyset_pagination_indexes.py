@@ -0,0 +1,28 @@
+"""Add composite indexes for keyset pagination
+
+Revision ID: 8e41c0d7a6b3
+Revises: 3b9d2e7c41a5
+Create Date: 2026-10-18 10:05:47.881352
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e41c0d7a6b3'
+down_revision = '3b9d2e7c41a5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_bookings_created_id', 'bookings', ['created_at', 'booking_id'], unique=False)
+    op.create_index('ix_reviews_hotel_status_created', 'reviews', ['hotel_id', 'status', 'created_at', 'review_id'], unique=False)
+    op.create_index('ix_notifications_user_created', 'notifications', ['user_id', 'created_at', 'notification_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_notifications_user_created', table_name='notifications')
+    op.drop_index('ix_reviews_hotel_status_created', table_name='reviews')
+    op.drop_index('ix_bookings_created_id', table_name='bookings')
@@ -0,0 +1,24 @@
+"""Add favorites (hotel_id, user_id) index for promotion fan-out
+
+Revision ID: 9a7d3e5b2c14
+Revises: 6b2e9c4d1f80
+Create Date: 2026-10-18 15:42:09.871532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a7d3e5b2c14'
+down_revision = '6b2e9c4d1f80'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_favorites_hotel_user', 'favorites', ['hotel_id', 'user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_favorites_hotel_user', table_name='favorites')
@@ -0,0 +1,60 @@
+"""Add hotels.search_text with FULLTEXT ngram index
+
+Revision ID: c52f8a1e9d07
+Revises: 8e41c0d7a6b3
+Create Date: 2026-10-18 10:41:12.530918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.services.text_search import fold_vietnamese
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52f8a1e9d07'
+down_revision = '8e41c0d7a6b3'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+
+
+def upgrade():
+    op.add_column('hotels', sa.Column('search_text', sa.Text(), nullable=True))
+    _backfill_search_text()
+
+    # FULLTEXT với ngram parser chỉ có trên MySQL, DB khác dùng index trong memory
+    if op.get_bind().dialect.name == 'mysql':
+        op.execute('ALTER TABLE hotels ADD FULLTEXT INDEX ft_hotels_search_text (search_text) WITH PARSER ngram')
+
+
+def _backfill_search_text():
+    """Điền search_text cho khách sạn hiện có (cùng công thức với build_search_text),
+    nếu không MATCH trên MySQL trả về rỗng ngay sau khi deploy"""
+    bind = op.get_bind()
+    select_batch = sa.text(
+        'SELECT hotel_id, hotel_name, city, address FROM hotels '
+        'WHERE hotel_id > :last_id ORDER BY hotel_id LIMIT :limit'
+    )
+    update_row = sa.text('UPDATE hotels SET search_text = :search_text WHERE hotel_id = :hotel_id')
+
+    last_id = 0
+    while True:
+        rows = bind.execute(select_batch, {'last_id': last_id, 'limit': BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+        bind.execute(update_row, [
+            {
+                'hotel_id': hotel_id,
+                'search_text': fold_vietnamese(' '.join(part for part in (hotel_name, city, address) if part))
+            }
+            for hotel_id, hotel_name, city, address in rows
+        ])
+        last_id = rows[-1][0]
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'mysql':
+        op.drop_index('ft_hotels_search_text', table_name='hotels')
+    op.drop_column('hotels', 'search_text')
@@ -0,0 +1,89 @@
+"""Add room_inventory ledger table
+
+Revision ID: d4a7b19e3f62
+Revises: c52f8a1e9d07
+Create Date: 2026-10-18 11:20:14.539207
+
+"""
+from datetime import timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a7b19e3f62'
+down_revision = 'c52f8a1e9d07'
+branch_labels = None
+depends_on = None
+
+# Cùng danh sách với availability_service.BLOCKING_STATUSES
+BLOCKING_STATUSES = ('pending', 'confirmed', 'checked_in')
+BATCH_SIZE = 500
+
+
+def upgrade():
+    op.create_table('room_inventory',
+    sa.Column('room_id', sa.Integer(), nullable=False),
+    sa.Column('night', sa.Date(), nullable=False),
+    sa.Column('booked', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['room_id'], ['rooms.room_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('room_id', 'night')
+    )
+
+    _backfill_inventory()
+
+
+def _backfill_inventory():
+    """Ghi sổ cho các booking đang giữ phòng (cùng cách tính với InventoryService.rebuild)
+    để tìm kiếm / đặt phòng thấy ngay các đêm đã bán sau khi deploy"""
+    bind = op.get_bind()
+    booking_ids_query = sa.text("""
+        SELECT booking_id FROM bookings
+        WHERE status IN :statuses AND booking_id > :last_id
+        ORDER BY booking_id
+        LIMIT :limit
+    """).bindparams(sa.bindparam('statuses', expanding=True))
+    stays_query = sa.text("""
+        SELECT b.check_in_date, b.check_out_date, bd.room_id, bd.quantity
+        FROM bookings b
+        JOIN booking_details bd ON bd.booking_id = b.booking_id
+        WHERE b.booking_id IN :booking_ids
+    """).bindparams(
+        sa.bindparam('booking_ids', expanding=True)
+    ).columns(
+        check_in_date=sa.Date, check_out_date=sa.Date, room_id=sa.Integer, quantity=sa.Integer
+    )
+
+    counts = {}
+    last_id = 0
+    while True:
+        booking_ids = [row[0] for row in bind.execute(booking_ids_query, {
+            'statuses': list(BLOCKING_STATUSES), 'last_id': last_id, 'limit': BATCH_SIZE
+        })]
+        if not booking_ids:
+            break
+
+        for check_in, check_out, room_id, quantity in bind.execute(stays_query, {'booking_ids': booking_ids}):
+            night = check_in
+            while night < check_out:
+                counts[(room_id, night)] = counts.get((room_id, night), 0) + (quantity or 1)
+                night += timedelta(days=1)
+        last_id = booking_ids[-1]
+
+    inventory = sa.table(
+        'room_inventory',
+        sa.column('room_id', sa.Integer),
+        sa.column('night', sa.Date),
+        sa.column('booked', sa.Integer)
+    )
+    entries = [
+        {'room_id': room_id, 'night': night, 'booked': booked}
+        for (room_id, night), booked in counts.items()
+    ]
+    for start in range(0, len(entries), BATCH_SIZE):
+        op.bulk_insert(inventory, entries[start:start + BATCH_SIZE])
+
+
+def downgrade():
+    op.drop_table('room_inventory')
@@ -1,6 +1,12 @@
 from dotenv import load_dotenv
 load_dotenv()
 
+import os
+
+if __name__ == '__main__':
+    # app.run(debug=True) bên dưới bật reloader; báo trước để create_app không chạy pool job ở tiến trình cha
+    os.environ.setdefault('FLASK_DEBUG', '1')
+
 from app import create_app
 from config.config import config
 